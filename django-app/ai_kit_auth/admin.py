@@ -1,15 +1,15 @@
 import unicodedata
 import uuid
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.forms import UserChangeForm, UserCreationForm
 from django.forms import EmailField, CharField
-from django.utils.translation import gettext_lazy as _
+from django.utils.translation import gettext_lazy as _, ngettext
 from django.core.exceptions import ValidationError
 
-from .services import send_activation_by_admin_mail
+from .services import send_activation_by_admin_mail, send_activation_by_admin_mails
 from .settings import api_settings
 
 User = get_user_model()
@@ -102,6 +102,35 @@ class AIUserAdmin(UserAdmin):
         User.USERNAME_FIELD,
         User.get_email_field_name(),
     )
+    actions = ["send_activation_mails"]
+
+    def send_activation_mails(self, request, queryset):
+        results = send_activation_by_admin_mails(queryset.filter(is_active=False))
+        sent = sum(result.sent or 0 for result in results)
+        self.message_user(
+            request,
+            ngettext(
+                "Sent %(count)d activation mail.",
+                "Sent %(count)d activation mails.",
+                sent,
+            )
+            % {"count": sent},
+        )
+        for result in results:
+            if result.error is not None:
+                self.message_user(
+                    request,
+                    _("Sending to %(recipients)s failed: %(error)s")
+                    % {
+                        "recipients": ", ".join(result.recipients),
+                        "error": result.error,
+                    },
+                    messages.ERROR,
+                )
+
+    send_activation_mails.short_description = _(
+        "Send activation mail to selected inactive users"
+    )
 
 
 if api_settings.USE_AI_KIT_AUTH_ADMIN:
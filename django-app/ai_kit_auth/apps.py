@@ -3,4 +3,11 @@ from django.apps import AppConfig
 
 class DjangoAiKitAuthConfig(AppConfig):
     name = "ai_kit_auth"
+    default_auto_field = "django.db.models.AutoField"
     verbose_name = "Ai Kit: Authentication"
+
+    def ready(self):
+        from django.core import checks
+        from .indexes import identity_index_check
+
+        checks.register(identity_index_check, checks.Tags.database)
@@ -0,0 +1,470 @@
+"""
+SMTP email backend based on asyncio, with a pool of persistent connections.
+
+Django's SMTP backend opens a new connection for every send_mail call and
+blocks the calling thread until the server accepted the mail. With
+EMAIL_BACKEND = "ai_kit_auth.async_smtp.EmailBackend", the mails are sent by
+an event loop on a separate thread instead, which keeps up to
+ASYNC_SMTP.POOL_SIZE connections open for all threads and event loops of the
+process. The commands of a mail are pipelined if the server supports it, the
+mails of one send_messages call are sent in parallel, and every mail has to
+be accepted within SEND_TIMEOUT seconds, or a TimeoutError is raised.
+
+Sync code waits for the result, like with django's backend. Async code, e.g.
+services.asend_email, awaits asend_messages without blocking its event loop.
+"""
+
+import asyncio
+import atexit
+import base64
+import smtplib
+import ssl
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import sanitize_address
+from django.core.mail.utils import DNS_NAME
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+# errors of a connection, which the server closed while it was idle
+DISCONNECTED = (
+    smtplib.SMTPServerDisconnected,
+    ConnectionError,
+    asyncio.IncompleteReadError,
+)
+
+
+class SMTPConnection:
+    """
+    A single SMTP session, which can send several mails one after another.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.extensions = {}
+        self.data_sent = False
+
+    @classmethod
+    async def open(
+        cls,
+        host,
+        port,
+        username="",
+        password="",
+        use_tls=False,
+        use_ssl=False,
+        ssl_context=None,
+    ):
+        context = ssl_context or ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=context if use_ssl else None
+        )
+        connection = cls(reader, writer)
+        try:
+            await connection.reply(220, smtplib.SMTPConnectError)
+            await connection.ehlo()
+            if use_tls:
+                await connection.starttls(context, host)
+            if username and password:
+                await connection.login(username, password)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    async def reply(self, expected=None, error=smtplib.SMTPResponseException):
+        """
+        Reads a reply and returns its code and text, or raises error if the
+        code isn't expected.
+        """
+        lines = []
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            lines.append(line[4:].strip().decode(errors="replace"))
+            if line[3:4] != b"-":
+                break
+        try:
+            code = int(line[:3])
+        except ValueError:
+            code = -1
+        message = "\n".join(lines)
+        if expected is not None and code != expected:
+            raise error(code, message)
+        return code, message
+
+    def write(self, *lines):
+        self.writer.write(b"".join(line.encode() + b"\r\n" for line in lines))
+
+    async def command(self, line, expected=250, error=smtplib.SMTPResponseException):
+        self.write(line)
+        await self.writer.drain()
+        return await self.reply(expected, error)
+
+    async def ehlo(self):
+        _, message = await self.command(
+            f"EHLO {DNS_NAME.get_fqdn()}", error=smtplib.SMTPHeloError
+        )
+        self.extensions = {}
+        for line in message.splitlines()[1:]:
+            keyword, _, parameters = line.partition(" ")
+            self.extensions[keyword.lower()] = parameters
+
+    async def starttls(self, context, host):
+        if "starttls" not in self.extensions:
+            raise smtplib.SMTPNotSupportedError("STARTTLS is not supported")
+        await self.command("STARTTLS", 220)
+        if hasattr(self.writer, "start_tls"):
+            await self.writer.start_tls(context, server_hostname=host)
+        else:
+            # python < 3.11
+            loop = asyncio.get_running_loop()
+            protocol = self.writer.transport.get_protocol()
+            transport = await loop.start_tls(
+                self.writer.transport, protocol, context, server_hostname=host
+            )
+            self.writer = asyncio.StreamWriter(transport, protocol, self.reader, loop)
+        await self.ehlo()
+
+    async def login(self, username, password):
+        methods = self.extensions.get("auth", "").upper().split()
+        if "PLAIN" in methods:
+            token = base64.b64encode(f"\0{username}\0{password}".encode()).decode()
+            await self.command(
+                f"AUTH PLAIN {token}", 235, smtplib.SMTPAuthenticationError
+            )
+        elif "LOGIN" in methods:
+            await self.command("AUTH LOGIN", 334, smtplib.SMTPAuthenticationError)
+            token = base64.b64encode(username.encode()).decode()
+            await self.command(token, 334, smtplib.SMTPAuthenticationError)
+            token = base64.b64encode(password.encode()).decode()
+            await self.command(token, 235, smtplib.SMTPAuthenticationError)
+        else:
+            raise smtplib.SMTPNotSupportedError("No supported AUTH method")
+
+    async def send(self, from_address, recipients, data):
+        """
+        Sends the mail data from from_address to recipients. Like smtplib, it
+        only fails if all recipients are refused.
+        """
+        commands = [f"MAIL FROM:<{from_address}>"]
+        commands += [f"RCPT TO:<{recipient}>" for recipient in recipients]
+        commands.append("DATA")
+        if "pipelining" in self.extensions:
+            self.write(*commands)
+            await self.writer.drain()
+            replies = [await self.reply() for _ in commands]
+        else:
+            replies = [await self.command(commands[0], expected=None)]
+            if replies[0][0] == 250:
+                for command in commands[1:-1]:
+                    replies.append(await self.command(command, expected=None))
+                if any(code in (250, 251) for code, _ in replies[1:]):
+                    replies.append(await self.command("DATA", expected=None))
+
+        mail_reply, *rcpt_replies = replies[: len(recipients) + 1]
+        refused = {
+            recipient: reply
+            for recipient, reply in zip(recipients, rcpt_replies)
+            if reply[0] not in (250, 251)
+        }
+        data_code = replies[-1][0] if len(replies) == len(commands) else None
+        if mail_reply[0] != 250 or len(refused) == len(recipients) or data_code != 354:
+            if data_code == 354:
+                # the server waits for data, which can't be aborted
+                self.close()
+            else:
+                await self.command("RSET", expected=None)
+            if mail_reply[0] != 250:
+                raise smtplib.SMTPSenderRefused(*mail_reply, from_address)
+            if len(refused) == len(recipients):
+                raise smtplib.SMTPRecipientsRefused(refused)
+            raise smtplib.SMTPDataError(*replies[-1])
+
+        data = data.replace(b"\r\n.", b"\r\n..")
+        if data.startswith(b"."):
+            data = b"." + data
+        if not data.endswith(b"\r\n"):
+            data += b"\r\n"
+        self.data_sent = True
+        self.writer.write(data + b".\r\n")
+        await self.writer.drain()
+        await self.reply(250, smtplib.SMTPDataError)
+        self.data_sent = False
+        return refused
+
+    async def quit(self):
+        try:
+            await asyncio.wait_for(self.command("QUIT", expected=None), 5)
+        except (smtplib.SMTPException, OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.close()
+
+    @property
+    def closed(self):
+        return self.writer.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+
+class SMTPConnectionPool:
+    """
+    Up to size connections to the same server. Idle connections are closed
+    after idle_timeout seconds, because servers do so as well.
+    """
+
+    def __init__(self, connect, size, idle_timeout):
+        self._connect = connect
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        self.idle_timeout = idle_timeout
+
+    async def acquire(self):
+        """
+        Returns an open connection and whether it was used before.
+        """
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                connection, since = self._idle.pop()
+                if time.monotonic() - since < self.idle_timeout:
+                    return connection, True
+                await connection.quit()
+            return await self._connect(), False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, reusable=True):
+        if reusable and not connection.closed:
+            self._idle.append((connection, time.monotonic()))
+        else:
+            connection.close()
+        self._slots.release()
+
+    async def send(self, from_address, recipients, data):
+        """
+        Sends a mail over a connection of the pool, on a new one if a reused
+        connection turns out to be closed before the data was sent.
+        """
+        while True:
+            connection, reused = await self.acquire()
+            try:
+                refused = await connection.send(from_address, recipients, data)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # refused by the server, which reset the session
+                self.release(connection)
+                raise
+            except BaseException as exc:
+                # the state of the session is unknown, e.g. after a timeout
+                self.release(connection, reusable=False)
+                if (
+                    reused
+                    and isinstance(exc, DISCONNECTED)
+                    and not connection.data_sent
+                ):
+                    continue
+                raise
+            self.release(connection)
+            return refused
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(connection.quit() for connection, _ in idle))
+
+
+class MailLoop:
+    """
+    An event loop on its own thread, which owns the connection pools.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.pools = {}
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="ai_kit_auth_smtp", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def get_pool(self, key, connect, size, idle_timeout):
+        # only called on the loop, so no lock is needed
+        if key not in self.pools:
+            self.pools[key] = SMTPConnectionPool(connect, size, idle_timeout)
+        return self.pools[key]
+
+    async def _close(self):
+        await asyncio.gather(*(pool.close() for pool in self.pools.values()))
+
+    def shutdown(self):
+        try:
+            self.submit(self._close()).result(timeout=10)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+
+
+_mail_loop = None
+_mail_loop_lock = threading.Lock()
+
+
+def get_mail_loop():
+    global _mail_loop
+    with _mail_loop_lock:
+        if _mail_loop is None:
+            _mail_loop = MailLoop()
+        return _mail_loop
+
+
+@atexit.register
+def shutdown():
+    """
+    Closes all pooled connections.
+    """
+    global _mail_loop
+    with _mail_loop_lock:
+        mail_loop, _mail_loop = _mail_loop, None
+    if mail_loop is not None:
+        mail_loop.shutdown()
+
+
+@receiver(setting_changed)
+def reset_mail_loop(*args, **kwargs):
+    if kwargs["setting"] == "AI_KIT_AUTH" or kwargs["setting"].startswith("EMAIL_"):
+        shutdown()
+
+
+class EmailBackend(BaseEmailBackend):
+    """
+    Takes the same settings and arguments as django's SMTP backend, but sends
+    the mails over the pooled connections of the mail loop.
+    """
+
+    def __init__(
+        self,
+        host=None,
+        port=None,
+        username=None,
+        password=None,
+        use_tls=None,
+        use_ssl=None,
+        fail_silently=False,
+        ssl_keyfile=None,
+        ssl_certfile=None,
+        **kwargs,
+    ):
+        super().__init__(fail_silently=fail_silently)
+        self.host = host or settings.EMAIL_HOST
+        self.port = port or settings.EMAIL_PORT
+        self.username = settings.EMAIL_HOST_USER if username is None else username
+        self.password = settings.EMAIL_HOST_PASSWORD if password is None else password
+        self.use_tls = settings.EMAIL_USE_TLS if use_tls is None else use_tls
+        self.use_ssl = settings.EMAIL_USE_SSL if use_ssl is None else use_ssl
+        self.ssl_keyfile = (
+            settings.EMAIL_SSL_KEYFILE if ssl_keyfile is None else ssl_keyfile
+        )
+        self.ssl_certfile = (
+            settings.EMAIL_SSL_CERTFILE if ssl_certfile is None else ssl_certfile
+        )
+        if self.use_ssl and self.use_tls:
+            raise ValueError(
+                "EMAIL_USE_TLS/EMAIL_USE_SSL are mutually exclusive, so only set "
+                "one of those settings to True."
+            )
+
+    async def _connect(self):
+        context = None
+        if self.ssl_certfile:
+            context = ssl.create_default_context()
+            context.load_cert_chain(self.ssl_certfile, self.ssl_keyfile)
+        return await SMTPConnection.open(
+            self.host,
+            self.port,
+            self.username,
+            self.password,
+            self.use_tls,
+            self.use_ssl,
+            context,
+        )
+
+    async def _send(self, mail_loop, email_message):
+        # imported here, because the settings object is replaced on reload
+        from .settings import api_settings
+
+        config = api_settings.ASYNC_SMTP
+        key = (
+            self.host,
+            self.port,
+            self.username,
+            self.password,
+            self.use_tls,
+            self.use_ssl,
+            self.ssl_certfile,
+        )
+        pool = mail_loop.get_pool(
+            key, self._connect, config.POOL_SIZE, config.IDLE_TIMEOUT
+        )
+        encoding = email_message.encoding or settings.DEFAULT_CHARSET
+        from_address = sanitize_address(email_message.from_email, encoding)
+        recipients = [
+            sanitize_address(address, encoding)
+            for address in email_message.recipients()
+        ]
+        data = email_message.message().as_bytes(linesep="\r\n")
+        try:
+            try:
+                # including the wait for a connection
+                await asyncio.wait_for(
+                    pool.send(from_address, recipients, data), config.SEND_TIMEOUT
+                )
+            except asyncio.TimeoutError as exc:
+                # not the builtin TimeoutError before python 3.11
+                raise TimeoutError(
+                    f"mail not accepted within {config.SEND_TIMEOUT} seconds"
+                ) from exc
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return False
+        return True
+
+    async def _send_all(self, mail_loop, email_messages):
+        results = await asyncio.gather(
+            *(
+                self._send(mail_loop, message)
+                for message in email_messages
+                if message.recipients()
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return sum(results)
+
+    def _submit(self, email_messages):
+        mail_loop = get_mail_loop()
+        return mail_loop.submit(self._send_all(mail_loop, list(email_messages)))
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        return self._submit(email_messages).result()
+
+    async def asend_messages(self, email_messages):
+        """
+        Like send_messages, but doesn't block the event loop of the caller.
+        """
+        if not email_messages:
+            return 0
+        return await asyncio.wrap_future(self._submit(email_messages))
@@ -0,0 +1,305 @@
+"""
+Native async versions of the views, used by urls.py if ENABLE_ASYNC is set.
+
+Rest framework views are sync, so under ASGI every request to them is handed
+to a thread. These views run on the event loop instead and only leave it for
+work that blocks: queries use the async ORM, signals are sent with asend,
+password hashing runs on the hashing executor, mails are awaited if
+EMAIL_BACKEND is ai_kit_auth.async_smtp.EmailBackend and everything else, like
+the password validators, runs in a thread via sync_to_async.
+
+Requests and responses are the same as the ones of the sync views, which are
+also used as senders of the signals.
+"""
+
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model, tokens
+from django.http import HttpResponse, JsonResponse
+from django.middleware import csrf
+from django.utils.cache import patch_cache_control
+from rest_framework import exceptions, status
+from rest_framework.authentication import CSRFCheck
+from rest_framework.exceptions import ErrorDetail, ValidationError
+from rest_framework.settings import api_settings as drf_settings
+
+from . import hashing, serializers, services
+from .compat import aauthenticate, aget, aget_user, alogin, alogout, asave, asend
+from .identity import get_identity_resolver
+from .serialization import serialize_user, user_data
+from .settings import api_settings
+from .signals import (
+    user_pre_login,
+    user_post_login,
+    user_pre_logout,
+    user_post_logout,
+    user_pre_registered,
+    user_pre_activated,
+    user_post_activated,
+    user_pre_forgot_password,
+    user_post_forgot_password,
+    user_pre_reset_password,
+    user_post_reset_password,
+)
+from .throttling import LoginThrottle
+from .views import (
+    ActivateUser,
+    InitiatePasswordResetView,
+    LoginView,
+    LogoutView,
+    RegistrationView,
+    ResetPassword,
+    current_csrf_token,
+    me_etag,
+    not_modified,
+)
+
+UserModel = get_user_model()
+
+
+def _parse(request):
+    if request.content_type != "application/json":
+        return request.POST
+    try:
+        return json.loads(request.body or b"{}")
+    except ValueError as e:
+        raise exceptions.ParseError(f"JSON parse error - {e}")
+
+
+def _exception_response(exc):
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        # session authentication has no WWW-Authenticate header
+        exc.status_code = status.HTTP_403_FORBIDDEN
+    response = drf_settings.EXCEPTION_HANDLER(exc, {})
+    if response is None:
+        raise exc
+    json_response = JsonResponse(response.data, status=response.status_code)
+    # e.g. Retry-After
+    for header, value in response.items():
+        if header != "Content-Type":
+            json_response[header] = value
+    return json_response
+
+
+async def _get_token(request):
+    if settings.CSRF_USE_SESSIONS:
+        # the token is stored in the session, which may hit the database
+        return await sync_to_async(csrf.get_token)(request)
+    return csrf.get_token(request)
+
+
+def _enforce_csrf(request):
+    # like the session authentication of rest framework
+    check = CSRFCheck(lambda request: None)
+    check.process_request(request)
+    reason = check.process_view(request, None, (), {})
+    if reason:
+        raise exceptions.PermissionDenied(f"CSRF Failed: {reason}")
+
+
+def api_view(method, authenticated=False, csrf_protected=False):
+    """
+    Turns an async function taking the request, the parsed request data and
+    the user into a view, which behaves like a rest framework view: errors
+    are rendered by its exception handler and the csrf token is only checked
+    for authenticated users, unless csrf_protected is set.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def view(request, *args, **kwargs):
+            if request.method != method:
+                response = JsonResponse(
+                    {"detail": f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED,
+                )
+                response["Allow"] = method
+                return response
+            try:
+                user = await aget_user(request)
+                if user.is_authenticated and not csrf_protected:
+                    await sync_to_async(_enforce_csrf)(request)
+                if authenticated and not user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                data = _parse(request) if method == "POST" else {}
+                return await func(request, data, user, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return _exception_response(exc)
+
+        if not csrf_protected:
+            view.csrf_exempt = True
+        return view
+
+    return decorator
+
+
+def _validated(serializer_class, data, context=None):
+    serializer = serializer_class(data=data, context=context or {})
+    serializer.is_valid(raise_exception=True)
+    return serializer
+
+
+async def _user_data(user, request):
+    serializer = api_settings.USER_SERIALIZER
+    return await sync_to_async(user_data)(serializer, user, {"request": request})
+
+
+class _LoginFieldsSerializer(serializers.LoginSerializer):
+    def validate(self, attrs):
+        # the credentials are checked by the async view
+        return attrs
+
+
+async def _authenticate(request, ident, password):
+    """
+    Async version of LoginSerializer.validate.
+    """
+    throttle = LoginThrottle()
+    if throttle.enabled:
+        await sync_to_async(throttle.check)(request, ident)
+    resolver = get_identity_resolver()
+    identified_user = await resolver.aresolve(ident)
+    credentials = serializers.login_credentials(resolver, ident, identified_user)
+    user = await aauthenticate(request, password=password, **credentials)
+
+    if not user:
+        if throttle.enabled:
+            await sync_to_async(throttle.failure)(request, ident)
+        code = "invalid_credentials"
+        raise ValidationError({"non_field_errors": [ErrorDetail(code, code=code)]})
+    if throttle.enabled:
+        await sync_to_async(throttle.success)(request, ident)
+    return user
+
+
+@api_view("POST", csrf_protected=True)
+async def login_view(request, data, user):
+    attrs = _validated(_LoginFieldsSerializer, data).validated_data
+    user = await _authenticate(request, attrs["ident"], attrs["password"])
+
+    await asend(user_pre_login, sender=LoginView, user=user)
+    await alogin(request, user)
+    user_data = await _user_data(user, request)
+    # the position of this statement is important since the csrf token
+    # is rotated on login
+    csrf_token = await _get_token(request)
+    await asend(user_post_login, sender=LoginView, user=user)
+
+    return JsonResponse({"user": user_data, "csrf": csrf_token})
+
+
+@api_view("POST", authenticated=True)
+async def logout_view(request, data, user):
+    await asend(user_pre_logout, sender=LogoutView, user=user)
+    await alogout(request)
+    await asend(user_post_logout, sender=LogoutView, user=request.user)
+    return JsonResponse({"csrf": await _get_token(request)})
+
+
+@api_view("GET")
+async def me_view(request, data, user):
+    if user.is_anonymous:
+        user_data, digest = None, ""
+    else:
+        # may hit the payload cache
+        user_data, digest = await sync_to_async(serialize_user)(
+            api_settings.USER_SERIALIZER, user, {"request": request}
+        )
+    response = not_modified(request, user, digest)
+    if response is not None:
+        return response
+
+    csrf_token = current_csrf_token(request) or await _get_token(request)
+    response = JsonResponse({"user": user_data, "csrf": csrf_token})
+    response["ETag"] = me_etag(request, user, digest)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@api_view("POST")
+async def registration_view(request, data, user):
+    await asend(user_pre_registered, sender=RegistrationView, user_data=data)
+    serializer = api_settings.REGISTRATION_SERIALIZER(data=data)
+    await sync_to_async(serializer.is_valid)(raise_exception=True)
+    # hashes on the hashing executor, if it is enabled
+    await sync_to_async(serializer.save)()
+    return JsonResponse({}, status=status.HTTP_201_CREATED)
+
+
+@api_view("POST")
+async def validate_password_view(request, data, user):
+    await sync_to_async(_validated)(
+        serializers.ValidatePasswordSerializer,
+        data,
+        {"short_circuit": api_settings.SHORT_CIRCUIT_PASSWORD_VALIDATION},
+    )
+    return JsonResponse({})
+
+
+async def _user_from_link(data):
+    """
+    Returns the user of an activation or reset password link, or None if it
+    is invalid.
+    """
+    try:
+        pk = services.scramble_id(data["ident"])
+        user = await aget(UserModel.objects, pk=pk)
+    except (KeyError, TypeError, ValueError, OverflowError, UserModel.DoesNotExist):
+        return None
+    if not tokens.PasswordResetTokenGenerator().check_token(user, data.get("token")):
+        return None
+    return user
+
+
+@api_view("POST")
+async def activate_user_view(request, data, user):
+    user = await _user_from_link(data)
+    if user is None:
+        return JsonResponse(
+            {"error": "activation_link_invalid"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    await asend(user_pre_activated, sender=ActivateUser, user=user)
+    user.is_active = True
+    await asave(user)
+    await asend(user_post_activated, sender=ActivateUser, user=user)
+    return HttpResponse(status=status.HTTP_200_OK)
+
+
+@api_view("POST")
+async def initiate_password_reset_view(request, data, user):
+    user = await get_identity_resolver().aresolve(data["ident"])
+    if user:
+        sender = InitiatePasswordResetView
+        await asend(user_pre_forgot_password, sender=sender, user=user)
+        await services.asend_reset_pw_mail(user)
+        await asend(user_post_forgot_password, sender=sender, user=user)
+
+    # always return OK
+    return HttpResponse(status=status.HTTP_200_OK)
+
+
+@api_view("POST")
+async def reset_password_view(request, data, user):
+    user = await _user_from_link(data)
+    if user is None:
+        return JsonResponse(
+            {"error": "reset_password_link_invalid"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    await asend(user_pre_reset_password, sender=ResetPassword, user=user)
+    # reuse the password validation
+    await sync_to_async(_validated)(
+        serializers.ValidatePasswordSerializer,
+        {"ident": data["ident"], "password": data.get("password")},
+    )
+
+    # ok, everything is fine, we do the actual password reset
+    user.is_active = True
+    await hashing.aset_password(user, data["password"])
+    await asave(user)
+    await asend(user_post_reset_password, sender=ResetPassword, user=user)
+    return JsonResponse({})
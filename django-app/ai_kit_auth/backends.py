@@ -0,0 +1,289 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_backends, get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+from . import hashing
+
+UserModel = get_user_model()
+
+
+class UserCache:
+    """
+    Caches users by primary key for get_user, which is called by the
+    AuthenticationMiddleware on every request with a session.
+
+    Every user has a version stamp in the shared django cache, which is
+    replaced whenever the user is saved or deleted. Users are stored under
+    their primary key and version stamp, both in a per process LRU and in
+    the shared cache. A lookup therefore reads the current version stamp
+    from the shared cache first, so stale users are never returned, even if
+    they were changed by another process.
+    """
+
+    def __init__(self, cache_alias, timeout, local_size):
+        self.cache = caches[cache_alias]
+        self.timeout = timeout
+        self.local_size = local_size
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def version_key(pk):
+        return f"ai_kit_auth:user:{pk}:version"
+
+    def _version(self, pk):
+        key = self.version_key(pk)
+        version = self.cache.get(key)
+        if version is None:
+            # a new stamp, in case the previous one was evicted
+            self.cache.add(key, time.time_ns(), None)
+            version = self.cache.get(key)
+        return version
+
+    def get(self, pk):
+        """
+        Returns a copy of the cached user and the version stamp, which has to
+        be passed to set.
+        """
+        version = self._version(pk)
+        key = f"ai_kit_auth:user:{pk}:{version}"
+        with self._lock:
+            user = self._local.get(key)
+            if user is not None:
+                self._local.move_to_end(key)
+        if user is None:
+            user = self.cache.get(key)
+            if user is not None:
+                self._remember_locally(key, user)
+        # requests must not see each others changes to the instance
+        return copy.copy(user) if user is not None else None, version
+
+    def set(self, pk, version, user):
+        key = f"ai_kit_auth:user:{pk}:{version}"
+        self.cache.set(key, user, self.timeout)
+        self._remember_locally(key, copy.copy(user))
+
+    def _remember_locally(self, key, user):
+        with self._lock:
+            self._local[key] = user
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def invalidate(self, pk):
+        self.cache.set(self.version_key(pk), time.time_ns(), None)
+
+
+_user_cache = None
+
+
+def get_user_cache():
+    """
+    Returns the user cache or None, if it is disabled.
+    """
+    global _user_cache
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    config = api_settings.USER_CACHE
+    if not config.ENABLED:
+        return None
+    if _user_cache is None:
+        _user_cache = UserCache(config.CACHE_ALIAS, config.TIMEOUT, config.LOCAL_SIZE)
+    return _user_cache
+
+
+@receiver(setting_changed)
+def reset_user_cache(*args, **kwargs):
+    global _user_cache
+    if kwargs["setting"] == "AI_KIT_AUTH":
+        _user_cache = None
+
+
+class PermissionCache:
+    """
+    Caches the permission sets of users, which the ModelBackend queries from
+    the user and group permissions on the first permission check of every
+    request.
+
+    Entries are stored with two version stamps: one of the user, which is
+    replaced when the groups or permissions of the user change, and a global
+    one, which is replaced when the permissions of any group change. Entries
+    are only used while both stamps are current, and the stamps are read
+    before the permissions are queried, so a concurrent change is never
+    hidden by an older permission set.
+    """
+
+    GENERATION_KEY = "ai_kit_auth:permissions:generation"
+
+    def __init__(self, cache_alias, timeout):
+        self.cache = caches[cache_alias]
+        self.timeout = timeout
+
+    @staticmethod
+    def key(pk):
+        return f"ai_kit_auth:permissions:{pk}"
+
+    @staticmethod
+    def version_key(pk):
+        return f"ai_kit_auth:permissions:{pk}:version"
+
+    def get(self, pk):
+        """
+        Returns the cached permission set or None, and the version stamps,
+        which have to be passed to set.
+        """
+        stamp_keys = [self.version_key(pk), self.GENERATION_KEY]
+        values = self.cache.get_many(stamp_keys + [self.key(pk)])
+        for key in stamp_keys:
+            if key not in values:
+                # a new stamp, in case the previous one was evicted
+                self.cache.add(key, time.time_ns(), None)
+                values[key] = self.cache.get(key)
+        stamps = tuple(values[key] for key in stamp_keys)
+        entry = values.get(self.key(pk))
+        if entry is None or entry[0] != stamps:
+            return None, stamps
+        return entry[1], stamps
+
+    def set(self, pk, stamps, permissions):
+        self.cache.set(self.key(pk), (stamps, permissions), self.timeout)
+
+    def invalidate(self, pk):
+        self.cache.set(self.version_key(pk), time.time_ns(), None)
+
+    def invalidate_all(self):
+        self.cache.set(self.GENERATION_KEY, time.time_ns(), None)
+
+
+_permission_cache = None
+
+
+def get_permission_cache():
+    """
+    Returns the permission cache or None, if it is disabled.
+    """
+    global _permission_cache
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    config = api_settings.PERMISSION_CACHE
+    if not config.ENABLED:
+        return None
+    if _permission_cache is None:
+        _permission_cache = PermissionCache(config.CACHE_ALIAS, config.TIMEOUT)
+    return _permission_cache
+
+
+@receiver(setting_changed)
+def reset_permission_cache(*args, **kwargs):
+    global _permission_cache
+    if kwargs["setting"] == "AI_KIT_AUTH":
+        _permission_cache = None
+
+
+class UserInstanceBackend(ModelBackend):
+    """
+    Drop-in replacement for django's ModelBackend, that can also check the
+    password of an already loaded user instance. The login endpoint resolves
+    the user by its identity fields anyway, so passing it along saves the
+    ModelBackend from querying the same user a second time.
+
+    Use it by replacing the ModelBackend in your settings:
+
+    AUTHENTICATION_BACKENDS = ["ai_kit_auth.backends.UserInstanceBackend"]
+
+    Passwords are hashed on the pool configured by PASSWORD_HASHING, the
+    users of sessions are cached as configured by USER_CACHE and permission
+    sets as configured by PERMISSION_CACHE.
+    """
+
+    def authenticate(
+        self,
+        request,
+        username=None,
+        password=None,
+        user=None,
+        unknown_identity=False,
+        **kwargs,
+    ):
+        if password is None:
+            return None
+        if unknown_identity:
+            # the login endpoint knows already, that there is no such user,
+            # but checking a password should take the same time anyway
+            hashing.check_password(password, hashing.dummy_password_hash())
+            return None
+        if user is None:
+            if username is None:
+                username = kwargs.get(UserModel.USERNAME_FIELD)
+            if username is None:
+                return None
+            try:
+                user = UserModel._default_manager.get_by_natural_key(username)
+            except UserModel.DoesNotExist:
+                # Run the default password hasher once to reduce the timing
+                # difference between an existing and a nonexistent user.
+                hashing.make_password(password)
+                return None
+        if not hashing.check_user_password(user, password):
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aauthenticate(self, request, **credentials):
+        # the ModelBackend of django >= 5.0 has its own implementation, which
+        # doesn't know the user and unknown_identity arguments
+        return await sync_to_async(self.authenticate)(request, **credentials)
+
+    def get_user(self, user_id):
+        cache = get_user_cache()
+        if cache is None:
+            return super().get_user(user_id)
+        user, version = cache.get(user_id)
+        if user is None:
+            try:
+                user = UserModel._default_manager.get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            cache.set(user_id, version, user)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # the ModelBackend of django >= 5.0 has its own implementation, which
+        # would skip the user cache for request.auser()
+        return await sync_to_async(self.get_user)(user_id)
+
+    def get_all_permissions(self, user_obj, obj=None):
+        cache = get_permission_cache()
+        if (
+            cache is None
+            or obj is not None
+            or not user_obj.is_active
+            or user_obj.is_anonymous
+            or hasattr(user_obj, "_perm_cache")
+        ):
+            return super().get_all_permissions(user_obj, obj)
+        permissions, stamps = cache.get(user_obj.pk)
+        if permissions is None:
+            permissions = super().get_all_permissions(user_obj)
+            cache.set(user_obj.pk, stamps, permissions)
+        else:
+            # like the ModelBackend, for further checks during the request
+            user_obj._perm_cache = permissions
+        return permissions
+
+
+def user_instance_backend_enabled():
+    return any(isinstance(backend, UserInstanceBackend) for backend in get_backends())
+
+
+def user_instance_backends_only():
+    return all(isinstance(backend, UserInstanceBackend) for backend in get_backends())
@@ -0,0 +1,69 @@
+"""
+Async counterparts of the django apis used by the async views.
+
+Newer django versions provide native async apis, e.g. QuerySet.aget,
+Model.asave, alogin or Signal.asend. They are used when available, otherwise
+the sync api is run in a thread with sync_to_async, which is what the native
+implementations do as well for most of them.
+"""
+
+from asgiref.sync import sync_to_async
+from django.contrib import auth
+
+
+async def aget(queryset, **kwargs):
+    if hasattr(queryset, "aget"):
+        return await queryset.aget(**kwargs)
+    return await sync_to_async(queryset.get)(**kwargs)
+
+
+async def alist(queryset):
+    if hasattr(queryset, "__aiter__"):
+        return [instance async for instance in queryset]
+    return await sync_to_async(list)(queryset)
+
+
+async def asave(instance, **kwargs):
+    if hasattr(instance, "asave"):
+        return await instance.asave(**kwargs)
+    return await sync_to_async(instance.save)(**kwargs)
+
+
+async def aauthenticate(request=None, **credentials):
+    if hasattr(auth, "aauthenticate"):
+        return await auth.aauthenticate(request, **credentials)
+    return await sync_to_async(auth.authenticate)(request, **credentials)
+
+
+async def alogin(request, user):
+    if hasattr(auth, "alogin"):
+        return await auth.alogin(request, user)
+    return await sync_to_async(auth.login)(request, user)
+
+
+async def alogout(request):
+    if hasattr(auth, "alogout"):
+        return await auth.alogout(request)
+    return await sync_to_async(auth.logout)(request)
+
+
+async def aget_user(request):
+    """
+    Returns the user of the request, without evaluating the lazy request.user
+    on the event loop.
+    """
+    if hasattr(request, "auser"):
+        return await request.auser()
+
+    def get_user():
+        # resolves the lazy object, so it can be used on the event loop later
+        request.user.is_authenticated
+        return request.user
+
+    return await sync_to_async(get_user)()
+
+
+async def asend(signal, sender, **named):
+    if hasattr(signal, "asend"):
+        return await signal.asend(sender, **named)
+    return await sync_to_async(signal.send)(sender, **named)
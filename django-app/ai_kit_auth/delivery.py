@@ -0,0 +1,129 @@
+"""
+Delivery of the mails of ai_kit_auth after the transaction commits.
+
+By default, the SEND_*_MAIL functions render and send a mail right away, in
+the middle of the request. If the transaction of the request is rolled back
+later, e.g. with ATOMIC_REQUESTS, the mail was sent to a user that doesn't
+exist. If BACKGROUND_MAIL_DELIVERY is enabled, they are called with
+transaction.on_commit instead, on a pool of MAX_WORKERS threads, so that the
+response doesn't wait for the mail server either. If MAX_QUEUE mails are
+waiting for a worker already, further mails are sent on the calling thread.
+
+The pool is drained when the process exits. Servers that stop their workers
+without running atexit handlers can call shutdown themselves.
+"""
+
+import atexit
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+logger = logging.getLogger(__name__)
+
+
+class MailExecutor:
+    """
+    Runs the mail functions on a thread pool, but runs them on the calling
+    thread instead of queueing more than max_queue of them.
+    """
+
+    def __init__(self, max_workers=2, max_queue=100):
+        self._pool = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="ai_kit_auth_mail"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    @staticmethod
+    def _call(fn, *args):
+        try:
+            fn(*args)
+        except Exception:
+            # the transaction is committed already and the response may be
+            # sent, so nobody could handle the error anymore
+            logger.exception("Sending a mail failed")
+
+    def _run(self, fn, *args):
+        try:
+            self._call(fn, *args)
+        finally:
+            self._slots.release()
+            # the workers don't belong to a request, which would close them
+            connections.close_all()
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self._call(fn, *args)
+            return
+        try:
+            self._pool.submit(self._run, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the executor for mails or None, if they are sent right away.
+    """
+    global _executor
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    config = api_settings.BACKGROUND_MAIL_DELIVERY
+    if not config.ENABLED:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = MailExecutor(config.MAX_WORKERS, config.MAX_QUEUE)
+        return _executor
+
+
+@atexit.register
+def shutdown():
+    """
+    Waits until all queued mails are sent.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+@receiver(setting_changed)
+def reset_executor(*args, **kwargs):
+    if kwargs["setting"] == "AI_KIT_AUTH":
+        shutdown()
+
+
+def deliver(fn, *args):
+    """
+    Calls the mail function fn with args, right away or, if
+    BACKGROUND_MAIL_DELIVERY is enabled, on the pool once the current
+    transaction is committed.
+    """
+    if get_executor() is None:
+        fn(*args)
+        return
+    transaction.on_commit(functools.partial(_submit, fn, *args))
+
+
+def _submit(fn, *args):
+    # looked up again, since it may have been shut down until the commit
+    executor = get_executor()
+    if executor is None:
+        fn(*args)
+    else:
+        executor.submit(fn, *args)
@@ -0,0 +1,106 @@
+"""
+Registry of the compiled templates of the EMAIL_TEMPLATES setting.
+
+Every mail needs three templates. Without django's cached template loader,
+e.g. with DEBUG or custom loaders, every mail would look up and compile all
+of them again, as well as the templates they extend or include. If
+CACHE_EMAIL_TEMPLATES is set, they are compiled once per template set and
+language instead. The subject is rendered without a context, so it is
+rendered only once as well.
+"""
+
+import copy
+import threading
+
+from django.dispatch import receiver
+from django.template import Engine
+from django.template.backends.django import Template as DjangoTemplate
+from django.template.loader import get_template
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test.signals import setting_changed
+from django.utils import translation
+
+
+class EmailTemplateSet:
+    """
+    The compiled templates of an entry of EMAIL_TEMPLATES, e.g. RESET_PASSWORD.
+    """
+
+    def __init__(self, config, load=None):
+        load = load or get_template
+        self.plaintext = load(config.BODY_PLAINTEXT)
+        self.html = load(config.BODY_HTML)
+        self.subject = load(config.TITLE).render().replace("\n", " ")
+
+    def render(self, context):
+        """
+        Returns the subject, the plaintext and the html body.
+        """
+        return self.subject, self.plaintext.render(context), self.html.render(context)
+
+
+def _caching_engine(engine):
+    """
+    Returns a copy of a django template engine, which caches all templates
+    it loads, or the engine itself if it does so already.
+    """
+    if all(isinstance(loader, CachedLoader) for loader in engine.template_loaders):
+        return engine
+    caching_engine = copy.copy(engine)
+    caching_engine.loaders = [("django.template.loaders.cached.Loader", engine.loaders)]
+    # a cached property, which would be copied as well
+    caching_engine.__dict__.pop("template_loaders", None)
+    return caching_engine
+
+
+class EmailTemplateRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._template_sets = {}
+        self._engines = {}
+
+    def _get_template(self, name):
+        template = get_template(name)
+        engine = getattr(getattr(template, "template", None), "engine", None)
+        if not isinstance(engine, Engine):
+            # e.g. jinja2 templates, which are compiled completely already
+            return template
+        with self._lock:
+            if engine not in self._engines:
+                self._engines[engine] = _caching_engine(engine)
+            caching_engine = self._engines[engine]
+        # loaded again, so that extended and included templates are cached
+        return DjangoTemplate(caching_engine.get_template(name), template.backend)
+
+    def get(self, name):
+        """
+        Returns the template set of the EMAIL_TEMPLATES entry name for the
+        active language.
+        """
+        # imported here, because the settings object is replaced on reload
+        from .settings import api_settings
+
+        config = getattr(api_settings.EMAIL_TEMPLATES, name)
+        if not api_settings.CACHE_EMAIL_TEMPLATES:
+            return EmailTemplateSet(config)
+        key = (name, translation.get_language())
+        template_set = self._template_sets.get(key)
+        if template_set is None:
+            template_set = EmailTemplateSet(config, self._get_template)
+            with self._lock:
+                template_set = self._template_sets.setdefault(key, template_set)
+        return template_set
+
+    def clear(self):
+        with self._lock:
+            self._template_sets.clear()
+            self._engines.clear()
+
+
+email_templates = EmailTemplateRegistry()
+
+
+@receiver(setting_changed)
+def clear_email_templates(*args, **kwargs):
+    if kwargs["setting"] in ("AI_KIT_AUTH", "TEMPLATES", "INSTALLED_APPS"):
+        email_templates.clear()
@@ -0,0 +1,292 @@
+"""
+Password hashing on a bounded worker pool.
+
+Hashing a password is deliberately expensive. Done inline, a burst of logins,
+registrations or password resets occupies every request worker with hashing,
+until nothing else gets served anymore. If the PASSWORD_HASHING setting is
+enabled, the hashing runs on a pool with a fixed number of workers instead.
+Only MAX_QUEUE hashes may wait for a free worker; beyond that, requests are
+rejected right away with a 503 and a Retry-After header, instead of piling up.
+
+Only the hashing itself runs on the pool, all database work stays on the
+request thread. The time hashes wait in the queue and the time they take are
+recorded in hashing_metrics, which can be used to size the pool.
+"""
+
+import asyncio
+import functools
+import math
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import hashers
+from django.dispatch import receiver
+from django.utils.crypto import get_random_string
+from django.test.signals import setting_changed
+from rest_framework import status
+from rest_framework.exceptions import APIException, ErrorDetail
+
+
+class HashingOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_code = "server_busy"
+
+    def __init__(self, wait):
+        code = self.default_code
+        super().__init__({"non_field_errors": [ErrorDetail(code, code=code)]})
+        # the exception handler of rest framework sets the Retry-After header
+        self.wait = max(1, math.ceil(wait))
+
+
+class HashingMetrics:
+    """
+    Collects how long hashes waited for a worker and how long they took.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, queue_wait, duration):
+        with self._lock:
+            self._calls += 1
+            self._queue_wait += queue_wait
+            self._duration += duration
+            self._max_queue_wait = max(self._max_queue_wait, queue_wait)
+            self._max_duration = max(self._max_duration, duration)
+
+    def reject(self):
+        with self._lock:
+            self._rejected += 1
+
+    def export(self):
+        """
+        Returns the metrics as a dictionary, e.g. to send them to a metrics
+        system.
+        """
+        with self._lock:
+            calls = self._calls
+            return {
+                "calls": calls,
+                "rejected": self._rejected,
+                "mean_queue_wait_seconds": self._queue_wait / calls if calls else 0.0,
+                "max_queue_wait_seconds": self._max_queue_wait,
+                "mean_duration_seconds": self._duration / calls if calls else 0.0,
+                "max_duration_seconds": self._max_duration,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._calls = 0
+            self._rejected = 0
+            self._queue_wait = 0.0
+            self._duration = 0.0
+            self._max_queue_wait = 0.0
+            self._max_duration = 0.0
+
+
+hashing_metrics = HashingMetrics()
+
+
+def _setup_worker():
+    # spawned worker processes have to set up django on their own
+    import django
+
+    django.setup()
+
+
+def _timed(submitted, fn, *args):
+    started = time.monotonic()
+    result = fn(*args)
+    return started - submitted, time.monotonic() - started, result
+
+
+class BoundedExecutor:
+    """
+    Runs functions on a thread or process pool, but refuses to queue more
+    than max_queue calls while all max_workers workers are busy.
+
+    A thread pool suffices for hashers that release the GIL, like the PBKDF2,
+    bcrypt and argon2 hashers of django. Other hashers need a process pool.
+    """
+
+    def __init__(
+        self, kind="thread", max_workers=4, max_queue=16, retry_after=1, metrics=None
+    ):
+        if kind == "process":
+            self._pool = ProcessPoolExecutor(max_workers, initializer=_setup_worker)
+        elif kind == "thread":
+            self._pool = ThreadPoolExecutor(
+                max_workers, thread_name_prefix="ai_kit_auth_hashing"
+            )
+        else:
+            raise ValueError(f"Unknown executor kind {kind}")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self.retry_after = retry_after
+        self.metrics = metrics or hashing_metrics
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.metrics.reject()
+            raise HashingOverloaded(self.retry_after)
+        try:
+            future = self._pool.submit(_timed, time.monotonic(), fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _result(self, outcome):
+        queue_wait, duration, result = outcome
+        self.metrics.record(queue_wait, duration)
+        return result
+
+    def run(self, fn, *args):
+        """
+        Calls fn with args on the pool and waits for the result. Raises
+        HashingOverloaded, if too many calls are waiting already.
+        """
+        return self._result(self._submit(fn, *args).result())
+
+    async def arun(self, fn, *args):
+        """
+        Async version of run, which does not block the event loop.
+        """
+        return self._result(await asyncio.wrap_future(self._submit(fn, *args)))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the executor for hashing or None, if hashing happens inline.
+    """
+    global _executor
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    config = api_settings.PASSWORD_HASHING
+    if not config.ENABLED:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = BoundedExecutor(
+                kind=config.EXECUTOR,
+                max_workers=config.MAX_WORKERS,
+                max_queue=config.MAX_QUEUE,
+                retry_after=config.RETRY_AFTER,
+            )
+        return _executor
+
+
+@receiver(setting_changed)
+def reset_executor(*args, **kwargs):
+    global _executor
+    if kwargs["setting"] == "AI_KIT_AUTH":
+        with _executor_lock:
+            if _executor is not None:
+                _executor.shutdown()
+            _executor = None
+
+
+def _run(fn, *args):
+    executor = get_executor()
+    if executor is None:
+        return fn(*args)
+    return executor.run(fn, *args)
+
+
+async def _arun(fn, *args):
+    executor = get_executor()
+    if executor is None:
+        # hashing does not touch the database, so any thread will do
+        return await sync_to_async(fn, thread_sensitive=False)(*args)
+    return await executor.arun(fn, *args)
+
+
+def make_password(password):
+    return _run(hashers.make_password, password)
+
+
+async def amake_password(password):
+    return await _arun(hashers.make_password, password)
+
+
+def check_password(password, encoded):
+    return _run(hashers.check_password, password, encoded)
+
+
+async def acheck_password(password, encoded):
+    return await _arun(hashers.check_password, password, encoded)
+
+
+@functools.lru_cache(maxsize=None)
+def dummy_password_hash():
+    """
+    A hash of a random password, made with the preferred hasher. Checking a
+    password against it takes as long as checking it against the hash of a
+    real user.
+    """
+    return hashers.make_password(get_random_string(32))
+
+
+@receiver(setting_changed)
+def reset_dummy_password_hash(*args, **kwargs):
+    if kwargs["setting"] == "PASSWORD_HASHERS":
+        dummy_password_hash.cache_clear()
+
+
+def set_password(user, raw_password):
+    """
+    Like user.set_password, but hashes on the pool. Without a pool,
+    user.set_password itself is used, which custom user models may override.
+    """
+    if get_executor() is None:
+        user.set_password(raw_password)
+        return
+    user.password = make_password(raw_password)
+    # checked against the password validators when the user is saved
+    user._password = raw_password
+
+
+async def aset_password(user, raw_password):
+    if get_executor() is None:
+        # hashing does not touch the database, so any thread will do
+        await sync_to_async(user.set_password, thread_sensitive=False)(raw_password)
+        return
+    user.password = await amake_password(raw_password)
+    user._password = raw_password
+
+
+def _must_update(encoded):
+    preferred = hashers.get_hasher("default")
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def check_user_password(user, raw_password):
+    """
+    Like user.check_password, but hashes on the pool. Hashes of outdated
+    algorithms or iteration counts are upgraded, just like django does.
+    Without a pool, user.check_password itself is used, which custom user
+    models may override.
+    """
+    if get_executor() is None:
+        return user.check_password(raw_password)
+    correct = check_password(raw_password, user.password)
+    if correct and _must_update(user.password):
+        set_password(user, raw_password)
+        user._password = None
+        user.save(update_fields=["password"])
+    return correct
@@ -0,0 +1,399 @@
+"""
+Resolution of the "ident" parameter of the api to a user.
+
+The configured USER_IDENTITY_FIELDS are turned into a lookup plan once per
+process. A lookup then needs only a single query, in which every identity
+field is OR'd together. The rows are afterwards matched against the fields in
+priority order, so that the first field with exactly one matching user wins,
+just like iterating over the fields and calling get() for each of them.
+"""
+
+import hashlib
+import math
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models import BooleanField, EmailField, ExpressionWrapper, Q
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+from .compat import alist
+
+UserModel = get_user_model()
+
+
+class IdentityField:
+    """
+    A single entry of the lookup plan.
+    """
+
+    def __init__(self, field, lowercase_emails=False):
+        self.name = field.name
+        self.is_email = isinstance(field, EmailField)
+        self.normalize = None
+        if not self.is_email:
+            self.lookup = field.name
+        elif lowercase_emails:
+            # emails are stored lowercase, so an exact lookup suffices
+            self.lookup = field.name
+            self.normalize = str.lower
+        else:
+            self.lookup = f"{field.name}__iexact"
+        # name of the boolean annotation marking rows matched by this field
+        self.flag = f"_ai_kit_auth_match_{field.name}"
+
+    def q(self, value):
+        if self.normalize and isinstance(value, str):
+            value = self.normalize(value)
+        return Q(**{self.lookup: value})
+
+    def matches(self, instance, value):
+        """
+        Compares the value of the field of instance like the lookup does.
+        """
+        stored = getattr(instance, self.name)
+        if self.normalize and isinstance(value, str):
+            value = self.normalize(value)
+        if self.lookup.endswith("__iexact"):
+            return str(stored).upper() == str(value).upper()
+        return stored == value
+
+
+class IdentityCache:
+    """
+    Caches which user (by primary key) an identity resolved to, or that it
+    resolved to no user at all, so that lookups of active users and repeated
+    lookups of unknown identities don't have to query the identity fields.
+
+    When a user is created, deleted or changes an identity field, only the
+    entries of its old and new identities are deleted. Identities are
+    lowercased for the keys, so that all spellings of an email share a key,
+    and the exact identity is stored with the entry, since username lookups
+    are case sensitive. Entries of unknown identities are additionally
+    stored with the missing generation, which is bumped on every such
+    change, so that a lookup racing with a signup can't remember the new
+    identity as unknown. The generation is only bumped if the identities of
+    a changed user are not known, and invalidates all entries.
+
+    To avoid that all workers resolve a popular identity at the same time
+    when its entry expires, entries are refreshed early with a probability
+    that grows as the expiry approaches (probabilistic early expiration).
+    """
+
+    GENERATION_KEY = "ai_kit_auth:identity:generation"
+    MISSING_GENERATION_KEY = "ai_kit_auth:identity:missing_generation"
+
+    def __init__(self, cache_alias, timeout, missing_timeout, beta=1.0):
+        self.cache = caches[cache_alias]
+        self.timeout = timeout
+        self.missing_timeout = missing_timeout
+        self.beta = beta
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @staticmethod
+    def key(value):
+        digest = hashlib.sha256(str(value).lower().encode()).hexdigest()
+        return f"ai_kit_auth:identity:{digest}"
+
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def _lookup(self, values, value):
+        generation = (
+            values.get(self.GENERATION_KEY, 0),
+            values.get(self.MISSING_GENERATION_KEY, 0),
+        )
+        entry = values.get(self.key(value))
+        if entry is None or not self._valid(entry, generation, value):
+            self._count("misses")
+            return None, generation
+        _, pk, field_name, delta, expires = entry
+        # 1 - random() is never 0
+        if time.time() - delta * self.beta * math.log(1 - random.random()) >= expires:
+            self._count("early_refreshes")
+            return None, generation
+        self._count("hits")
+        return (pk, field_name), generation
+
+    @staticmethod
+    def _valid(entry, generation, value):
+        (entry_generation, entry_value), pk = entry[0], entry[1]
+        if entry_value != value:
+            # another spelling of the identity
+            return False
+        if pk is None:
+            return entry_generation == generation
+        return entry_generation[0] == generation[0]
+
+    def _keys(self, value):
+        return [self.GENERATION_KEY, self.MISSING_GENERATION_KEY, self.key(value)]
+
+    def lookup(self, value):
+        """
+        Returns the primary key (None for no user) and the name of the field
+        value was found by, or None if value is not cached, together with the
+        generation, which has to be passed to remember.
+        """
+        return self._lookup(self.cache.get_many(self._keys(value)), value)
+
+    async def alookup(self, value):
+        return self._lookup(await self.cache.aget_many(self._keys(value)), value)
+
+    def _entry(self, value, generation, pk, field_name, delta):
+        timeout = self.missing_timeout if pk is None else self.timeout
+        expires = time.time() + timeout
+        return ((generation, value), pk, field_name, delta, expires), timeout
+
+    def remember(self, value, generation, pk, field_name, delta):
+        """
+        Stores that value resolved to the user with the primary key pk by the
+        field field_name, which took delta seconds.
+        """
+        entry, timeout = self._entry(value, generation, pk, field_name, delta)
+        self.cache.set(self.key(value), entry, timeout)
+
+    async def aremember(self, value, generation, pk, field_name, delta):
+        entry, timeout = self._entry(value, generation, pk, field_name, delta)
+        await self.cache.aset(self.key(value), entry, timeout)
+
+    def _bump(self, key):
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # evicted in the meantime
+            self.cache.set(key, 1, None)
+
+    def invalidate(self, values=None):
+        """
+        Deletes the entries of the identities in values, or invalidates all
+        entries if values is None. Entries of unknown identities are always
+        invalidated.
+        """
+        if values is None:
+            self._bump(self.GENERATION_KEY)
+        else:
+            keys = {self.key(value) for value in values if value is not None}
+            self.cache.delete_many(list(keys))
+        self._bump(self.MISSING_GENERATION_KEY)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = sum(stats.values())
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"hits": 0, "misses": 0, "early_refreshes": 0}
+
+
+class IdentityResolver:
+    """
+    Finds users by the configured identity fields.
+
+    If route_by_shape is set, the order of the fields depends on the given
+    value: email fields are tried first if it contains an "@", all other
+    fields first if it does not. Otherwise the configured order is used.
+
+    If lowercase_emails is set, emails are expected to be stored lowercase
+    and are compared exactly instead of case insensitive.
+
+    If a cache is given, resolved identities are remembered there.
+    """
+
+    def __init__(
+        self,
+        field_names,
+        route_by_shape=False,
+        lowercase_emails=False,
+        cache=None,
+    ):
+        self.fields = tuple(
+            IdentityField(UserModel._meta.get_field(name), lowercase_emails)
+            for name in field_names
+        )
+        self.route_by_shape = route_by_shape
+        self.cache = cache
+        emails = tuple(f for f in self.fields if f.is_email)
+        others = tuple(f for f in self.fields if not f.is_email)
+        self._email_first = emails + others
+        self._others_first = others + emails
+
+    def plan(self, value):
+        if not self.route_by_shape:
+            return self.fields
+        # value may be any JSON value sent by the client
+        return self._email_first if "@" in str(value) else self._others_first
+
+    def _matching(self, fields, values):
+        """
+        Returns a queryset of the users matching any of the fields, annotated
+        with a flag per field telling which of the fields matched.
+        """
+        query = Q()
+        annotations = {}
+        for field in fields:
+            condition = field.q(values[field.name])
+            query |= condition
+            annotations[field.flag] = ExpressionWrapper(
+                condition, output_field=BooleanField()
+            )
+        return UserModel.objects.annotate(**annotations).filter(query)
+
+    @staticmethod
+    def _identified(fields, users):
+        """
+        Returns the first field matching exactly one of the users and the
+        user, or None for both.
+        """
+        for field in fields:
+            matches = [user for user in users if getattr(user, field.flag)]
+            if len(matches) == 1:
+                return field, matches[0]
+        return None, None
+
+    def _verified(self, user, field_name, value):
+        """
+        Returns whether the cached user still has the identity, in case it
+        was changed without sending signals.
+        """
+        field = next((f for f in self.fields if f.name == field_name), None)
+        return user is not None and field is not None and field.matches(user, value)
+
+    def resolve(self, value):
+        """
+        Returns the user identified by value or None, if no field matches
+        exactly one user.
+        """
+        if not self.fields:
+            return None
+        if self.cache:
+            cached, generation = self.cache.lookup(value)
+            if cached is not None:
+                pk, field_name = cached
+                if pk is None:
+                    return None
+                user = UserModel.objects.filter(pk=pk).first()
+                if self._verified(user, field_name, value):
+                    return user
+        started = time.monotonic()
+        fields = self.plan(value)
+        users = self._matching(fields, {field.name: value for field in fields})
+        field, user = self._identified(fields, list(users))
+        if self.cache:
+            self.cache.remember(
+                value,
+                generation,
+                None if user is None else user.pk,
+                None if field is None else field.name,
+                time.monotonic() - started,
+            )
+        return user
+
+    async def aresolve(self, value):
+        """
+        Async version of resolve.
+        """
+        if not self.fields:
+            return None
+        if self.cache:
+            cached, generation = await self.cache.alookup(value)
+            if cached is not None:
+                pk, field_name = cached
+                if pk is None:
+                    return None
+                users = await alist(UserModel.objects.filter(pk=pk)[:1])
+                user = users[0] if users else None
+                if self._verified(user, field_name, value):
+                    return user
+        started = time.monotonic()
+        fields = self.plan(value)
+        users = self._matching(fields, {field.name: value for field in fields})
+        field, user = self._identified(fields, await alist(users))
+        if self.cache:
+            await self.cache.aremember(
+                value,
+                generation,
+                None if user is None else user.pk,
+                None if field is None else field.name,
+                time.monotonic() - started,
+            )
+        return user
+
+    @property
+    def covers_username(self):
+        """
+        Whether a user that is not found by resolve can't be found by its
+        username either.
+        """
+        return any(field.name == UserModel.USERNAME_FIELD for field in self.fields)
+
+    def identity(self, instance):
+        """
+        Returns the values of the identity fields of a user instance, which
+        are None if they were not loaded.
+        """
+        return tuple(instance.__dict__.get(field.name) for field in self.fields)
+
+    def normalize_instance(self, instance):
+        """
+        Normalizes the identity values of a user instance before it is saved.
+        """
+        for field in self.fields:
+            value = getattr(instance, field.name)
+            if field.normalize and isinstance(value, str):
+                setattr(instance, field.name, field.normalize(value))
+
+    def conflicting_field(self, values):
+        """
+        Returns the name of the first identity field for which a user with
+        the respective value in values already exists, or None.
+        """
+        if not self.fields:
+            return None
+        users = list(self._matching(self.fields, values))
+        for field in self.fields:
+            if any(getattr(user, field.flag) for user in users):
+                return field.name
+        return None
+
+
+_resolver = None
+
+
+def get_identity_resolver():
+    global _resolver
+    if _resolver is None:
+        # imported here, because the settings object is replaced on reload
+        from .settings import api_settings
+
+        cache_settings = api_settings.IDENTITY_CACHE
+        cache = None
+        if cache_settings.ENABLED:
+            cache = IdentityCache(
+                cache_settings.CACHE_ALIAS,
+                cache_settings.TIMEOUT,
+                cache_settings.MISSING_TIMEOUT,
+                cache_settings.EARLY_REFRESH_BETA,
+            )
+        _resolver = IdentityResolver(
+            api_settings.USER_IDENTITY_FIELDS,
+            route_by_shape=api_settings.ROUTE_IDENTITY_BY_SHAPE,
+            lowercase_emails=api_settings.LOWERCASE_EMAILS,
+            cache=cache,
+        )
+    return _resolver
+
+
+@receiver(setting_changed)
+def reset_identity_resolver(*args, **kwargs):
+    global _resolver
+    if kwargs["setting"] == "AI_KIT_AUTH":
+        _resolver = None
@@ -0,0 +1,152 @@
+"""
+Database indexes matching the identity lookups.
+
+Email identity fields are looked up case insensitive (``__iexact``). On
+PostgreSQL this compares ``UPPER(email)``, which can't use a plain index on
+the column. The helpers in this module create functional indexes for these
+lookups, or plain indexes if LOWERCASE_EMAILS is configured and emails are
+compared exactly.
+
+To add the indexes with a migration in your project:
+
+from django.db import migrations
+from ai_kit_auth.indexes import create_identity_indexes, drop_identity_indexes
+
+class Migration(migrations.Migration):
+    dependencies = [...]
+    operations = [
+        migrations.RunPython(create_identity_indexes, drop_identity_indexes),
+    ]
+
+Alternatively, run ``python manage.py create_identity_indexes``.
+"""
+
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.db import DatabaseError, connections
+from django.db.models import Index
+from django.db.models.functions import Upper
+
+from .identity import get_identity_resolver
+
+
+def identity_index_name(model, field_name, functional):
+    digest = hashlib.sha1(
+        f"{model._meta.db_table}.{field_name}.{functional}".encode()
+    ).hexdigest()
+    return f"aka_{field_name[:12]}_{digest[:8]}"
+
+
+def _identity_indexes(model):
+    for identity_field in get_identity_resolver().fields:
+        field = model._meta.get_field(identity_field.name)
+        functional = identity_field.lookup.endswith("__iexact")
+        if functional:
+            expressions, fields = (Upper(field.name),), ()
+        elif field.db_index or field.unique:
+            continue
+        else:
+            expressions, fields = (), (field.name,)
+        name = identity_index_name(model, field.name, functional)
+        yield field, Index(*expressions, fields=fields, name=name)
+
+
+def identity_indexes(model=None):
+    """
+    Returns the indexes required by the identity lookups of the given model,
+    which defaults to the user model. Fields that are already indexed and
+    looked up exactly don't need an additional index.
+    """
+    return [index for _, index in _identity_indexes(model or get_user_model())]
+
+
+def _existing_index_names(schema_editor, model):
+    with schema_editor.connection.cursor() as cursor:
+        return set(
+            schema_editor.connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            )
+        )
+
+
+def create_identity_indexes(apps, schema_editor):
+    """
+    Creates the missing identity indexes. Can be used with RunPython.
+    Returns the names of the created indexes.
+    """
+    model = get_user_model()
+    existing = _existing_index_names(schema_editor, model)
+    created = []
+    for index in identity_indexes(model):
+        if index.name not in existing:
+            schema_editor.add_index(model, index)
+            created.append(index.name)
+    return created
+
+
+def drop_identity_indexes(apps, schema_editor):
+    """
+    Removes the identity indexes again. Can be used with RunPython.
+    """
+    model = get_user_model()
+    existing = _existing_index_names(schema_editor, model)
+    for index in identity_indexes(model):
+        if index.name in existing:
+            schema_editor.remove_index(model, index)
+
+
+def _matches(index, constraint, column):
+    """
+    Checks whether an introspected constraint can serve the given index.
+    """
+    if index.contains_expressions:
+        definition = (constraint.get("definition") or "").lower()
+        return f"upper(({column})" in definition or f"upper({column})" in definition
+    return constraint.get("columns", [])[:1] == [column]
+
+
+def missing_identity_indexes(using="default"):
+    """
+    Returns the identity indexes that neither exist in the database nor are
+    declared on the user model.
+    """
+    model = get_user_model()
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+    declared = {index.name for index in model._meta.indexes}
+    return [
+        index
+        for field, index in _identity_indexes(model)
+        if index.name not in declared
+        and index.name not in constraints
+        and not any(_matches(index, c, field.column) for c in constraints.values())
+    ]
+
+
+def identity_index_check(app_configs=None, databases=None, **kwargs):
+    warnings = []
+    for alias in databases or []:
+        try:
+            missing = missing_identity_indexes(alias)
+        except DatabaseError:
+            continue
+        for index in missing:
+            if index.contains_expressions and connections[alias].vendor != "postgresql":
+                # other databases either don't compare case insensitive with
+                # UPPER() or can't make use of the functional index
+                continue
+            warnings.append(
+                checks.Warning(
+                    f"No index matches the identity lookup of {index.name}.",
+                    hint="Run 'python manage.py create_identity_indexes' or "
+                    "add ai_kit_auth.indexes.create_identity_indexes to a "
+                    "migration.",
+                    id="ai_kit_auth.W001",
+                )
+            )
+    return warnings
@@ -0,0 +1,42 @@
+import gzip
+
+from django.core.management.base import BaseCommand
+
+from ...password_validation import write_password_filter
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the password filter file for the BreachedPasswordValidator "
+        "from a list of passwords or SHA-1 hashes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input",
+            help="Text file with one password or hash per line, may be gzipped.",
+        )
+        parser.add_argument("output", help="Path of the password filter file.")
+        parser.add_argument(
+            "--hashed",
+            action="store_true",
+            help="Lines contain hex encoded SHA-1 hashes instead of passwords, "
+            "e.g. the 'Pwned Passwords' list.",
+        )
+        parser.add_argument(
+            "--case-sensitive",
+            action="store_true",
+            help="Don't lowercase plain text passwords before hashing them.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["input"]
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8", errors="replace") as lines:
+            count = write_password_filter(
+                lines,
+                options["output"],
+                hashed=options["hashed"],
+                lowercase=not options["case_sensitive"],
+            )
+        self.stdout.write(f"Wrote {count} entries to {options['output']}")
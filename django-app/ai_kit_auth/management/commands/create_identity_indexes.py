@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from ...indexes import create_identity_indexes, drop_identity_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the database indexes matching the lookups of the "
+        "configured USER_IDENTITY_FIELDS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help='Nominates a database. Defaults to the "default" database.',
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Removes the indexes instead of creating them.",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        with connection.schema_editor() as schema_editor:
+            if options["drop"]:
+                drop_identity_indexes(None, schema_editor)
+                return
+            created = create_identity_indexes(None, schema_editor)
+        for name in created:
+            self.stdout.write(f"Created index {name}")
+        if not created:
+            self.stdout.write("All identity indexes exist already")
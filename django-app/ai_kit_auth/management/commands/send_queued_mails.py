@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ... import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Delivers the mails in the outbox (see the MAIL_OUTBOX setting). Runs "
+        "until it is stopped, unless --once is given. Several workers can run "
+        "in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Delivers the mails that are due and exits.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Number of mails sent over one connection. Defaults to "
+            "MAIL_OUTBOX.BATCH_SIZE.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Seconds to wait for new mails. Defaults to "
+            "MAIL_OUTBOX.POLL_INTERVAL.",
+        )
+
+    def handle(self, *args, **options):
+        from ...settings import api_settings
+
+        interval = options["interval"] or api_settings.MAIL_OUTBOX.POLL_INTERVAL
+        while True:
+            try:
+                delivered, failed = outbox.deliver(options["batch_size"])
+            # e.g. the mail server is not reachable
+            except Exception as exc:
+                if options["once"]:
+                    raise
+                self.stderr.write(f"Delivery failed: {type(exc).__name__}: {exc}")
+            else:
+                if delivered or failed:
+                    self.stdout.write(f"Delivered {delivered} mails, {failed} failed")
+            if options["once"]:
+                return
+            try:
+                time.sleep(interval)
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,46 @@
+# Generated by Django 4.0.3 on 2026-10-18 08:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="QueuedMail",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("subject", models.TextField()),
+                ("body", models.TextField()),
+                ("html", models.TextField(blank=True)),
+                ("from_email", models.CharField(max_length=254)),
+                ("to", models.CharField(max_length=254)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "next_attempt",
+                    models.DateTimeField(default=django.utils.timezone.now, null=True),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="queuedmail",
+            index=models.Index(
+                fields=["next_attempt"], name="ai_kit_auth_next_at_4fffe1_idx"
+            ),
+        ),
+    ]
@@ -1,3 +1,26 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class QueuedMail(models.Model):
+    """
+    A mail in the outbox, which is delivered by the send_queued_mails command
+    (see ai_kit_auth/outbox.py). Mails are deleted once they are delivered.
+    """
+
+    subject = models.TextField()
+    body = models.TextField()
+    html = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.CharField(max_length=254)
+    created = models.DateTimeField(auto_now_add=True)
+    # null once delivery was given up
+    next_attempt = models.DateTimeField(default=timezone.now, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["next_attempt"])]
+
+    def __str__(self):
+        return f"{self.subject} ({self.to})"
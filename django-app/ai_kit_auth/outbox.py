@@ -0,0 +1,121 @@
+"""
+Persistent outbox for the mails of ai_kit_auth.
+
+Sent inline, every activation or password reset mail makes the request wait
+for the mail server. If MAIL_OUTBOX is enabled, send_email stores the mails
+as QueuedMail rows instead, which the send_queued_mails command delivers in
+batches over a single connection. Due mails are locked with
+select_for_update(skip_locked=True), so several workers can run in parallel
+without sending a mail twice. Failed deliveries are retried with an
+exponentially growing delay, until MAX_ATTEMPTS is reached.
+"""
+
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import QueuedMail
+
+
+def enabled():
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    return api_settings.MAIL_OUTBOX.ENABLED
+
+
+def enqueue(subject, text, html, from_address, to_address):
+    return QueuedMail.objects.create(
+        subject=subject, body=text, html=html, from_email=from_address, to=to_address
+    )
+
+
+def enqueue_many(mails, from_address):
+    """
+    Stores the (subject, text, html, to_address) tuples mails at once.
+    """
+    return QueuedMail.objects.bulk_create(
+        QueuedMail(
+            subject=subject, body=text, html=html, from_email=from_address, to=to
+        )
+        for subject, text, html, to in mails
+    )
+
+
+def _message(mail, connection):
+    message = EmailMultiAlternatives(
+        mail.subject, mail.body, mail.from_email, [mail.to], connection=connection
+    )
+    if mail.html:
+        message.attach_alternative(mail.html, "text/html")
+    return message
+
+
+def _retry_delay(config, attempts):
+    exponent = min(attempts - 1, 32)
+    return min(config.BACKOFF_MAX, config.BACKOFF_BASE * 2**exponent)
+
+
+def deliver_batch(batch_size=None, connection=None):
+    """
+    Delivers up to batch_size due mails over a single connection and returns
+    the numbers of delivered and failed mails. Errors of the connection
+    itself are raised, without counting as an attempt.
+    """
+    from .settings import api_settings
+
+    config = api_settings.MAIL_OUTBOX
+    batch_size = batch_size or config.BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        mails = list(
+            QueuedMail.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt__lte=now)
+            .order_by("next_attempt", "pk")[:batch_size]
+        )
+        if not mails:
+            return 0, 0
+
+        connection = connection or get_connection()
+        delivered, failed = [], []
+        with connection:
+            for mail in mails:
+                try:
+                    connection.send_messages([_message(mail, connection)])
+                # any error of the backend, e.g. a refused recipient
+                except Exception as exc:
+                    mail.attempts += 1
+                    mail.last_error = f"{type(exc).__name__}: {exc}"
+                    if mail.attempts >= config.MAX_ATTEMPTS:
+                        mail.next_attempt = None
+                    else:
+                        delay = _retry_delay(config, mail.attempts)
+                        mail.next_attempt = now + timedelta(seconds=delay)
+                    failed.append(mail)
+                else:
+                    delivered.append(mail.pk)
+
+        QueuedMail.objects.filter(pk__in=delivered).delete()
+        QueuedMail.objects.bulk_update(
+            failed, ["attempts", "last_error", "next_attempt"]
+        )
+    return len(delivered), len(failed)
+
+
+def deliver(batch_size=None, connection=None):
+    """
+    Delivers batches until no mails are due anymore and returns the total
+    numbers of delivered and failed mails.
+    """
+    from .settings import api_settings
+
+    batch_size = batch_size or api_settings.MAIL_OUTBOX.BATCH_SIZE
+    total_delivered = total_failed = 0
+    while True:
+        delivered, failed = deliver_batch(batch_size, connection)
+        total_delivered += delivered
+        total_failed += failed
+        if delivered + failed < batch_size:
+            return total_delivered, total_failed
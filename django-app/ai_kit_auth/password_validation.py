@@ -0,0 +1,508 @@
+"""
+Additional password validators, which can be added to the
+AUTH_PASSWORD_VALIDATORS setting, a validation pipeline that keeps track
+of the cost of each validator and a description of the configured validators
+for the frontend.
+"""
+
+import base64
+import functools
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import password_validation
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.crypto import salted_hmac
+from django.utils.translation import gettext as _
+
+# header: magic, format version, flags, number of entries
+HEADER = struct.Struct(">8sHHQ")
+MAGIC = b"AIKPWFLT"
+VERSION = 1
+FLAG_LOWERCASE = 1
+ENTRY = struct.Struct(">Q")
+
+
+def password_hash(password, lowercase):
+    """
+    The first 64 bits of the SHA-1 hash of a password, as stored in the
+    password filter.
+    """
+    if lowercase:
+        password = password.lower()
+    return ENTRY.unpack_from(hashlib.sha1(password.encode()).digest())[0]
+
+
+class PasswordFilter:
+    """
+    A read only, sorted array of password hashes on disk. It is memory mapped,
+    so all processes using the same file share its pages instead of holding
+    their own copy of the password list.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, self.count = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a password filter file")
+        if len(self._mmap) != HEADER.size + self.count * ENTRY.size:
+            raise ValueError(f"{path} is truncated")
+        self.lowercase = bool(flags & FLAG_LOWERCASE)
+
+    def __contains__(self, password):
+        needle = password_hash(password, self.lowercase)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry = ENTRY.unpack_from(self._mmap, HEADER.size + middle * ENTRY.size)[0]
+            if entry < needle:
+                low = middle + 1
+            elif entry > needle:
+                high = middle
+            else:
+                return True
+        return False
+
+
+def _sorted_runs(hashes, chunk_size):
+    """
+    Sorts the hashes in chunks of chunk_size entries, which are spilled into
+    temporary files if there is more than one chunk.
+    """
+    chunk = array("Q")
+    runs = []
+    for value in hashes:
+        chunk.append(value)
+        if len(chunk) >= chunk_size:
+            runs.append(_spill(sorted(chunk)))
+            chunk = array("Q")
+    if not runs:
+        return [sorted(chunk)]
+    runs.append(_spill(sorted(chunk)))
+    return [_read_run(run) for run in runs]
+
+
+def _spill(values):
+    run = tempfile.TemporaryFile()
+    array("Q", values).tofile(run)
+    run.seek(0)
+    return run
+
+
+def _read_run(run, block=65536):
+    with run:
+        while True:
+            values = array("Q")
+            try:
+                values.fromfile(run, block)
+            except EOFError:
+                yield from values
+                return
+            yield from values
+
+
+def write_password_filter(lines, path, hashed=False, lowercase=True, chunk_size=10**6):
+    """
+    Writes a password filter file from an iterable of lines.
+
+    Each line either contains a password in plain text or, if hashed is set,
+    the hex encoded SHA-1 hash of a password (anything after the first 40
+    characters, e.g. ":<count>" is ignored). Plain text passwords are
+    lowercased before hashing if lowercase is set, which matches the
+    behavior of django's CommonPasswordValidator. Hashed lists can't be
+    lowercased.
+
+    Returns the number of distinct entries.
+    """
+    lowercase = lowercase and not hashed
+
+    def hashes():
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if hashed:
+                yield int(line[:16], 16)
+            else:
+                yield password_hash(line, lowercase)
+
+    count = 0
+    previous = None
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        for value in heapq.merge(*_sorted_runs(hashes(), chunk_size)):
+            if value != previous:
+                f.write(ENTRY.pack(value))
+                count += 1
+                previous = value
+        f.seek(0)
+        flags = FLAG_LOWERCASE if lowercase else 0
+        f.write(HEADER.pack(MAGIC, VERSION, flags, count))
+    return count
+
+
+class BreachedPasswordValidator:
+    """
+    Validate whether the password is contained in a (potentially huge) list of
+    breached passwords, which was converted to a password filter file with
+    the build_password_filter management command.
+
+    The error code is the same as the one of django's CommonPasswordValidator,
+    so the frontend shows the same message.
+    """
+
+    def __init__(self, password_filter_path):
+        self.password_filter_path = os.fspath(password_filter_path)
+        self._filter = None
+
+    @property
+    def password_filter(self):
+        # opened lazily, so that forked workers don't open it before use
+        if self._filter is None:
+            self._filter = PasswordFilter(self.password_filter_path)
+        return self._filter
+
+    def validate(self, password, user=None):
+        if password in self.password_filter:
+            raise ValidationError(
+                _("This password has appeared in a data breach."),
+                code="password_too_common",
+            )
+
+    def get_help_text(self):
+        return _("Your password can't be one that has appeared in a data breach.")
+
+
+@functools.lru_cache(maxsize=4096)
+def _attribute_tokens(value):
+    """
+    The parts of an attribute value a password is compared to, together with
+    their length and character counts. Cached, so that they are computed only
+    once per user.
+    """
+    value = value.lower()
+    return tuple(
+        (len(part), tuple(Counter(part).items()))
+        for part in re.split(r"\W+", value) + [value]
+    )
+
+
+def _is_similar(password_counts, password_length, part_length, part_counts, limit):
+    """
+    Whether SequenceMatcher(a=password, b=part).quick_ratio() >= limit.
+
+    quick_ratio counts the characters both strings have in common, so the
+    count is compared to the limit while it is summed up. It stops as soon as
+    the limit is reached or can't be reached with the characters left.
+    """
+    total = password_length + part_length
+    if 2.0 * min(password_length, part_length) / total < limit:
+        return False
+    matches = 0
+    remaining = part_length
+    for char, count in part_counts:
+        matches += min(count, password_counts.get(char, 0))
+        remaining -= count
+        if 2.0 * matches / total >= limit:
+            return True
+        if 2.0 * (matches + remaining) / total < limit:
+            return False
+    return False
+
+
+class UserAttributeSimilarityValidator(
+    password_validation.UserAttributeSimilarityValidator
+):
+    """
+    Same as django's UserAttributeSimilarityValidator, with identical results
+    and error codes, but the similarity is computed with early exits instead
+    of building a SequenceMatcher for every part of every attribute.
+    """
+
+    def validate(self, password, user=None):
+        if not user:
+            return
+
+        password = password.lower()
+        password_counts = Counter(password)
+        password_length = len(password)
+        for attribute_name in self.user_attributes:
+            value = getattr(user, attribute_name, None)
+            if not value or not isinstance(value, str):
+                continue
+            for part_length, part_counts in _attribute_tokens(value):
+                if part_length == 0 or password_length == 0:
+                    # quick_ratio of two empty strings is 1.0, otherwise 0.0
+                    similar = part_length == password_length
+                else:
+                    similar = _is_similar(
+                        password_counts,
+                        password_length,
+                        part_length,
+                        part_counts,
+                        self.max_similarity,
+                    )
+                if similar:
+                    try:
+                        verbose_name = str(
+                            user._meta.get_field(attribute_name).verbose_name
+                        )
+                    except FieldDoesNotExist:
+                        verbose_name = attribute_name
+                    raise ValidationError(
+                        _("The password is too similar to the %(verbose_name)s."),
+                        code="password_too_similar",
+                        params={"verbose_name": verbose_name},
+                    )
+
+
+class ValidatorTimings:
+    """
+    Collects how often and how long each password validator ran.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @staticmethod
+    def name(validator):
+        cls = type(validator)
+        return f"{cls.__module__}.{cls.__qualname__}"
+
+    def record(self, validator, seconds, failed):
+        name = self.name(validator)
+        with self._lock:
+            calls, failures, total = self._stats.get(name, (0, 0, 0.0))
+            self._stats[name] = (calls + 1, failures + failed, total + seconds)
+
+    def mean(self, validator):
+        calls, _, total = self._stats.get(self.name(validator), (0, 0, 0.0))
+        return total / calls if calls else 0.0
+
+    def export(self):
+        """
+        Returns the timings per validator name as a dictionary, e.g. to send
+        them to a metrics system.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            name: {
+                "calls": calls,
+                "failures": failures,
+                "total_seconds": total,
+                "mean_seconds": total / calls,
+            }
+            for name, (calls, failures, total) in stats.items()
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+validator_timings = ValidatorTimings()
+
+
+def validate_password(
+    password, user=None, password_validators=None, short_circuit=False
+):
+    """
+    Like django's validate_password, but records the time every validator
+    takes in validator_timings.
+
+    If short_circuit is set, the validators run ordered by their measured
+    cost and the validation stops at the first failure. This is meant for
+    giving feedback while the user is typing, when a single error suffices.
+    Otherwise all validators run in the configured order and all errors are
+    reported.
+    """
+    if password_validators is None:
+        password_validators = password_validation.get_default_password_validators()
+    if short_circuit:
+        password_validators = sorted(password_validators, key=validator_timings.mean)
+    errors = []
+    for validator in password_validators:
+        start = time.perf_counter()
+        failed = False
+        try:
+            validator.validate(password, user)
+        except ValidationError as error:
+            errors.append(error)
+            failed = True
+        validator_timings.record(validator, time.perf_counter() - start, failed)
+        if failed and short_circuit:
+            break
+    if errors:
+        raise ValidationError(errors)
+
+
+class BloomFilter:
+    """
+    A Bloom filter of lowercased passwords, which is small enough to be sent
+    to the frontend.
+
+    The bit positions of a password are (h1 + i * h2) % size for
+    i in range(hashes), where h1 and h2 are the first two big endian 32 bit
+    words of the SHA-256 hash of the UTF-8 encoded, lowercased password.
+    Bit n is stored in byte n // 8 at position n % 8, least significant bit
+    first.
+    """
+
+    def __init__(self, count, false_positive_rate=0.01):
+        count = max(count, 1)
+        self.size = math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / count * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, password):
+        digest = hashlib.sha256(password.lower().encode()).digest()
+        h1 = int.from_bytes(digest[:4], "big")
+        h2 = int.from_bytes(digest[4:8], "big")
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, password):
+        for position in self._positions(password):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, password):
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(password)
+        )
+
+    def as_dict(self):
+        return {
+            "hash": "sha256",
+            "size": self.size,
+            "hashes": self.hashes,
+            "bits": base64.b64encode(bytes(self.bits)).decode(),
+        }
+
+
+def describe_validator(validator):
+    """
+    Describes a password validator for the frontend, so it can validate
+    passwords locally. Validators that can't be described have to be checked
+    by the backend, e.g. on submit.
+    """
+    if isinstance(validator, password_validation.MinimumLengthValidator):
+        return {
+            "type": "min_length",
+            "code": "password_too_short",
+            "min_length": validator.min_length,
+        }
+    if isinstance(validator, password_validation.NumericPasswordValidator):
+        return {"type": "numeric", "code": "password_entirely_numeric"}
+    if isinstance(validator, password_validation.UserAttributeSimilarityValidator):
+        return {
+            "type": "user_attribute_similarity",
+            "code": "password_too_similar",
+            "user_attributes": list(validator.user_attributes),
+            "max_similarity": validator.max_similarity,
+        }
+    if isinstance(validator, password_validation.CommonPasswordValidator):
+        bloom_filter = BloomFilter(len(validator.passwords))
+        for password in validator.passwords:
+            bloom_filter.add(password)
+        return {
+            "type": "common_passwords",
+            "code": "password_too_common",
+            "bloom_filter": bloom_filter.as_dict(),
+        }
+    return {"type": "server", "name": ValidatorTimings.name(validator)}
+
+
+@functools.lru_cache(maxsize=None)
+def password_policy():
+    """
+    Returns the description of all configured password validators and its
+    ETag. Computed once per process.
+    """
+    policy = {
+        "validators": [
+            describe_validator(validator)
+            for validator in password_validation.get_default_password_validators()
+        ]
+    }
+    content = json.dumps(policy, sort_keys=True).encode()
+    return policy, f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+@functools.lru_cache(maxsize=None)
+def _validators_version():
+    # options may be any python objects, e.g. the Path of a password filter
+    configuration = json.dumps(
+        settings.AUTH_PASSWORD_VALIDATORS, sort_keys=True, default=repr
+    )
+    return hashlib.sha256(configuration.encode()).hexdigest()[:16]
+
+
+class ValidationResultCache:
+    """
+    Caches the error codes of password validations for a short time, since
+    users tend to send the same values repeatedly while typing.
+
+    The cache keys are HMACs of the inputs, so that no passwords are stored.
+    They also contain a hash of AUTH_PASSWORD_VALIDATORS, so changing the
+    validators invalidates all results.
+    """
+
+    key_salt = "ai_kit_auth.password_validation.ValidationResultCache"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *values):
+        message = "\0".join("" if value is None else str(value) for value in values)
+        digest = salted_hmac(self.key_salt, message, algorithm="sha256").hexdigest()
+        return f"ai_kit_auth:password_validation:{_validators_version()}:{digest}"
+
+    def get(self, cache_alias, key):
+        codes = caches[cache_alias].get(key)
+        with self._lock:
+            if codes is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return codes
+
+    def set(self, cache_alias, key, codes, timeout):
+        caches[cache_alias].set(key, list(codes), timeout)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+validation_result_cache = ValidationResultCache()
+
+
+@receiver(setting_changed)
+def reset_password_policy(*args, **kwargs):
+    if kwargs["setting"] == "AUTH_PASSWORD_VALIDATORS":
+        password_policy.cache_clear()
+        _validators_version.cache_clear()
@@ -0,0 +1,234 @@
+"""
+Serialization of the user for the login and me endpoints.
+
+Single page apps poll the me endpoint whenever they regain focus or change
+their route, while the user hardly ever changes. The serialized user is
+therefore hashed, so that the endpoint can answer conditional requests, and
+it may be cached per user as configured by USER_PAYLOAD_CACHE.
+
+Rest framework builds and binds the fields of a model serializer every time
+it is instantiated. If COMPILE_USER_SERIALIZER is set, the USER_SERIALIZER is
+compiled into a function instead, which reads the model fields directly.
+"""
+
+import functools
+import hashlib
+import json
+import operator
+import time
+
+from django.contrib.auth import get_user_model
+from django.db.models import prefetch_related_objects
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from rest_framework import fields, serializers
+from rest_framework.utils.encoders import JSONEncoder
+
+# fields, whose representation of a model field value is a plain conversion
+CONVERTERS = {
+    fields.IntegerField: int,
+    fields.CharField: str,
+    fields.EmailField: str,
+    fields.SlugField: str,
+    fields.URLField: str,
+    fields.ReadOnlyField: lambda value: value,
+}
+
+# fields, whose to_representation doesn't depend on the serializer context
+CONTEXT_FREE_FIELDS = (
+    fields.BooleanField,
+    fields.FloatField,
+    fields.DecimalField,
+    fields.DateTimeField,
+    fields.DateField,
+    fields.TimeField,
+    fields.UUIDField,
+    fields.ChoiceField,
+)
+
+
+def _compile_field(field, model):
+    """
+    Returns the name, the attribute and the conversion of a field, or None if
+    the field isn't a plain model field.
+    """
+    if type(field).get_attribute is not fields.Field.get_attribute:
+        return None
+    if len(field.source_attrs) != 1:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    if not model_field.concrete or model_field.is_relation:
+        return None
+    convert = CONVERTERS.get(type(field))
+    if convert is None and type(field) in CONTEXT_FREE_FIELDS:
+        # bound once at compile time, which is fine without a context
+        convert = field.to_representation
+    if convert is None:
+        return None
+    return field.field_name, model_field.attname, convert
+
+
+@functools.lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    """
+    Compiles a serializer of users into a function, which returns the same
+    data for a user as the serializer, or returns None if the serializer
+    can't be compiled. That is the case if it customizes its representation
+    or has a field that isn't a plain model field of a supported type, e.g.
+    a SerializerMethodField, a related field or a custom field class.
+
+    Serializers which change their fields depending on the context can't be
+    detected, so they must not be compiled.
+    """
+    if (
+        serializer_class.to_representation
+        is not serializers.Serializer.to_representation
+    ):
+        return None
+    model = get_user_model()
+    compiled = []
+    for field in serializer_class(context={})._readable_fields:
+        compiled_field = _compile_field(field, model)
+        if compiled_field is None:
+            return None
+        name, attname, convert = compiled_field
+        compiled.append((name, operator.attrgetter(attname), convert))
+    compiled = tuple(compiled)
+
+    def serialize(user):
+        data = {}
+        for name, get, convert in compiled:
+            value = get(user)
+            data[name] = None if value is None else convert(value)
+        return data
+
+    return serialize
+
+
+@receiver(setting_changed)
+def reset_compiled_serializers(*args, **kwargs):
+    if kwargs["setting"] == "AI_KIT_AUTH":
+        compile_serializer.cache_clear()
+
+
+def user_data(serializer_class, user, context):
+    """
+    Serializes the user, with the compiled serializer if COMPILE_USER_SERIALIZER
+    is set and the serializer can be compiled. Otherwise the related objects
+    listed in the prefetch_related attribute of the serializer's Meta are
+    prefetched first, e.g. prefetch_related = ("groups__permissions",).
+    """
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    if api_settings.COMPILE_USER_SERIALIZER:
+        serialize = compile_serializer(serializer_class)
+        if serialize is not None:
+            return serialize(user)
+    meta = getattr(serializer_class, "Meta", None)
+    lookups = getattr(meta, "prefetch_related", ())
+    if lookups:
+        prefetch_related_objects([user], *lookups)
+    return serializer_class(instance=user, context=context).data
+
+
+def payload_digest(data):
+    """
+    A stable hash of serialized data, independent of the order of its keys.
+    """
+    encoded = json.dumps(data, cls=JSONEncoder, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class PayloadCache:
+    """
+    Caches the serialized users and their digests by primary key. The key
+    contains the serializer, so that changing the USER_SERIALIZER setting
+    doesn't serve payloads of the previous one. Entries are deleted when the
+    user, its groups or its permissions change. Entries are also stored with
+    a generation, which is replaced when the permissions of any group change,
+    since serializers may nest the groups and permissions of the user.
+    """
+
+    GENERATION_KEY = "ai_kit_auth:payload:generation"
+
+    def __init__(self, cache_alias, timeout):
+        self.cache = caches[cache_alias]
+        self.timeout = timeout
+
+    @staticmethod
+    def key(serializer_class, pk):
+        name = f"{serializer_class.__module__}.{serializer_class.__qualname__}"
+        return f"ai_kit_auth:payload:{name}:{pk}"
+
+    def get(self, serializer_class, pk):
+        """
+        Returns the serialized user and its digest or None, and the
+        generation, which has to be passed to set.
+        """
+        key = self.key(serializer_class, pk)
+        values = self.cache.get_many([self.GENERATION_KEY, key])
+        generation = values.get(self.GENERATION_KEY, 0)
+        entry = values.get(key)
+        if entry is None or entry[0] != generation:
+            return None, generation
+        return entry[1:], generation
+
+    def set(self, serializer_class, pk, generation, data, digest):
+        self.cache.set(
+            self.key(serializer_class, pk), (generation, data, digest), self.timeout
+        )
+
+    def invalidate(self, serializer_class, pk):
+        self.cache.delete(self.key(serializer_class, pk))
+
+    def invalidate_all(self):
+        self.cache.set(self.GENERATION_KEY, time.time_ns(), None)
+
+
+_payload_cache = None
+
+
+def get_payload_cache():
+    """
+    Returns the payload cache or None, if it is disabled.
+    """
+    global _payload_cache
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    config = api_settings.USER_PAYLOAD_CACHE
+    if not config.ENABLED:
+        return None
+    if _payload_cache is None:
+        _payload_cache = PayloadCache(config.CACHE_ALIAS, config.TIMEOUT)
+    return _payload_cache
+
+
+@receiver(setting_changed)
+def reset_payload_cache(*args, **kwargs):
+    global _payload_cache
+    if kwargs["setting"] == "AI_KIT_AUTH":
+        _payload_cache = None
+
+
+def serialize_user(serializer_class, user, context):
+    """
+    Returns the serialized user and its digest, from the payload cache if it
+    is enabled.
+    """
+    cache = get_payload_cache()
+    if cache is not None:
+        entry, generation = cache.get(serializer_class, user.pk)
+        if entry is not None:
+            return entry
+    data = user_data(serializer_class, user, context)
+    digest = payload_digest(data)
+    if cache is not None:
+        cache.set(serializer_class, user.pk, generation, data, digest)
+    return data, digest
@@ -1,19 +1,18 @@
 import unicodedata
 import uuid
 from django.contrib.auth import authenticate, get_user_model, tokens
-from django.contrib.auth.password_validation import (
-    get_password_validators,
-    validate_password,
-)
-from django.conf import settings
+from django.contrib.auth.password_validation import get_default_password_validators
 from django.core.exceptions import ValidationError as DjangoValidationError
-from django.db.models import EmailField
 from django.db.utils import IntegrityError
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError, ErrorDetail
+from .backends import user_instance_backend_enabled, user_instance_backends_only
+from .identity import get_identity_resolver
+from .password_validation import validate_password, validation_result_cache
 from .settings import api_settings
 from .signals import user_post_registered
-from . import services
+from .throttling import LoginThrottle
+from . import hashing, services
 
 UserModel = get_user_model()
 
@@ -28,6 +27,34 @@ def raise_validation(error_code):
     raise ValidationError(error_code, code=error_code)
 
 
+def raise_password_errors(error_codes):
+    if error_codes:
+        # convert to error codes since translations are implemented in the
+        # frontend
+        raise ValidationError(
+            {"password": [ErrorDetail(code, code=code) for code in error_codes]}
+        )
+
+
+def login_credentials(resolver, ident, identified_user):
+    """
+    Returns the credentials (besides the password) to authenticate the user
+    identified by ident with.
+    """
+    if identified_user is not None:
+        credentials = {"username": identified_user.get_username()}
+        if user_instance_backend_enabled():
+            # the backend checks the password of the instance we already have
+            # and ignores the username, which receivers of user_login_failed
+            # expect among the credentials
+            credentials["user"] = identified_user
+        return credentials
+    if resolver.covers_username and user_instance_backends_only():
+        # the backend would not find a user by this username either
+        return {"username": ident, "unknown_identity": True}
+    return {"username": ident}
+
+
 class LoginSerializer(serializers.Serializer):
     ident = serializers.CharField(**FIELD_ARGS, write_only=True)
     password = serializers.CharField(
@@ -39,23 +66,24 @@ class LoginSerializer(serializers.Serializer):
     def validate(self, attrs):
         ident = attrs.get("ident")
         password = attrs.get("password")
+        request = self.context["request"]
+        throttle = LoginThrottle()
+        if throttle.enabled:
+            # before anything expensive happens
+            throttle.check(request, ident)
         # find a unique identity
-        for field_name in api_settings.USER_IDENTITY_FIELDS:
-            field = UserModel._meta.get_field(field_name)
-            filter_key = field.name
-            if isinstance(field, EmailField):
-                filter_key += "__iexact"
-            try:
-                ident = UserModel.objects.get(**{filter_key: ident}).get_username()
-            except (UserModel.DoesNotExist, UserModel.MultipleObjectsReturned):
-                continue
-            break
-
-        user = authenticate(self.context["request"], username=ident, password=password)
+        resolver = get_identity_resolver()
+        identified_user = resolver.resolve(ident)
+        credentials = login_credentials(resolver, ident, identified_user)
+        user = authenticate(request, password=password, **credentials)
 
         if not user:
+            if throttle.enabled:
+                throttle.failure(request, attrs["ident"])
             raise_validation("invalid_credentials")
 
+        if throttle.enabled:
+            throttle.success(request, attrs["ident"])
         attrs["user"] = user
         return attrs
 
@@ -83,6 +111,18 @@ class ValidatePasswordSerializer(serializers.Serializer):
         username = attrs.get("username")
         email = attrs.get("email")
         password = attrs["password"]
+        short_circuit = self.context.get("short_circuit", False)
+
+        cache_settings = api_settings.PASSWORD_VALIDATION_CACHE
+        cache_key = None
+        if cache_settings.ENABLED:
+            cache_key = validation_result_cache.key(
+                short_circuit, ident, username, email, password
+            )
+            codes = validation_result_cache.get(cache_settings.CACHE_ALIAS, cache_key)
+            if codes is not None:
+                raise_password_errors(codes)
+                return attrs
 
         if ident:
             # we dont need username and/or email, the usermodel should already
@@ -104,26 +144,25 @@ class ValidatePasswordSerializer(serializers.Serializer):
             )
 
         try:
-            validators = get_password_validators(settings.AUTH_PASSWORD_VALIDATORS)
+            # built once per process, reset when AUTH_PASSWORD_VALIDATORS changes
+            validators = get_default_password_validators()
         except:
             return attrs
+        codes = []
         try:
             validate_password(
                 password=password,
                 user=user,
                 password_validators=validators,
+                short_circuit=short_circuit,
             )
         except DjangoValidationError as e:
-            # convert to error codes since translations are implemented in the
-            # frontend
-            raise ValidationError(
-                {
-                    "password": [
-                        ErrorDetail(error.code, code=error.code)
-                        for error in e.error_list
-                    ]
-                }
+            codes = [error.code for error in e.error_list]
+        if cache_key is not None:
+            validation_result_cache.set(
+                cache_settings.CACHE_ALIAS, cache_key, codes, cache_settings.TIMEOUT
             )
+        raise_password_errors(codes)
         return attrs
 
 
@@ -166,7 +205,8 @@ class RegistrationSerializer(serializers.Serializer):
         password = attrs["password"]
 
         password_serializer = ValidatePasswordSerializer(
-            data={"username": username, "email": email, "password": password}
+            data={"username": username, "email": email, "password": password},
+            context={"short_circuit": self.context.get("short_circuit", False)},
         )
         try:
             password_serializer.is_valid(raise_exception=True)
@@ -183,19 +223,24 @@ class RegistrationSerializer(serializers.Serializer):
             )
 
         # make sure identity is unique
-        for field_name in api_settings.USER_IDENTITY_FIELDS:
-            field = UserModel._meta.get_field(field_name)
-            filter_key = field.name
-            if isinstance(field, EmailField):
-                filter_key += "__iexact"
-            if UserModel.objects.filter(**{filter_key: attrs[field_name]}).exists():
-                code = f"{field.name}_unique"
-                raise ValidationError({field.name: [ErrorDetail(code, code=code)]})
+        field_name = get_identity_resolver().conflicting_field(attrs)
+        if field_name is not None:
+            code = f"{field_name}_unique"
+            raise ValidationError({field_name: [ErrorDetail(code, code=code)]})
         return attrs
 
     def create(self, validated_data):
         try:
-            user = UserModel.objects.create_user(**validated_data)
+            if hashing.get_executor() is None:
+                user = UserModel.objects.create_user(**validated_data)
+            else:
+                # hash on the pool, then save the user once like create_user,
+                # whose clean normalizes the username and email
+                password = validated_data.pop("password")
+                user = UserModel(**validated_data)
+                user.clean()
+                hashing.set_password(user, password)
+                user.save()
             user_post_registered.send(sender=RegistrationSerializer, user=user)
         except IntegrityError:
             code = "username_unique"
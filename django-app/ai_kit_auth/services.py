@@ -1,10 +1,19 @@
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from asgiref.sync import sync_to_async
+from django.apps import apps
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import get_template
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import QuerySet
 from django.utils.safestring import mark_safe
 
+from . import delivery, outbox
+from .email_templates import email_templates
 from .settings import api_settings
 
 User = get_user_model()
@@ -57,9 +66,166 @@ def custom_email_data():
 
 def send_email(subject, text, html, to_address):
     from_address = settings.DEFAULT_FROM_EMAIL
-    msg = EmailMultiAlternatives(subject, text, from_address, [to_address])
+    if outbox.enabled():
+        # delivered by the send_queued_mails command
+        outbox.enqueue(subject, text, html, from_address, to_address)
+        return
+    email_message(subject, text, html, from_address, to_address).send()
+
+
+async def asend_email(subject, text, html, to_address):
+    """
+    Like send_email, but awaits the delivery if EMAIL_BACKEND supports it, like
+    ai_kit_auth.async_smtp.EmailBackend does.
+    """
+    connection = get_connection()
+    if outbox.enabled() or not hasattr(connection, "asend_messages"):
+        await sync_to_async(send_email)(subject, text, html, to_address)
+        return
+    from_address = settings.DEFAULT_FROM_EMAIL
+    await connection.asend_messages(
+        [email_message(subject, text, html, from_address, to_address, connection)]
+    )
+
+
+def email_message(subject, text, html, from_address, to_address, connection=None):
+    msg = EmailMultiAlternatives(
+        subject, text, from_address, [to_address], connection=connection
+    )
     msg.attach_alternative(html, "text/html")
-    msg.send()
+    return msg
+
+
+def render_templated_mail(template_name, user, url):
+    """
+    Returns the subject, the plaintext and the html body of the mail of the
+    EMAIL_TEMPLATES entry template_name and the address of the user.
+    """
+    context = {
+        "user": user,
+        "url": url,
+    }
+
+    # Add custom variables
+    custom_function = api_settings.EMAIL_TEMPLATES.CUSTOM_DATA_FUNCTION
+    context.update(custom_function())
+
+    subject, text, html = email_templates.get(template_name).render(context)
+    return subject, text, html, getattr(user, User.get_email_field_name())
+
+
+def send_templated_mail(template_name, user, url):
+    """
+    Sends the mail of the EMAIL_TEMPLATES entry template_name to the user.
+    """
+    send_email(*render_templated_mail(template_name, user, url))
+
+
+MailBatchResult = namedtuple("MailBatchResult", ["recipients", "sent", "error"])
+MailBatchResult.__doc__ = """
+The outcome of a batch of a bulk mail run. If the batch failed, sent is None,
+because the mails before the error may have been sent already.
+"""
+
+
+def _chunks(users, size):
+    if isinstance(users, QuerySet):
+        users = users.iterator(chunk_size=size)
+    users = iter(users)
+    while True:
+        chunk = list(islice(users, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _setup_render_process():
+    # processes that are spawned instead of forked start without django
+    if not apps.ready:
+        django.setup()
+
+
+def _render_chunk(template_name, chunk):
+    return [render_templated_mail(template_name, user, url) for user, url in chunk]
+
+
+def _render_chunks(template_name, chunks, processes):
+    if not processes:
+        for chunk in chunks:
+            yield _render_chunk(template_name, chunk)
+        return
+    with ProcessPoolExecutor(processes, initializer=_setup_render_process) as pool:
+        # a few chunks in advance, instead of rendering all mails at once
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_render_chunk, template_name, chunk))
+            if len(pending) > processes:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _send_batches(batches):
+    from_address = settings.DEFAULT_FROM_EMAIL
+    results = []
+    if outbox.enabled():
+        for mails in batches:
+            outbox.enqueue_many(mails, from_address)
+            results.append(
+                MailBatchResult([mail[3] for mail in mails], len(mails), None)
+            )
+        return results
+
+    connection = get_connection()
+    try:
+        for mails in batches:
+            recipients = [mail[3] for mail in mails]
+            try:
+                # opened again, if a failed batch closed it
+                connection.open()
+                sent = connection.send_messages(
+                    [email_message(*mail[:3], from_address, mail[3]) for mail in mails]
+                )
+            # any error of the backend, e.g. a refused recipient
+            except Exception as exc:
+                results.append(MailBatchResult(recipients, None, exc))
+                connection.close()
+            else:
+                results.append(MailBatchResult(recipients, sent, None))
+    finally:
+        connection.close()
+    return results
+
+
+def _send_mass_mail(
+    setting, default_func, template_name, users, get_url, chunk_size, processes
+):
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    sender_func = getattr(api_settings, setting)
+    config = api_settings.BULK_MAIL
+    chunk_size = chunk_size or config.CHUNK_SIZE
+    processes = config.PROCESSES if processes is None else processes
+    chunks = (
+        [(user, get_url(user)) for user in chunk]
+        for chunk in _chunks(users, chunk_size)
+    )
+    if sender_func is default_func:
+        return _send_batches(_render_chunks(template_name, chunks, processes))
+
+    # custom functions can only send the mails one by one
+    results = []
+    for chunk in chunks:
+        recipients = [getattr(user, User.get_email_field_name()) for user, _ in chunk]
+        try:
+            for user, url in chunk:
+                sender_func(user, url)
+        except Exception as exc:
+            results.append(MailBatchResult(recipients, None, exc))
+        else:
+            results.append(MailBatchResult(recipients, len(chunk), None))
+    return results
 
 
 def make_url(*pathArgs, **queryArgs):
@@ -83,66 +249,60 @@ def get_activation_url(user):
 
 def send_user_activation_mail(user):
     sender_func = api_settings.SEND_USER_ACTIVATION_MAIL
-    sender_func(user, get_activation_url(user))
+    delivery.deliver(sender_func, user, get_activation_url(user))
 
 
-def default_send_user_activation_mail(user, url):
+def send_user_activation_mails(users, chunk_size=None, processes=None):
     """
-    Sends the initial mail for a nonactive user.
+    Sends the initial mail to many nonactive users, e.g. after an import. The
+    mails are rendered in chunks of chunk_size, on a pool of processes if
+    given, and every chunk is sent as one batch over a single connection.
+    Returns a MailBatchResult for every batch; a failed batch doesn't stop
+    the following ones.
     """
-    template_plain = get_template(
-        api_settings.EMAIL_TEMPLATES.USER_CREATED.BODY_PLAINTEXT
+    return _send_mass_mail(
+        "SEND_USER_ACTIVATION_MAIL",
+        default_send_user_activation_mail,
+        "USER_CREATED",
+        users,
+        get_activation_url,
+        chunk_size,
+        processes,
     )
-    template_html = get_template(api_settings.EMAIL_TEMPLATES.USER_CREATED.BODY_HTML)
-    subject = get_template(api_settings.EMAIL_TEMPLATES.USER_CREATED.TITLE).render()
 
-    context = {
-        "user": user,
-        "url": url,
-    }
 
-    # Add custom variables
-    custom_function = api_settings.EMAIL_TEMPLATES.CUSTOM_DATA_FUNCTION
-    context.update(custom_function())
-
-    send_email(
-        subject.replace("\n", " "),
-        template_plain.render(context),
-        template_html.render(context),
-        getattr(user, User.get_email_field_name()),
-    )
+def default_send_user_activation_mail(user, url):
+    """
+    Sends the initial mail for a nonactive user.
+    """
+    send_templated_mail("USER_CREATED", user, url)
 
 
 def send_activation_by_admin_mail(user):
     sender_func = api_settings.SEND_ACTIVATION_BY_ADMIN_MAIL
-    sender_func(user, get_activation_url(user))
+    delivery.deliver(sender_func, user, get_activation_url(user))
 
 
-def default_send_activation_by_admin_mail(user, url):
+def send_activation_by_admin_mails(users, chunk_size=None, processes=None):
     """
-    send mail for the password reset
+    Like send_user_activation_mails, for users that were created by an admin.
     """
-    template_plain = get_template(
-        api_settings.EMAIL_TEMPLATES.SET_PASSWORD.BODY_PLAINTEXT
+    return _send_mass_mail(
+        "SEND_ACTIVATION_BY_ADMIN_MAIL",
+        default_send_activation_by_admin_mail,
+        "SET_PASSWORD",
+        users,
+        get_activation_url,
+        chunk_size,
+        processes,
     )
-    template_html = get_template(api_settings.EMAIL_TEMPLATES.SET_PASSWORD.BODY_HTML)
-    subject = get_template(api_settings.EMAIL_TEMPLATES.SET_PASSWORD.TITLE).render()
 
-    context = {
-        "user": user,
-        "url": url,
-    }
-
-    # Add custom variables
-    custom_function = api_settings.EMAIL_TEMPLATES.CUSTOM_DATA_FUNCTION
-    context.update(custom_function())
 
-    send_email(
-        subject.replace("\n", " "),
-        template_plain.render(context),
-        template_html.render(context),
-        getattr(user, User.get_email_field_name()),
-    )
+def default_send_activation_by_admin_mail(user, url):
+    """
+    send mail for the password reset
+    """
+    send_templated_mail("SET_PASSWORD", user, url)
 
 
 def get_password_reset_url(user):
@@ -160,31 +320,28 @@ def get_password_reset_url(user):
 
 def send_reset_pw_mail(user):
     sender_func = api_settings.SEND_RESET_PW_MAIL
-    sender_func(user, get_password_reset_url(user))
+    delivery.deliver(sender_func, user, get_password_reset_url(user))
 
 
-def default_send_reset_pw_mail(user, url):
+async def asend_reset_pw_mail(user):
     """
-    send mail for the password reset
+    Like send_reset_pw_mail, for async views. Only the default mail function
+    awaits the delivery, others are called on a thread.
     """
-    template_plain = get_template(
-        api_settings.EMAIL_TEMPLATES.RESET_PASSWORD.BODY_PLAINTEXT
-    )
-    template_html = get_template(api_settings.EMAIL_TEMPLATES.RESET_PASSWORD.BODY_HTML)
-    subject = get_template(api_settings.EMAIL_TEMPLATES.RESET_PASSWORD.TITLE).render()
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
 
-    context = {
-        "user": user,
-        "url": url,
-    }
+    sender_func = api_settings.SEND_RESET_PW_MAIL
+    if sender_func is not default_send_reset_pw_mail or delivery.get_executor():
+        await sync_to_async(send_reset_pw_mail)(user)
+        return
+    url = get_password_reset_url(user)
+    mail = await sync_to_async(render_templated_mail)("RESET_PASSWORD", user, url)
+    await asend_email(*mail)
 
-    # Add custom variables
-    custom_function = api_settings.EMAIL_TEMPLATES.CUSTOM_DATA_FUNCTION
-    context.update(custom_function())
 
-    send_email(
-        subject.replace("\n", " "),
-        template_plain.render(context),
-        template_html.render(context),
-        getattr(user, User.get_email_field_name()),
-    )
+def default_send_reset_pw_mail(user, url):
+    """
+    send mail for the password reset
+    """
+    send_templated_mail("RESET_PASSWORD", user, url)
@@ -26,6 +26,7 @@ DEFAULTS = {
         "LOGOUT": True,
         "ME": True,
         "VALIDATE_PASSWORD": True,
+        "PASSWORD_POLICY": True,
         "SEND_PW_RESET_MAIL": True,
         "RESET_PASSWORD": True,
         "REGISTER": True,
@@ -48,9 +49,32 @@ DEFAULTS = {
             "BODY_HTML": "ai_kit_auth/reset_password_body.html",
         },
     },
+    "CACHE_EMAIL_TEMPLATES": False,
     "SEND_USER_ACTIVATION_MAIL": "ai_kit_auth.services.default_send_user_activation_mail",
     "SEND_ACTIVATION_BY_ADMIN_MAIL": "ai_kit_auth.services.default_send_activation_by_admin_mail",
     "SEND_RESET_PW_MAIL": "ai_kit_auth.services.default_send_reset_pw_mail",
+    "MAIL_OUTBOX": {
+        "ENABLED": False,
+        "BATCH_SIZE": 100,
+        "MAX_ATTEMPTS": 5,
+        "BACKOFF_BASE": 60,
+        "BACKOFF_MAX": 3600,
+        "POLL_INTERVAL": 5,
+    },
+    "BACKGROUND_MAIL_DELIVERY": {
+        "ENABLED": False,
+        "MAX_WORKERS": 2,
+        "MAX_QUEUE": 100,
+    },
+    "BULK_MAIL": {
+        "CHUNK_SIZE": 100,
+        "PROCESSES": 0,
+    },
+    "ASYNC_SMTP": {
+        "POOL_SIZE": 4,
+        "SEND_TIMEOUT": 30,
+        "IDLE_TIMEOUT": 60,
+    },
     "USE_AI_KIT_AUTH_ADMIN": True,
     "ADMIN_FIELDSETS": (
         (None, {"fields": ("username", "email", "password")}),
@@ -80,8 +104,58 @@ DEFAULTS = {
     ),
     "USERNAME_REQUIRED": False,
     "USER_SERIALIZER": "ai_kit_auth.serializers.UserSerializer",
+    "COMPILE_USER_SERIALIZER": False,
     "REGISTRATION_SERIALIZER": "ai_kit_auth.serializers.RegistrationSerializer",
     "USER_IDENTITY_FIELDS": ("email", "username"),
+    "ROUTE_IDENTITY_BY_SHAPE": False,
+    "LOWERCASE_EMAILS": False,
+    "SHORT_CIRCUIT_PASSWORD_VALIDATION": False,
+    "IDENTITY_CACHE": {
+        "ENABLED": False,
+        "CACHE_ALIAS": "default",
+        "TIMEOUT": 300,
+        "MISSING_TIMEOUT": 60,
+        "EARLY_REFRESH_BETA": 1.0,
+    },
+    "USER_CACHE": {
+        "ENABLED": False,
+        "CACHE_ALIAS": "default",
+        "TIMEOUT": 300,
+        "LOCAL_SIZE": 1024,
+    },
+    "USER_PAYLOAD_CACHE": {
+        "ENABLED": False,
+        "CACHE_ALIAS": "default",
+        "TIMEOUT": 300,
+    },
+    "PERMISSION_CACHE": {
+        "ENABLED": False,
+        "CACHE_ALIAS": "default",
+        "TIMEOUT": 300,
+    },
+    "ENABLE_ASYNC": False,
+    "READ_ONLY_ME": False,
+    "LOGIN_THROTTLE": {
+        "ENABLED": False,
+        "CACHE_ALIAS": "default",
+        "WINDOW": 300,
+        "MAX_FAILURES_PER_IP": 100,
+        "MAX_FAILURES_PER_IDENT": 5,
+        "BACKOFF_BASE": 1,
+        "BACKOFF_MAX": 3600,
+    },
+    "PASSWORD_HASHING": {
+        "ENABLED": False,
+        "EXECUTOR": "thread",
+        "MAX_WORKERS": 4,
+        "MAX_QUEUE": 16,
+        "RETRY_AFTER": 1,
+    },
+    "PASSWORD_VALIDATION_CACHE": {
+        "ENABLED": False,
+        "CACHE_ALIAS": "default",
+        "TIMEOUT": 30,
+    },
     "FRONTEND": {
         "URL": "",
         "ACTIVATION_ROUTE": "/auth/activation/",
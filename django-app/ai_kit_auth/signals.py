@@ -1,6 +1,18 @@
 from django.dispatch import Signal, receiver
-from django.db.models.signals import pre_save
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_save,
+)
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+
+from .backends import get_permission_cache, get_user_cache
+from .identity import get_identity_resolver
+from .serialization import get_payload_cache
 
 user_pre_login = Signal()  # args: "user"
 user_post_login = Signal()  # args: "user"
@@ -17,14 +29,201 @@ user_post_reset_password = Signal()  # args: "user"
 
 User = get_user_model()
 
+# custom user models don't need to have groups and permissions
+USER_PERMISSION_RELATIONS = tuple(
+    getattr(User, name).through
+    for name in ("groups", "user_permissions")
+    if hasattr(User, name)
+)
+
+
+@receiver(post_init, sender=User)
+@receiver(post_save, sender=User)
+def remember_active_state(sender, instance, **kwargs):
+    # the field is missing from __dict__ if it was deferred
+    if "is_active" in instance.__dict__:
+        instance._ai_kit_auth_was_active = instance.is_active
+
 
 @receiver(pre_save, sender=User)
-def invalidate_tokens_on_user_deactivation(sender, instance, **kwargs):
-    if instance.id is None or not User.objects.filter(id=instance.id).exists():
+def invalidate_tokens_on_user_deactivation(
+    sender, instance, update_fields=None, **kwargs
+):
+    if instance.is_active or instance.id is None:
+        return
+    if update_fields is not None and "is_active" not in update_fields:
         return
 
-    was_active = User.objects.get(id=instance.id).is_active
+    # Only a remembered active state is trusted: refresh_from_db doesn't
+    # update it, so a user loaded as inactive may have been activated since.
+    # A stale active state only makes the password of a user unusable, who
+    # was deactivated already.
+    if instance._state.adding or not getattr(
+        instance, "_ai_kit_auth_was_active", False
+    ):
+        # look up the old state
+        was_active = (
+            User.objects.filter(id=instance.id)
+            .values_list("is_active", flat=True)
+            .first()
+        )
+    else:
+        was_active = True
 
-    if was_active and not instance.is_active:
+    if was_active:
         # this will automatically invalidate all tokens
         instance.set_unusable_password()
+
+
+@receiver(pre_save, sender=User)
+def normalize_identity_fields(sender, instance, **kwargs):
+    get_identity_resolver().normalize_instance(instance)
+
+
+@receiver(post_init, sender=User)
+def remember_identity(sender, instance, **kwargs):
+    resolver = get_identity_resolver()
+    if resolver.cache:
+        instance._ai_kit_auth_identity = resolver.identity(instance)
+
+
+def _invalidate_identities(resolver, values, using):
+    resolver.cache.invalidate(values)
+    # other requests may resolve the old rows until the transaction is committed
+    transaction.on_commit(lambda: resolver.cache.invalidate(values), using=using)
+
+
+@receiver(post_save, sender=User)
+def invalidate_identity_cache(sender, instance, created, using=None, **kwargs):
+    resolver = get_identity_resolver()
+    if not resolver.cache:
+        return
+    identity = resolver.identity(instance)
+    previous = getattr(instance, "_ai_kit_auth_identity", None)
+    if created:
+        # identities may resolve to the new user instead of another or none
+        _invalidate_identities(resolver, identity, using)
+    elif identity != previous:
+        if previous is None or any(
+            old is None and new is not None for old, new in zip(previous, identity)
+        ):
+            # the old identities were not loaded, so they are unknown
+            _invalidate_identities(resolver, None, using)
+        else:
+            _invalidate_identities(resolver, previous + identity, using)
+    instance._ai_kit_auth_identity = identity
+
+
+@receiver(post_delete, sender=User)
+def invalidate_identity_cache_on_delete(sender, instance, using=None, **kwargs):
+    resolver = get_identity_resolver()
+    if not resolver.cache:
+        return
+    identity = resolver.identity(instance)
+    _invalidate_identities(resolver, None if None in identity else identity, using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, using=None, **kwargs):
+    # covers password changes and deactivations, which are saved as well
+    cache = get_user_cache()
+    if cache is None or instance.pk is None:
+        return
+    pk = instance.pk
+    cache.invalidate(pk)
+    # other requests may cache the old row until the transaction is committed
+    transaction.on_commit(lambda: cache.invalidate(pk), using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_payload(sender, instance, using=None, **kwargs):
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    cache = get_payload_cache()
+    if cache is None or instance.pk is None:
+        return
+    serializer_class, pk = api_settings.USER_SERIALIZER, instance.pk
+    cache.invalidate(serializer_class, pk)
+    # other requests may cache the old row until the transaction is committed
+    transaction.on_commit(lambda: cache.invalidate(serializer_class, pk), using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_permissions_of_user(
+    sender, instance, using=None, update_fields=None, **kwargs
+):
+    # superusers have all permissions and inactive users have none
+    cache = get_permission_cache()
+    if cache is None or instance.pk is None:
+        return
+    if update_fields is not None and not {"is_superuser", "is_active"} & set(
+        update_fields
+    ):
+        # e.g. the last login
+        return
+    pk = instance.pk
+    cache.invalidate(pk)
+    # other requests may cache the old row until the transaction is committed
+    transaction.on_commit(lambda: cache.invalidate(pk), using=using)
+
+
+def _invalidate_permission_relations(pks, using):
+    """
+    Invalidates the cached permissions and payloads, which may contain the
+    groups and permissions, of the users with the primary keys pks, or of all
+    users if pks is None.
+    """
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    permission_cache = get_permission_cache()
+    payload_cache = get_payload_cache()
+    serializer_class = api_settings.USER_SERIALIZER
+
+    def invalidate_payloads():
+        if pks is None:
+            payload_cache.invalidate_all()
+        else:
+            for pk in pks:
+                payload_cache.invalidate(serializer_class, pk)
+
+    if permission_cache is not None:
+        if pks is None:
+            permission_cache.invalidate_all()
+        else:
+            for pk in pks:
+                permission_cache.invalidate(pk)
+    if payload_cache is not None:
+        invalidate_payloads()
+        # other requests may cache the old rows until the transaction is committed
+        transaction.on_commit(invalidate_payloads, using=using)
+
+
+@receiver(m2m_changed)
+def invalidate_cached_permissions(
+    sender, instance, action, reverse, pk_set, using=None, **kwargs
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if sender is Group.permissions.through:
+        # we don't know which users are members of the group anymore
+        _invalidate_permission_relations(None, using)
+    elif sender in USER_PERMISSION_RELATIONS:
+        if not reverse:
+            _invalidate_permission_relations([instance.pk], using)
+        elif pk_set is None:
+            # all users were removed from a group or permission
+            _invalidate_permission_relations(None, using)
+        else:
+            _invalidate_permission_relations(list(pk_set), using)
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidate_cached_permissions_on_delete(sender, instance, using=None, **kwargs):
+    # the relations are deleted without m2m_changed signals
+    _invalidate_permission_relations(None, using)
@@ -0,0 +1,5 @@
+from django.urls import include, path
+
+from ai_kit_auth.urls import get_auth_patterns
+
+urlpatterns = [path("", include(get_auth_patterns(use_async=True)))]
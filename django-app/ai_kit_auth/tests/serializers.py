@@ -1,3 +1,5 @@
+from django.contrib.auth.models import Group
+from rest_framework import serializers
 from rest_framework.serializers import CharField
 from ai_kit_auth.serializers import UserModel, UserSerializer, RegistrationSerializer
 
@@ -11,4 +13,26 @@ class CustomUserSerializer(UserSerializer):
         return "test"
 
 class CustomRegistrationSerializer(RegistrationSerializer):
-    last_name  = CharField(required = True, error_messages={"required": "required", "blank": "blank"})
\ No newline at end of file
+    last_name  = CharField(required = True, error_messages={"required": "required", "blank": "blank"})
+
+
+class GroupSerializer(serializers.ModelSerializer):
+    permissions = serializers.SlugRelatedField(
+        slug_field="codename", many=True, read_only=True
+    )
+
+    class Meta:
+        model = Group
+        fields = ["name", "permissions"]
+
+
+class PermissionUserSerializer(UserSerializer):
+    groups = GroupSerializer(many=True, read_only=True)
+    permissions = serializers.SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ["groups", "permissions"]
+        prefetch_related = ("groups__permissions",)
+
+    def get_permissions(self, user):
+        return sorted(user.get_all_permissions())
@@ -0,0 +1,129 @@
+"""
+A minimal SMTP server for the tests, which keeps the received mails in
+memory and refuses the recipients in refused.
+"""
+
+import email
+import socketserver
+import threading
+import time
+
+from django.test import override_settings
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def read_data(self):
+        lines = []
+        for line in iter(self.rfile.readline, b""):
+            if line == b".\r\n":
+                break
+            # undo the dot stuffing of the client
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost SMTP stand-in")
+        recipients = []
+        for line in iter(self.rfile.readline, b""):
+            command, _, argument = line.decode().rstrip("\r\n").partition(" ")
+            command = command.upper()
+            if command == "EHLO" and server.pipelining:
+                self.reply("250-localhost")
+                self.reply("250 PIPELINING")
+            elif command in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif command in ("MAIL", "RSET"):
+                if command == "MAIL" and server.pipelining:
+                    # the following commands were sent without waiting
+                    server.pipelined.append(b"DATA" in self.rfile.peek())
+                recipients = []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                address = argument.partition(":")[2].split()[0].strip("<>")
+                if address in server.refused:
+                    self.reply("550 Mailbox unavailable")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif command == "DATA" and not recipients:
+                self.reply("554 No valid recipients")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                message = email.message_from_bytes(self.read_data())
+                time.sleep(server.delay)
+                with server.lock:
+                    server.messages.append((recipients, message))
+                recipients = []
+                self.reply("250 OK")
+                if server.close_after_mail:
+                    return
+            elif command == "NOOP":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Use it as a context manager, which runs the server and configures the
+    email backend for it, by default the SMTP backend of django. With
+    close_after_mail, it closes the connection after every mail, like after
+    an idle timeout, and it waits delay seconds before accepting a mail.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        refused=(),
+        backend="django.core.mail.backends.smtp.EmailBackend",
+        pipelining=False,
+        close_after_mail=False,
+        delay=0,
+    ):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.refused = set(refused)
+        self.backend = backend
+        self.pipelining = pipelining
+        self.close_after_mail = close_after_mail
+        self.delay = delay
+        self.connections = 0
+        self.messages = []
+        self.pipelined = []
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def recipients(self):
+        return [address for recipients, _ in self.messages for address in recipients]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        self._settings = override_settings(
+            EMAIL_BACKEND=self.backend,
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=self.port,
+            EMAIL_HOST_USER="",
+            EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False,
+        )
+        self._settings.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._settings.disable()
+        self.shutdown()
+        self.server_close()
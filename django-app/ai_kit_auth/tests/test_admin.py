@@ -1,10 +1,12 @@
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
+from django.contrib import admin, messages
 from django.core.exceptions import ValidationError
 from model_bakery import baker
 
-from ai_kit_auth.admin import User, AIUserCreationForm, AIUserChangeForm
+from ai_kit_auth.admin import User, AIUserAdmin, AIUserCreationForm, AIUserChangeForm
+from ai_kit_auth.services import MailBatchResult
 
 EMAIL = "a@example.com"
 
@@ -70,3 +72,27 @@ class ChangeFormTests(TestCase):
         form.cleaned_data = {"email": EMAIL}
         # Should not raise
         self.assertEqual(form.clean_email(), EMAIL)
+
+
+class SendActivationMailsActionTests(TestCase):
+    @patch("ai_kit_auth.admin.send_activation_by_admin_mails")
+    def test_reports_sent_and_failed_batches(self, mock_send_mails):
+        error = ConnectionError("refused")
+        mock_send_mails.return_value = [
+            MailBatchResult(["a@example.com", "b@example.com"], 2, None),
+            MailBatchResult(["c@example.com"], None, error),
+        ]
+        model_admin = AIUserAdmin(User, admin.site)
+        queryset = Mock()
+        with patch.object(model_admin, "message_user") as message_user:
+            model_admin.send_activation_mails(Mock(), queryset)
+
+        queryset.filter.assert_called_with(is_active=False)
+        mock_send_mails.assert_called_with(queryset.filter.return_value)
+        self.assertEqual(
+            message_user.call_args_list[0][0][1], "Sent 2 activation mails."
+        )
+        self.assertEqual(
+            message_user.call_args_list[1][0][1:],
+            ("Sending to c@example.com failed: refused", messages.ERROR),
+        )
@@ -1,5 +1,11 @@
+import tempfile
+from pathlib import Path
 from unittest.mock import Mock, patch
 from django.urls import reverse
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import authenticate
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.middleware.csrf import _does_token_match
@@ -7,7 +13,12 @@ from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.test import APITestCase
 from model_bakery import baker
-from ai_kit_auth import services
+from ai_kit_auth import serializers, services, views
+from ai_kit_auth.password_validation import (
+    validation_result_cache,
+    write_password_filter,
+)
+from ai_kit_auth.tests.serializers import CustomUserSerializer
 
 from ai_kit_auth.signals import (
     user_pre_login,
@@ -32,6 +43,7 @@ login_url = reverse("ai_kit_auth:login")
 logout_url = reverse("ai_kit_auth:logout")
 me_url = reverse("ai_kit_auth:me")
 validate_password_url = reverse("ai_kit_auth:validate_password")
+password_policy_url = reverse("ai_kit_auth:password_policy")
 activate_url = reverse("ai_kit_auth:activate")
 register_url = reverse("ai_kit_auth:register")
 send_pw_reset_email_url = reverse("ai_kit_auth:send_pw_reset_email")
@@ -157,6 +169,139 @@ class MeViewTests(AuthTestCase):
         response = self.client.get(me_url)
         self.assertTrue("is_active" in response.data["user"])
 
+    def test_not_modified(self):
+        self.client.login(username=self.user.username, password=PASSWORD)
+        response = self.client.get(me_url)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        response = self.client.get(me_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+        self.assertTrue(response.has_header("ETag"))
+
+    def test_etag_changes_with_user(self):
+        self.client.login(username=self.user.username, password=PASSWORD)
+        etag = self.client.get(me_url)["ETag"]
+        self.user.email = "changed@example.com"
+        self.user.save()
+        response = self.client.get(me_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["user"]["email"], "changed@example.com")
+
+    def test_etag_changes_with_session(self):
+        etag = self.client.get(me_url)["ETag"]
+        self.client.login(username=self.user.username, password=PASSWORD)
+        response = self.client.get(me_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["user"]["id"], self.user.id)
+
+    def test_etag_changes_with_csrf_cookie(self):
+        etag = self.client.get(me_url)["ETag"]
+        del self.client.cookies["csrftoken"]
+        response = self.client.get(me_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("csrftoken", response.cookies)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@override_settings(
+    AI_KIT_AUTH={"FRONTEND": {"URL": "example.com"}, "READ_ONLY_ME": True}
+)
+class ReadOnlyMeTests(AuthTestCase):
+    def test_issues_csrf_token_once(self):
+        response = self.client.get(me_url)
+        self.assertIn("csrftoken", response.cookies)
+        self.assertTrue(
+            _does_token_match(
+                response.cookies["csrftoken"].value, response.data["csrf"]
+            )
+        )
+        response = self.client.get(me_url)
+        self.assertNotIn("csrftoken", response.cookies)
+
+    def test_repeated_polls_get_the_same_response(self):
+        self.client.force_login(self.user)
+        self.client.get(me_url)
+        first = self.client.get(me_url)
+        second = self.client.get(me_url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(second.cookies, {})
+
+    def test_returned_token_is_valid(self):
+        self.client.force_login(self.user)
+        self.client.get(me_url)
+        csrf_token = self.client.get(me_url).data["csrf"]
+        self.client.handler.enforce_csrf_checks = True
+        response = self.client.post(logout_url, HTTP_X_CSRFTOKEN=csrf_token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invalid_csrf_cookie_is_replaced(self):
+        self.client.cookies["csrftoken"] = "invalid"
+        response = self.client.get(me_url)
+        self.assertTrue(
+            _does_token_match(
+                response.cookies["csrftoken"].value, response.data["csrf"]
+            )
+        )
+
+    @override_settings(CSRF_USE_SESSIONS=True)
+    def test_no_session_writes(self):
+        self.client.force_login(self.user)
+        self.client.get(me_url)
+        with patch("django.contrib.sessions.backends.db.SessionStore.save") as save:
+            response = self.client.get(me_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        save.assert_not_called()
+        self.assertEqual(response.cookies, {})
+
+    def test_cookie_renewed_without_read_only_me(self):
+        self.client.get(me_url)
+        with self.settings(AI_KIT_AUTH={"FRONTEND": {"URL": "example.com"}}):
+            response = self.client.get(me_url)
+        self.assertIn("csrftoken", response.cookies)
+
+
+@override_settings(
+    AI_KIT_AUTH={
+        "FRONTEND": {"URL": "example.com"},
+        "USER_SERIALIZER": "ai_kit_auth.tests.serializers.CustomUserSerializer",
+        "USER_PAYLOAD_CACHE": {"ENABLED": True},
+    }
+)
+class UserPayloadCacheTests(AuthTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def serialized(self):
+        with patch.object(
+            CustomUserSerializer,
+            "to_representation",
+            autospec=True,
+            side_effect=CustomUserSerializer.to_representation,
+        ) as to_representation:
+            response = self.client.get(me_url)
+        return response, to_representation.call_count
+
+    def test_caches_payload(self):
+        self.assertEqual(self.serialized()[1], 1)
+        response, count = self.serialized()
+        self.assertEqual(count, 0)
+        self.assertEqual(response.data["user"]["email"], EMAIL)
+
+    def test_invalidated_on_save(self):
+        self.serialized()
+        self.user.email = "changed@example.com"
+        self.user.save()
+        response, count = self.serialized()
+        self.assertEqual(count, 1)
+        self.assertEqual(response.data["user"]["email"], "changed@example.com")
+
+    def test_etag_stays_the_same(self):
+        etag = self.client.get(me_url)["ETag"]
+        self.assertEqual(self.client.get(me_url)["ETag"], etag)
+
 
 class LogoutTests(AuthTestCase):
     def test_logout(self):
@@ -221,6 +366,29 @@ class ValidatePasswordTests(AuthTestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_validators_are_reused(self):
+        data = {"password": "longandvalidpassword", "username": "u", "email": EMAIL}
+        self.client.post(validate_password_url, data, format="json")
+        with patch(
+            "django.contrib.auth.password_validation.get_password_validators"
+        ) as mock_get_validators:
+            response = self.client.post(validate_password_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_get_validators.assert_not_called()
+
+    def test_validate_password_short_circuit(self):
+        data = {"password": "1234", "username": "username", "email": EMAIL}
+        response = self.client.post(validate_password_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertGreater(len(response.data["password"]), 1)
+
+        with patch.object(
+            views.api_settings, "SHORT_CIRCUIT_PASSWORD_VALIDATION", True
+        ):
+            response = self.client.post(validate_password_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data["password"]), 1)
+
     def test_validate_password_fail(self):
         response = self.client.post(
             validate_password_url,
@@ -230,6 +398,89 @@ class ValidatePasswordTests(AuthTestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+@patch.object(serializers.api_settings.PASSWORD_VALIDATION_CACHE, "ENABLED", True)
+class ValidatePasswordCacheTests(AuthTestCase):
+    data = {"password": "username", "username": "username", "email": EMAIL}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        validation_result_cache.reset_stats()
+
+    def test_caches_results(self):
+        response = self.client.post(validate_password_url, self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with patch("ai_kit_auth.serializers.validate_password") as mock_validate:
+            cached = self.client.post(validate_password_url, self.data, format="json")
+        mock_validate.assert_not_called()
+        self.assertEqual(cached.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(validation_result_cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_does_not_store_passwords(self):
+        key = validation_result_cache.key(False, None, "username", EMAIL, "secret")
+        self.assertNotIn("secret", key)
+        self.assertNotEqual(
+            key, validation_result_cache.key(False, None, "username", EMAIL, "other")
+        )
+
+    def test_invalidated_when_validators_change(self):
+        self.client.post(validate_password_url, self.data, format="json")
+        with self.settings(AUTH_PASSWORD_VALIDATORS=[]):
+            response = self.client.post(validate_password_url, self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_options_that_are_not_json(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "passwords.bin"
+        write_password_filter(["username"], path)
+        validators = [
+            {
+                "NAME": "ai_kit_auth.password_validation.BreachedPasswordValidator",
+                "OPTIONS": {"password_filter_path": path},
+            }
+        ]
+        with self.settings(AUTH_PASSWORD_VALIDATORS=validators):
+            response = self.client.post(validate_password_url, self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["password"][0].code, "password_too_common")
+
+
+class PasswordPolicyTests(AuthTestCase):
+    def test_describes_validators(self):
+        response = self.client.get(password_policy_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        types = [validator["type"] for validator in response.data["validators"]]
+        self.assertEqual(
+            types,
+            ["user_attribute_similarity", "min_length", "common_passwords", "numeric"],
+        )
+        self.assertEqual(response.data["validators"][1]["min_length"], 8)
+
+    def test_not_modified(self):
+        response = self.client.get(password_policy_url)
+        self.assertTrue(response.has_header("ETag"))
+        response = self.client.get(
+            password_policy_url, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_with_validators(self):
+        etag = self.client.get(password_policy_url)["ETag"]
+        with self.settings(
+            AUTH_PASSWORD_VALIDATORS=[
+                {
+                    "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
+                    "OPTIONS": {"min_length": 12},
+                }
+            ]
+        ):
+            response = self.client.get(password_policy_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["validators"][0]["min_length"], 12)
+
+
 class ActivateEmailTests(AuthTestCase):
     def test_activate_user(self):
         user = baker.make(UserModel, is_active=False, email="to@example.com")
@@ -307,6 +558,62 @@ class ActivateEmailTests(AuthTestCase):
         received.assert_any_call(post=True)
 
 
+class QueryCountTests(AuthTestCase):
+    def count_user_selects(self, method, *args, **kwargs):
+        table = UserModel._meta.db_table
+        with CaptureQueriesContext(connection) as context:
+            response = method(*args, format="json", **kwargs)
+        self.assertLess(response.status_code, 300)
+        return sum(
+            query["sql"].startswith("SELECT") and f'FROM "{table}"' in query["sql"]
+            for query in context.captured_queries
+        )
+
+    def make_link(self, user):
+        ident = str(services.scramble_id(user.pk))
+        return ident, PasswordResetTokenGenerator().make_token(user)
+
+    def test_login(self):
+        data = {"ident": self.user.email, "password": PASSWORD}
+        # the ModelBackend loads the resolved user again
+        self.assertEqual(self.count_user_selects(self.client.post, login_url, data), 2)
+
+    def test_activation(self):
+        user = baker.make(UserModel, is_active=False, email="to@example.com")
+        ident, token = self.make_link(user)
+        data = {"ident": ident, "token": token}
+        self.assertEqual(
+            self.count_user_selects(self.client.post, activate_url, data), 1
+        )
+
+    def test_reset_password(self):
+        ident, token = self.make_link(self.user)
+        data = {"ident": ident, "token": token, "password": "new_awesome_password"}
+        # the second query comes from the password validation by ident
+        self.assertEqual(
+            self.count_user_selects(self.client.post, pw_reset_url, data), 2
+        )
+
+    def test_deactivation_invalidates_tokens_without_query(self):
+        user = UserModel.objects.get(pk=self.user.pk)
+        user.is_active = False
+        with self.assertNumQueries(1):
+            user.save(update_fields=["is_active", "password"])
+        user.refresh_from_db()
+        self.assertFalse(user.has_usable_password())
+
+    def test_deactivation_after_refresh_invalidates_tokens(self):
+        UserModel.objects.filter(pk=self.user.pk).update(is_active=False)
+        user = UserModel.objects.get(pk=self.user.pk)
+        # activated elsewhere, which refresh_from_db doesn't remember
+        UserModel.objects.filter(pk=self.user.pk).update(is_active=True)
+        user.refresh_from_db()
+        user.is_active = False
+        user.save()
+        user.refresh_from_db()
+        self.assertFalse(user.has_usable_password())
+
+
 class ResetPWTests(AuthTestCase):
     def test_init_password_reset(self):
         response = self.client.post(send_pw_reset_email_url, {"ident": self.user.email})
@@ -0,0 +1,122 @@
+import smtplib
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.test import TestCase, override_settings
+from model_bakery import baker
+
+from ai_kit_auth import async_smtp
+from ai_kit_auth.services import asend_email, asend_reset_pw_mail, send_reset_pw_mail
+from ai_kit_auth.tests.smtp import SMTPServer
+
+UserModel = get_user_model()
+
+BACKEND = "ai_kit_auth.async_smtp.EmailBackend"
+
+ASYNC_SMTP = {
+    "FRONTEND": {"URL": "example.com"},
+    "ASYNC_SMTP": {"POOL_SIZE": 2, "SEND_TIMEOUT": 5, "IDLE_TIMEOUT": 60},
+}
+
+
+def messages(*addresses):
+    return [
+        EmailMessage("subject", f"to {address}", "from@example.com", [address])
+        for address in addresses
+    ]
+
+
+@override_settings(AI_KIT_AUTH=ASYNC_SMTP)
+class AsyncSMTPBackendTests(TestCase):
+    def setUp(self):
+        self.addCleanup(async_smtp.shutdown)
+
+    def test_send_mail(self):
+        with SMTPServer(backend=BACKEND) as server:
+            self.assertEqual(
+                send_mail("subject", "body", "from@example.com", ["to@example.com"]),
+                1,
+            )
+        recipients, message = server.messages[0]
+        self.assertEqual(recipients, ["to@example.com"])
+        self.assertEqual(message["Subject"], "subject")
+        self.assertEqual(message.get_payload(), "body\r\n")
+
+    def test_connections_are_reused(self):
+        with SMTPServer(backend=BACKEND) as server:
+            for address in ("a@example.com", "b@example.com", "c@example.com"):
+                send_mail("subject", "body", "from@example.com", [address])
+        self.assertEqual(len(server.messages), 3)
+        self.assertEqual(server.connections, 1)
+
+    def test_messages_are_sent_in_parallel_up_to_pool_size(self):
+        addresses = [f"user{i}@example.com" for i in range(6)]
+        with SMTPServer(backend=BACKEND, delay=0.05) as server:
+            self.assertEqual(get_connection().send_messages(messages(*addresses)), 6)
+        self.assertEqual(sorted(server.recipients), addresses)
+        self.assertEqual(server.connections, 2)
+
+    def test_commands_are_pipelined(self):
+        with SMTPServer(backend=BACKEND, pipelining=True) as server:
+            get_connection().send_messages(messages("a@example.com"))
+        self.assertEqual(server.pipelined, [True])
+        self.assertEqual(server.recipients, ["a@example.com"])
+
+    def test_refused_recipients(self):
+        with SMTPServer(
+            backend=BACKEND, refused=["refused@example.com"], pipelining=True
+        ) as server:
+            with self.assertRaises(smtplib.SMTPRecipientsRefused):
+                get_connection().send_messages(messages("refused@example.com"))
+            # the session was reset, so the connection is still used
+            get_connection().send_messages(messages("a@example.com"))
+        self.assertEqual(server.recipients, ["a@example.com"])
+        self.assertEqual(server.connections, 1)
+
+    def test_fail_silently(self):
+        with SMTPServer(backend=BACKEND, refused=["refused@example.com"]):
+            connection = get_connection(fail_silently=True)
+            sent = connection.send_messages(
+                messages("refused@example.com", "a@example.com")
+            )
+        self.assertEqual(sent, 1)
+
+    def test_closed_connections_are_replaced(self):
+        with SMTPServer(backend=BACKEND, close_after_mail=True) as server:
+            for address in ("a@example.com", "b@example.com"):
+                send_mail("subject", "body", "from@example.com", [address])
+        self.assertEqual(server.recipients, ["a@example.com", "b@example.com"])
+        self.assertEqual(server.connections, 2)
+
+    def test_send_timeout(self):
+        config = {**ASYNC_SMTP, "ASYNC_SMTP": {"SEND_TIMEOUT": 1}}
+        with self.settings(AI_KIT_AUTH=config):
+            with SMTPServer(backend=BACKEND, delay=1.5):
+                with self.assertRaises(TimeoutError) as context:
+                    get_connection().send_messages(messages("a@example.com"))
+        # the builtin one, which asyncio.TimeoutError isn't before python 3.11
+        self.assertIs(type(context.exception), TimeoutError)
+
+    async def test_asend_email(self):
+        with SMTPServer(backend=BACKEND) as server:
+            await asend_email("subject", "text", "<p>html</p>", "to@example.com")
+        recipients, message = server.messages[0]
+        self.assertEqual(recipients, ["to@example.com"])
+        plaintext, html = message.get_payload()
+        self.assertEqual(html.get_payload(), "<p>html</p>")
+
+    async def test_asend_email_with_other_backends(self):
+        await asend_email("subject", "text", "<p>html</p>", "to@example.com")
+        self.assertEqual(mail.outbox[0].to, ["to@example.com"])
+
+    def test_asend_reset_pw_mail(self):
+        user = baker.make(UserModel, email="to@example.com")
+        with SMTPServer(backend=BACKEND) as server:
+            send_reset_pw_mail(user)
+            # the same mail, but awaited
+            async_to_sync(asend_reset_pw_mail)(user)
+        sync_message, async_message = (message for _, message in server.messages)
+        self.assertEqual(server.recipients, ["to@example.com"] * 2)
+        self.assertEqual(sync_message["Subject"], async_message["Subject"])
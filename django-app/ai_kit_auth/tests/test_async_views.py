@@ -0,0 +1,191 @@
+from unittest.mock import Mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core import mail
+from django.core.cache import cache
+from django.middleware.csrf import _does_token_match
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ai_kit_auth import async_views, services, views
+from ai_kit_auth.signals import user_post_login, user_pre_login
+
+PASSWORD = "jafsdfah24agdsfghasdf"
+EMAIL = "example@example.com"
+UserModel = get_user_model()
+
+ASYNC_URLS = "ai_kit_auth.tests.async_urls"
+
+
+@override_settings(ROOT_URLCONF=ASYNC_URLS)
+class AsyncViewsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = baker.make(UserModel, email=EMAIL)
+        self.user.set_password(PASSWORD)
+        self.user.save()
+
+    def post(self, name, data=None):
+        return self.client.post(reverse(f"ai_kit_auth:{name}"), data, format="json")
+
+    def make_link(self, user):
+        ident = str(services.scramble_id(user.pk))
+        return ident, PasswordResetTokenGenerator().make_token(user)
+
+    def test_urls_resolve_to_async_views(self):
+        response = self.client.get(reverse("ai_kit_auth:me"))
+        self.assertIs(
+            response.resolver_match.func.__wrapped__, async_views.me_view.__wrapped__
+        )
+
+    def test_login(self):
+        received = Mock()
+
+        def receiver(sender, user, **kwargs):
+            received(sender, user)
+
+        user_pre_login.connect(receiver)
+        user_post_login.connect(receiver)
+        try:
+            response = self.post("login", {"ident": EMAIL, "password": PASSWORD})
+        finally:
+            user_pre_login.disconnect(receiver)
+            user_post_login.disconnect(receiver)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["user"]["id"], self.user.id)
+        self.assertTrue(
+            _does_token_match(response.cookies["csrftoken"].value, data["csrf"])
+        )
+        self.assertEqual(int(self.client.session["_auth_user_id"]), self.user.id)
+        # the sync views are the senders
+        received.assert_called_with(views.LoginView, self.user)
+        self.assertEqual(received.call_count, 2)
+
+    def test_login_wrong_password(self):
+        response = self.post("login", {"ident": EMAIL, "password": "wrong"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"non_field_errors": ["invalid_credentials"]})
+
+    @override_settings(
+        AI_KIT_AUTH={
+            "FRONTEND": {"URL": "example.com"},
+            "LOGIN_THROTTLE": {"ENABLED": True, "MAX_FAILURES_PER_IDENT": 0},
+        }
+    )
+    def test_login_throttled(self):
+        self.post("login", {"ident": EMAIL, "password": "wrong"})
+        response = self.post("login", {"ident": EMAIL, "password": PASSWORD})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.json(), {"non_field_errors": ["too_many_attempts"]})
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    def test_login_missing_fields(self):
+        response = self.post("login", {"ident": ""})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json(), {"ident": ["blank"], "password": ["required"]}
+        )
+
+    def test_method_not_allowed(self):
+        response = self.client.get(reverse("ai_kit_auth:login"))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_me(self):
+        response = self.client.get(reverse("ai_kit_auth:me"))
+        self.assertIsNone(response.json()["user"])
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("ai_kit_auth:me"))
+        self.assertEqual(response.json()["user"]["email"], EMAIL)
+        self.assertIn("csrf", response.json())
+
+    def test_me_not_modified(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("ai_kit_auth:me"))
+        response = self.client.get(
+            reverse("ai_kit_auth:me"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_logout(self):
+        response = self.post("logout")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_login(self.user)
+        response = self.post("logout")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+    def test_authenticated_requests_need_csrf_token(self):
+        self.client.handler.enforce_csrf_checks = True
+        self.client.force_login(self.user)
+        response = self.post("logout")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIn("CSRF Failed", response.json()["detail"])
+
+    def test_registration(self):
+        response = self.post(
+            "register",
+            {
+                "username": "new",
+                "email": "new@example.com",
+                "last_name": "last name",
+                "password": PASSWORD,
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(UserModel.objects.get(username="new").is_active)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_validate_password(self):
+        response = self.post(
+            "validate_password",
+            {"username": "new", "email": "new@example.com", "password": "1234"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("password_too_short", response.json()["password"])
+
+    def test_activation(self):
+        user = baker.make(UserModel, is_active=False, email="to@example.com")
+        ident, token = self.make_link(user)
+        response = self.post("activate", {"ident": ident, "token": token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.is_active)
+
+        response = self.post("activate", {"ident": ident, "token": "invalid"})
+        self.assertEqual(response.json(), {"error": "activation_link_invalid"})
+
+    def test_password_reset(self):
+        response = self.post("send_pw_reset_email", {"ident": EMAIL})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 1)
+
+        ident, token = self.make_link(self.user)
+        data = {"ident": ident, "token": token, "password": "new_awesome_password"}
+        response = self.post("pw_reset", data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("new_awesome_password"))
+
+
+@override_settings(ROOT_URLCONF=ASYNC_URLS)
+class AsyncClientTests(TestCase):
+    def setUp(self):
+        self.user = baker.make(UserModel, email=EMAIL)
+        self.user.set_password(PASSWORD)
+        self.user.save()
+
+    async def test_login_and_me(self):
+        response = await self.async_client.post(
+            reverse("ai_kit_auth:login"),
+            {"ident": EMAIL, "password": PASSWORD},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = await self.async_client.get(reverse("ai_kit_auth:me"))
+        self.assertEqual(response.json()["user"]["id"], self.user.id)
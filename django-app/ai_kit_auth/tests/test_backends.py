@@ -0,0 +1,325 @@
+from unittest.mock import Mock, patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import authenticate, get_user_model, user_login_failed
+from django.contrib.auth.models import Group, Permission, update_last_login
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+
+from ai_kit_auth.backends import (
+    UserInstanceBackend,
+    get_user_cache,
+    user_instance_backend_enabled,
+)
+from ai_kit_auth import views
+from ai_kit_auth.serializers import LoginSerializer
+from ai_kit_auth.tests.serializers import PermissionUserSerializer
+
+PASSWORD = "jafsdfah24agdsfghasdf"
+UserModel = get_user_model()
+
+login_url = reverse("ai_kit_auth:login")
+me_url = reverse("ai_kit_auth:me")
+
+USER_INSTANCE_BACKEND = ["ai_kit_auth.backends.UserInstanceBackend"]
+
+
+@override_settings(AUTHENTICATION_BACKENDS=USER_INSTANCE_BACKEND)
+class UserInstanceBackendTests(TestCase):
+    def setUp(self):
+        self.user = baker.make(UserModel, email="a@example.com")
+        self.user.set_password(PASSWORD)
+        self.user.save()
+
+    def test_authenticates_instance_without_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(authenticate(user=self.user, password=PASSWORD), self.user)
+
+    def test_rejects_wrong_password(self):
+        received = Mock()
+        user_login_failed.connect(received)
+        try:
+            self.assertIsNone(authenticate(user=self.user, password="wrong"))
+        finally:
+            user_login_failed.disconnect(received)
+        received.assert_called_once()
+
+    def test_rejects_inactive_user(self):
+        self.user.is_active = False
+        self.assertIsNone(authenticate(user=self.user, password=PASSWORD))
+
+    def test_still_authenticates_by_username(self):
+        self.assertEqual(
+            authenticate(username=self.user.username, password=PASSWORD), self.user
+        )
+
+    def test_failed_login_signal_contains_username(self):
+        received = Mock()
+        user_login_failed.connect(received)
+        try:
+            data = {"ident": self.user.email, "password": "wrong"}
+            request = RequestFactory().post(login_url)
+            serializer = LoginSerializer(data=data, context={"request": request})
+            self.assertFalse(serializer.is_valid())
+        finally:
+            user_login_failed.disconnect(received)
+        credentials = received.call_args[1]["credentials"]
+        self.assertEqual(credentials["username"], self.user.username)
+
+    def test_aauthenticate_checks_instance(self):
+        backend = UserInstanceBackend()
+        aauthenticate = async_to_sync(backend.aauthenticate)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                aauthenticate(None, user=self.user, password=PASSWORD), self.user
+            )
+        self.assertIsNone(aauthenticate(None, user=self.user, password="wrong"))
+        self.assertIsNone(
+            aauthenticate(
+                None, username="unknown", password=PASSWORD, unknown_identity=True
+            )
+        )
+
+    def test_enabled(self):
+        self.assertTrue(user_instance_backend_enabled())
+        with override_settings(
+            AUTHENTICATION_BACKENDS=["django.contrib.auth.backends.ModelBackend"]
+        ):
+            self.assertFalse(user_instance_backend_enabled())
+
+    def test_login_serializer_queries_user_once(self):
+        data = {"ident": self.user.email, "password": PASSWORD}
+        request = RequestFactory().post(login_url)
+
+        serializer = LoginSerializer(data=data, context={"request": request})
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+        with override_settings(
+            AUTHENTICATION_BACKENDS=["django.contrib.auth.backends.ModelBackend"]
+        ):
+            serializer = LoginSerializer(data=data, context={"request": request})
+            with self.assertNumQueries(2):
+                self.assertTrue(serializer.is_valid())
+
+
+USER_CACHE = {
+    "FRONTEND": {"URL": "example.com"},
+    "USER_CACHE": {"ENABLED": True, "LOCAL_SIZE": 2},
+}
+
+
+@override_settings(
+    AI_KIT_AUTH=USER_CACHE, AUTHENTICATION_BACKENDS=USER_INSTANCE_BACKEND
+)
+class UserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = baker.make(UserModel, email="a@example.com")
+        self.user.set_password(PASSWORD)
+        self.user.save()
+        self.backend = UserInstanceBackend()
+
+    def count_user_selects(self, func, *args):
+        table = UserModel._meta.db_table
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args)
+        count = sum(
+            query["sql"].startswith("SELECT") and f'FROM "{table}"' in query["sql"]
+            for query in context.captured_queries
+        )
+        return result, count
+
+    def test_requests_dont_query_the_user(self):
+        self.client.force_login(self.user)
+        self.client.get(me_url)
+        response, count = self.count_user_selects(self.client.get, me_url)
+        self.assertEqual(response.json()["user"]["id"], self.user.id)
+        self.assertEqual(count, 0)
+
+    def test_password_change_ends_session(self):
+        self.client.force_login(self.user)
+        self.client.get(me_url)
+        self.user.set_password("another" + PASSWORD)
+        self.user.save()
+        self.assertIsNone(self.client.get(me_url).json()["user"])
+
+    def test_deactivation_ends_session(self):
+        self.client.force_login(self.user)
+        self.client.get(me_url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.client.get(me_url).json()["user"])
+
+    def test_returns_copies(self):
+        self.backend.get_user(str(self.user.pk)).first_name = "changed"
+        user, count = self.count_user_selects(self.backend.get_user, self.user.pk)
+        self.assertEqual(count, 0)
+        self.assertNotEqual(user.first_name, "changed")
+
+    def test_shared_cache_is_used_when_evicted_locally(self):
+        others = baker.make(UserModel, _quantity=2)
+        for user in [self.user, *others]:
+            self.backend.get_user(user.pk)
+        user_cache = get_user_cache()
+        self.assertEqual(len(user_cache._local), 2)
+        _, count = self.count_user_selects(self.backend.get_user, self.user.pk)
+        self.assertEqual(count, 0)
+
+    def test_async_get_user_uses_the_cache(self):
+        aget_user = async_to_sync(self.backend.aget_user)
+        aget_user(self.user.pk)
+        user, count = self.count_user_selects(aget_user, self.user.pk)
+        self.assertEqual(user, self.user)
+        self.assertEqual(count, 0)
+
+    def test_deleted_user(self):
+        self.backend.get_user(self.user.pk)
+        pk = self.user.pk
+        self.user.delete()
+        self.assertIsNone(self.backend.get_user(pk))
+
+
+@override_settings(
+    AI_KIT_AUTH={
+        "FRONTEND": {"URL": "example.com"},
+        "PERMISSION_CACHE": {"ENABLED": True},
+    },
+    AUTHENTICATION_BACKENDS=USER_INSTANCE_BACKEND,
+)
+class PermissionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = baker.make(UserModel, email="a@example.com")
+        self.group = baker.make(Group)
+        self.permission = Permission.objects.get(codename="add_group")
+        self.backend = UserInstanceBackend()
+
+    def permissions(self):
+        # a fresh instance, like in every request
+        user = UserModel.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as context:
+            permissions = self.backend.get_all_permissions(user)
+        return permissions, len(context.captured_queries)
+
+    def test_caches_permissions(self):
+        self.user.user_permissions.add(self.permission)
+        self.assertEqual(self.permissions(), ({"auth.add_group"}, 2))
+        self.assertEqual(self.permissions(), ({"auth.add_group"}, 0))
+
+    def test_has_perm_uses_cache(self):
+        self.user.user_permissions.add(self.permission)
+        self.permissions()
+        user = UserModel.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("auth.add_group"))
+
+    def test_invalidated_by_demoting_a_superuser(self):
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertIn("auth.add_group", self.permissions()[0])
+        self.user.is_superuser = False
+        self.user.save()
+        self.assertEqual(self.permissions()[0], set())
+        user = UserModel.objects.get(pk=self.user.pk)
+        self.assertFalse(user.has_perm("auth.add_group"))
+
+    def test_not_invalidated_by_last_login(self):
+        self.permissions()
+        update_last_login(None, self.user)
+        self.assertEqual(self.permissions()[1], 0)
+
+    def test_invalidated_by_user_changes(self):
+        self.permissions()
+        self.user.user_permissions.add(self.permission)
+        self.assertEqual(self.permissions()[0], {"auth.add_group"})
+        self.group.permissions.add(Permission.objects.get(codename="change_group"))
+        self.user.groups.add(self.group)
+        self.assertEqual(self.permissions()[0], {"auth.add_group", "auth.change_group"})
+        self.user.user_permissions.clear()
+        self.assertEqual(self.permissions()[0], {"auth.change_group"})
+
+    def test_invalidated_by_group_changes(self):
+        self.user.groups.add(self.group)
+        self.permissions()
+        self.group.permissions.add(self.permission)
+        self.assertEqual(self.permissions()[0], {"auth.add_group"})
+        self.group.user_set.remove(self.user)
+        self.assertEqual(self.permissions()[0], set())
+        self.group.user_set.add(self.user)
+        self.assertEqual(self.permissions()[0], {"auth.add_group"})
+        self.group.user_set.clear()
+        self.assertEqual(self.permissions()[0], set())
+
+    def test_invalidated_by_deleted_group(self):
+        self.group.permissions.add(self.permission)
+        self.user.groups.add(self.group)
+        self.permissions()
+        self.group.delete()
+        self.assertEqual(self.permissions()[0], set())
+
+    def test_me_has_constant_number_of_queries(self):
+        self.client.force_login(self.user)
+
+        def count_queries():
+            with patch.object(
+                views.MeView, "serializer_class", PermissionUserSerializer
+            ), CaptureQueriesContext(connection) as context:
+                response = self.client.get(me_url)
+            return response.json()["user"], len(context.captured_queries)
+
+        self.group.permissions.add(self.permission)
+        self.user.groups.add(self.group)
+        count_queries()
+        user, queries = count_queries()
+        self.assertEqual(user["permissions"], ["auth.add_group"])
+        for group in baker.make(Group, _quantity=3):
+            group.permissions.add(self.permission)
+            self.user.groups.add(group)
+        count_queries()
+        user, more_groups_queries = count_queries()
+        self.assertEqual(len(user["groups"]), 4)
+        self.assertEqual(more_groups_queries, queries)
+
+
+@override_settings(
+    AI_KIT_AUTH={
+        "FRONTEND": {"URL": "example.com"},
+        "USER_SERIALIZER": "ai_kit_auth.tests.serializers.PermissionUserSerializer",
+        "USER_PAYLOAD_CACHE": {"ENABLED": True},
+    }
+)
+@patch.object(views.MeView, "serializer_class", PermissionUserSerializer)
+class PermissionPayloadCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = baker.make(UserModel, email="a@example.com")
+        self.group = baker.make(Group)
+        self.permission = Permission.objects.get(codename="add_group")
+        self.client.force_login(self.user)
+
+    def me(self, etag):
+        response = self.client.get(me_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["user"]
+
+    def test_invalidated_by_group_changes(self):
+        etag = self.client.get(me_url)["ETag"]
+        self.user.groups.add(self.group)
+        self.assertEqual(len(self.me(etag)["groups"]), 1)
+
+    def test_invalidated_by_group_permission_changes(self):
+        self.user.groups.add(self.group)
+        etag = self.client.get(me_url)["ETag"]
+        self.group.permissions.add(self.permission)
+        self.assertEqual(self.me(etag)["permissions"], ["auth.add_group"])
+
+    def test_invalidated_by_deleted_group(self):
+        self.user.groups.add(self.group)
+        etag = self.client.get(me_url)["ETag"]
+        self.group.delete()
+        self.assertEqual(self.me(etag)["groups"], [])
@@ -0,0 +1,90 @@
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase, override_settings
+from model_bakery import baker
+
+from ai_kit_auth import delivery
+from ai_kit_auth.services import send_reset_pw_mail
+
+UserModel = get_user_model()
+
+BACKGROUND_MAIL_DELIVERY = {
+    "FRONTEND": {"URL": "example.com"},
+    "BACKGROUND_MAIL_DELIVERY": {"ENABLED": True, "MAX_WORKERS": 1, "MAX_QUEUE": 1},
+}
+
+
+@override_settings(AI_KIT_AUTH=BACKGROUND_MAIL_DELIVERY)
+class BackgroundMailDeliveryTests(TestCase):
+    def setUp(self):
+        self.user = baker.make(UserModel, email="to@example.com")
+        self.addCleanup(delivery.shutdown)
+
+    def test_sent_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            send_reset_pw_mail(self.user)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        delivery.shutdown()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["to@example.com"])
+
+    def test_not_sent_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    send_reset_pw_mail(self.user)
+                    raise RuntimeError
+        delivery.shutdown()
+        self.assertEqual(mail.outbox, [])
+
+    def test_sent_on_a_worker(self):
+        threads = []
+        with patch("django.core.mail.message.EmailMessage.send") as send:
+            send.side_effect = lambda *args: threads.append(threading.current_thread())
+            with self.captureOnCommitCallbacks(execute=True):
+                send_reset_pw_mail(self.user)
+            delivery.shutdown()
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].name.startswith("ai_kit_auth_mail"))
+
+    def test_sent_inline_when_disabled(self):
+        with self.settings(AI_KIT_AUTH={"FRONTEND": {"URL": "example.com"}}):
+            with self.captureOnCommitCallbacks() as callbacks:
+                send_reset_pw_mail(self.user)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_sent_inline_when_queue_is_full(self):
+        release = threading.Event()
+        threads = []
+
+        def send(*args):
+            threads.append(threading.current_thread())
+            if threading.current_thread() is not threading.main_thread():
+                release.wait(5)
+
+        executor = delivery.get_executor()
+        # one running on the worker and one waiting for it
+        executor.submit(send)
+        executor.submit(send)
+        executor.submit(send)
+        self.assertIn(threading.current_thread(), threads)
+        release.set()
+        delivery.shutdown()
+        self.assertEqual(len(threads), 3)
+
+    def test_errors_are_logged(self):
+        def fail():
+            raise ConnectionError("refused")
+
+        with self.assertLogs("ai_kit_auth.delivery", "ERROR") as logs:
+            delivery.get_executor().submit(fail)
+            delivery.shutdown()
+        self.assertIn("ConnectionError: refused", logs.output[0])
@@ -0,0 +1,173 @@
+import threading
+from unittest.mock import Mock, patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ai_kit_auth import hashing
+from ai_kit_auth.hashing import BoundedExecutor, HashingMetrics, HashingOverloaded
+
+PASSWORD = "jafsdfah24agdsfghasdf"
+UserModel = get_user_model()
+
+login_url = reverse("ai_kit_auth:login")
+register_url = reverse("ai_kit_auth:register")
+
+POOLED = {
+    "FRONTEND": {"URL": "example.com"},
+    "PASSWORD_HASHING": {"ENABLED": True, "MAX_WORKERS": 2, "MAX_QUEUE": 2},
+}
+
+USER_INSTANCE_BACKEND = ["ai_kit_auth.backends.UserInstanceBackend"]
+
+
+class BoundedExecutorTests(TestCase):
+    def setUp(self):
+        self.metrics = HashingMetrics()
+        self.executor = BoundedExecutor(
+            max_workers=1, max_queue=1, retry_after=3, metrics=self.metrics
+        )
+        self.addCleanup(self.executor.shutdown)
+
+    def test_runs_on_pool(self):
+        name = self.executor.run(lambda: threading.current_thread().name)
+        self.assertTrue(name.startswith("ai_kit_auth_hashing"))
+        self.assertEqual(self.metrics.export()["calls"], 1)
+
+    def test_rejects_when_queue_is_full(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        # one call running and one queued
+        callers = [threading.Thread(target=self.executor.run, args=(block,))]
+        callers[0].start()
+        started.wait(5)
+        callers.append(threading.Thread(target=self.executor.run, args=(block,)))
+        callers[1].start()
+        try:
+            with self.assertRaises(HashingOverloaded) as context:
+                self.executor.run(block)
+        finally:
+            release.set()
+            for caller in callers:
+                caller.join()
+        self.assertEqual(context.exception.wait, 3)
+        metrics = self.metrics.export()
+        self.assertEqual(metrics["rejected"], 1)
+        self.assertEqual(metrics["calls"], 2)
+        # the queued call had to wait for the first one
+        self.assertGreater(metrics["max_queue_wait_seconds"], 0)
+
+    def test_process_pool(self):
+        executor = BoundedExecutor(kind="process", max_workers=1, metrics=self.metrics)
+        self.addCleanup(executor.shutdown)
+        encoded = executor.run(make_password, PASSWORD)
+        self.assertTrue(check_password(PASSWORD, encoded))
+
+
+@override_settings(AI_KIT_AUTH=POOLED, AUTHENTICATION_BACKENDS=USER_INSTANCE_BACKEND)
+class PooledHashingTests(APITestCase):
+    def setUp(self):
+        hashing.hashing_metrics.reset()
+        self.user = baker.make(UserModel, email="a@example.com")
+        self.user.set_password(PASSWORD)
+        self.user.save()
+
+    def test_login(self):
+        response = self.client.post(
+            login_url, {"ident": self.user.email, "password": PASSWORD}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(hashing.hashing_metrics.export()["calls"], 1)
+
+    def test_unknown_user_is_hashed_as_well(self):
+        self.assertIsNone(authenticate(username="unknown", password=PASSWORD))
+        self.assertEqual(hashing.hashing_metrics.export()["calls"], 1)
+
+    def test_registration(self):
+        response = self.client.post(
+            register_url,
+            {
+                "username": "new",
+                "email": "new@example.com",
+                "last_name": "last name",
+                "password": PASSWORD,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(UserModel.objects.get(username="new").check_password(PASSWORD))
+        self.assertEqual(hashing.hashing_metrics.export()["calls"], 1)
+
+    def test_registration_saves_once(self):
+        received = Mock()
+        post_save.connect(received, sender=UserModel)
+        try:
+            self.client.post(
+                register_url,
+                {
+                    "username": "new",
+                    "email": "new@Example.com",
+                    "last_name": "last name",
+                    "password": PASSWORD,
+                },
+                format="json",
+            )
+        finally:
+            post_save.disconnect(received, sender=UserModel)
+        received.assert_called_once()
+        self.assertEqual(UserModel.objects.get(username="new").email, "new@example.com")
+
+    @override_settings(
+        PASSWORD_HASHERS=[
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+        ]
+    )
+    def test_outdated_hashes_are_upgraded(self):
+        self.user.password = make_password(PASSWORD, hasher="md5")
+        self.user.save()
+        self.assertTrue(authenticate(username=self.user.username, password=PASSWORD))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$"))
+
+    def test_overloaded(self):
+        executor = hashing.get_executor()
+        with patch.object(executor, "_slots", threading.BoundedSemaphore(0)):
+            response = self.client.post(
+                login_url,
+                {"ident": self.user.email, "password": PASSWORD},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.data["non_field_errors"][0].code, "server_busy")
+        self.assertEqual(response["Retry-After"], "1")
+
+
+@override_settings(AUTHENTICATION_BACKENDS=USER_INSTANCE_BACKEND)
+class InlineHashingTests(TestCase):
+    def test_user_check_password_is_used(self):
+        user = baker.make(UserModel)
+        user.set_password(PASSWORD)
+        with patch.object(UserModel, "check_password", return_value=False) as check:
+            self.assertIsNone(authenticate(user=user, password=PASSWORD))
+        check.assert_called_once_with(PASSWORD)
+
+    def test_user_set_password_is_used(self):
+        user = baker.make(UserModel)
+        with patch.object(UserModel, "set_password") as set_password:
+            hashing.set_password(user, PASSWORD)
+            async_to_sync(hashing.aset_password)(user, PASSWORD)
+        self.assertEqual(set_password.call_count, 2)
+        set_password.assert_called_with(PASSWORD)
@@ -0,0 +1,220 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from ai_kit_auth.hashing import dummy_password_hash
+from ai_kit_auth.identity import IdentityResolver, get_identity_resolver
+from ai_kit_auth.serializers import LoginSerializer
+
+UserModel = get_user_model()
+
+
+class IdentityResolverTests(TestCase):
+    def setUp(self):
+        self.resolver = IdentityResolver(("email", "username"))
+
+    def test_resolves_by_email_case_insensitive(self):
+        user = baker.make(UserModel, email="someone@example.com")
+        self.assertEqual(self.resolver.resolve("SomeOne@Example.com"), user)
+
+    def test_resolves_by_username(self):
+        user = baker.make(UserModel, username="someone")
+        self.assertEqual(self.resolver.resolve("someone"), user)
+
+    def test_resolves_unknown_to_none(self):
+        self.assertIsNone(self.resolver.resolve("nobody"))
+
+    def test_uses_a_single_query(self):
+        baker.make(UserModel, email="someone@example.com")
+        with self.assertNumQueries(1):
+            self.resolver.resolve("someone@example.com")
+
+    def test_earlier_field_wins(self):
+        by_email = baker.make(UserModel, email="a@example.com")
+        baker.make(UserModel, username="a@example.com")
+        self.assertEqual(self.resolver.resolve("a@example.com"), by_email)
+
+    def test_skips_ambiguous_field(self):
+        baker.make(UserModel, email="a@example.com")
+        baker.make(UserModel, email="A@example.com")
+        by_username = baker.make(UserModel, username="a@example.com")
+        self.assertEqual(self.resolver.resolve("a@example.com"), by_username)
+
+    def test_route_by_shape(self):
+        by_email = baker.make(UserModel, email="a@example.com")
+        by_username = baker.make(UserModel, username="a@example.com")
+        resolver = IdentityResolver(("username", "email"), route_by_shape=True)
+        self.assertEqual(resolver.resolve("a@example.com"), by_email)
+        resolver = IdentityResolver(("username", "email"), route_by_shape=False)
+        self.assertEqual(resolver.resolve("a@example.com"), by_username)
+
+    def test_route_other_values_by_shape(self):
+        resolver = IdentityResolver(("username", "email"), route_by_shape=True)
+        self.assertIsNone(resolver.resolve(123))
+        self.assertIsNone(resolver.resolve(["a@example.com"]))
+
+    def test_conflicting_field(self):
+        baker.make(UserModel, email="a@example.com", username="a")
+        self.assertEqual(
+            self.resolver.conflicting_field(
+                {"email": "A@example.com", "username": "b"}
+            ),
+            "email",
+        )
+        self.assertEqual(
+            self.resolver.conflicting_field(
+                {"email": "b@example.com", "username": "a"}
+            ),
+            "username",
+        )
+        self.assertIsNone(
+            self.resolver.conflicting_field({"email": "b@example.com", "username": "b"})
+        )
+
+    def test_resolver_is_rebuilt_on_setting_change(self):
+        resolver = get_identity_resolver()
+        self.assertIs(resolver, get_identity_resolver())
+        with override_settings(
+            AI_KIT_AUTH={
+                "FRONTEND": {"URL": "example.com"},
+                "USER_IDENTITY_FIELDS": ("username",),
+            }
+        ):
+            self.assertEqual(
+                [field.name for field in get_identity_resolver().fields], ["username"]
+            )
+        self.assertIsNot(resolver, get_identity_resolver())
+
+
+IDENTITY_CACHE = {
+    "FRONTEND": {"URL": "example.com"},
+    "IDENTITY_CACHE": {"ENABLED": True},
+}
+
+
+@override_settings(AI_KIT_AUTH=IDENTITY_CACHE)
+class IdentityCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.resolver = get_identity_resolver()
+
+    def test_missing_identity_is_cached(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.resolver.resolve("nobody@example.com"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.resolver.resolve("nobody@example.com"))
+
+    def test_found_identity_is_fetched_by_primary_key(self):
+        user = baker.make(UserModel, email="someone@example.com")
+        self.resolver.resolve("SomeOne@example.com")
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.resolver.resolve("SomeOne@example.com"), user)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn("LIKE", context.captured_queries[0]["sql"])
+        self.assertEqual(self.resolver.cache.stats()["hits"], 1)
+
+    def test_deleted_user_invalidates(self):
+        user = baker.make(UserModel, username="someone")
+        self.resolver.resolve("someone")
+        user.delete()
+        self.assertIsNone(self.resolver.resolve("someone"))
+
+    def test_new_user_with_higher_priority_invalidates(self):
+        by_username = baker.make(UserModel, username="a@example.com")
+        self.assertEqual(self.resolver.resolve("a@example.com"), by_username)
+        by_email = baker.make(UserModel, email="a@example.com")
+        self.assertEqual(self.resolver.resolve("a@example.com"), by_email)
+
+    def test_other_spellings_are_invalidated(self):
+        by_username = baker.make(UserModel, username="A@example.com")
+        self.assertEqual(self.resolver.resolve("A@example.com"), by_username)
+        by_email = baker.make(UserModel, email="a@example.com")
+        self.assertEqual(self.resolver.resolve("A@example.com"), by_email)
+
+    def test_new_users_dont_invalidate_other_identities(self):
+        user = baker.make(UserModel, username="someone")
+        self.resolver.resolve("someone")
+        baker.make(UserModel, username="someone_else")
+        self.resolver.cache.reset_stats()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.resolver.resolve("someone"), user)
+        self.assertEqual(self.resolver.cache.stats()["hits"], 1)
+
+    def test_old_identity_is_invalidated(self):
+        user = baker.make(UserModel, username="someone")
+        self.resolver.resolve("someone")
+        user = UserModel.objects.get(pk=user.pk)
+        user.username = "someone_else"
+        user.save()
+        self.resolver.cache.reset_stats()
+        self.assertIsNone(self.resolver.resolve("someone"))
+        self.assertEqual(self.resolver.cache.stats()["misses"], 1)
+
+    def test_changes_without_signals_are_detected(self):
+        user = baker.make(UserModel, username="someone")
+        self.resolver.resolve("someone")
+        UserModel.objects.filter(pk=user.pk).update(username="someone_else")
+        self.assertIsNone(self.resolver.resolve("someone"))
+
+    def test_early_refresh(self):
+        baker.make(UserModel, username="someone")
+        self.resolver.resolve("someone")
+        # pretend the lookup was slow, so the entry is refreshed right away
+        key = self.resolver.cache.key("someone")
+        generation, pk, field_name, _, expires = cache.get(key)
+        cache.set(key, (generation, pk, field_name, 10**6, expires))
+        self.resolver.cache.reset_stats()
+        with self.assertNumQueries(1):
+            self.resolver.resolve("someone")
+        stats = self.resolver.cache.stats()
+        self.assertEqual(stats["early_refreshes"], 1)
+        self.assertEqual(stats["hit_ratio"], 0.0)
+
+    def test_created_user_invalidates(self):
+        self.resolver.resolve("nobody@example.com")
+        user = baker.make(UserModel, email="Nobody@example.com")
+        self.assertEqual(self.resolver.resolve("nobody@example.com"), user)
+
+    def test_changed_identity_invalidates(self):
+        user = baker.make(UserModel, username="someone")
+        self.resolver.resolve("someone_else")
+        user = UserModel.objects.get(pk=user.pk)
+        user.username = "someone_else"
+        user.save()
+        self.assertEqual(self.resolver.resolve("someone_else"), user)
+
+    def test_other_changes_dont_invalidate(self):
+        user = baker.make(UserModel, username="someone")
+        self.resolver.resolve("nobody")
+        user = UserModel.objects.get(pk=user.pk)
+        user.first_name = "Some"
+        user.save()
+        with self.assertNumQueries(0):
+            self.resolver.resolve("nobody")
+
+    def test_remembered_before_creation_is_ignored(self):
+        # the lookup started before the user was created
+        _, generation = self.resolver.cache.lookup("someone")
+        baker.make(UserModel, username="someone")
+        self.resolver.cache.remember("someone", generation, None, None, 0.1)
+        self.assertIsNotNone(self.resolver.resolve("someone"))
+
+    @override_settings(
+        AUTHENTICATION_BACKENDS=["ai_kit_auth.backends.UserInstanceBackend"]
+    )
+    def test_unknown_login_checks_dummy_hash_without_queries(self):
+        self.resolver.resolve("nobody")
+        serializer = LoginSerializer(
+            data={"ident": "nobody", "password": "password"},
+            context={"request": RequestFactory().post("/")},
+        )
+        with patch("ai_kit_auth.hashing.check_password") as check_password:
+            check_password.return_value = False
+            with self.assertNumQueries(0):
+                self.assertFalse(serializer.is_valid())
+        check_password.assert_called_once_with("password", dummy_password_hash())
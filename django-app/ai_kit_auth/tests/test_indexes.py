@@ -0,0 +1,70 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from model_bakery import baker
+
+from ai_kit_auth.identity import get_identity_resolver
+from ai_kit_auth.indexes import (
+    identity_index_check,
+    identity_indexes,
+    missing_identity_indexes,
+)
+
+UserModel = get_user_model()
+
+LOWERCASE_EMAILS = {"FRONTEND": {"URL": "example.com"}, "LOWERCASE_EMAILS": True}
+
+
+class IdentityIndexesTests(TestCase):
+    def test_functional_index_for_iexact_lookups(self):
+        indexes = identity_indexes()
+        # username is unique already
+        self.assertEqual(len(indexes), 1)
+        self.assertTrue(indexes[0].contains_expressions)
+
+    @override_settings(AI_KIT_AUTH=LOWERCASE_EMAILS)
+    def test_plain_index_for_lowercase_emails(self):
+        indexes = identity_indexes()
+        self.assertEqual(len(indexes), 1)
+        self.assertEqual(indexes[0].fields, ["email"])
+
+    def test_check_ignores_functional_indexes_on_sqlite(self):
+        self.assertEqual(identity_index_check(databases=["default"]), [])
+
+
+class CreateIdentityIndexesCommandTests(TransactionTestCase):
+    def test_creates_and_drops_indexes(self):
+        self.assertEqual(len(missing_identity_indexes()), 1)
+        out = StringIO()
+        call_command("create_identity_indexes", stdout=out)
+        self.assertIn("Created index", out.getvalue())
+        self.assertEqual(missing_identity_indexes(), [])
+
+        out = StringIO()
+        call_command("create_identity_indexes", stdout=out)
+        self.assertIn("exist already", out.getvalue())
+
+        call_command("create_identity_indexes", drop=True)
+        self.assertEqual(len(missing_identity_indexes()), 1)
+
+    @override_settings(AI_KIT_AUTH=LOWERCASE_EMAILS)
+    def test_check_warns_about_missing_plain_index(self):
+        warnings = identity_index_check(databases=["default"])
+        self.assertEqual([w.id for w in warnings], ["ai_kit_auth.W001"])
+        call_command("create_identity_indexes", stdout=StringIO())
+        self.assertEqual(identity_index_check(databases=["default"]), [])
+        call_command("create_identity_indexes", drop=True)
+
+
+@override_settings(AI_KIT_AUTH=LOWERCASE_EMAILS)
+class LowercaseEmailsTests(TestCase):
+    def test_emails_are_stored_lowercase(self):
+        user = baker.make(UserModel, email="Some.One@Example.com")
+        user.refresh_from_db()
+        self.assertEqual(user.email, "some.one@example.com")
+
+    def test_lookup_is_exact_on_normalized_value(self):
+        user = baker.make(UserModel, email="Some.One@Example.com")
+        self.assertEqual(get_identity_resolver().resolve("SOME.ONE@example.com"), user)
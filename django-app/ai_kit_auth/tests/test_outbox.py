@@ -0,0 +1,101 @@
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from model_bakery import baker
+
+from ai_kit_auth import outbox
+from ai_kit_auth.models import QueuedMail
+from ai_kit_auth.services import send_email, send_reset_pw_mail
+
+UserModel = get_user_model()
+
+MAIL_OUTBOX = {
+    "FRONTEND": {"URL": "example.com"},
+    "MAIL_OUTBOX": {"ENABLED": True, "BATCH_SIZE": 2, "MAX_ATTEMPTS": 2},
+}
+
+
+send_messages = EmailBackend.send_messages
+
+
+def failing_send_messages(self, messages):
+    if any(message.to == ["fail@example.com"] for message in messages):
+        raise ConnectionError("refused")
+    return send_messages(self, messages)
+
+
+@override_settings(AI_KIT_AUTH=MAIL_OUTBOX)
+class OutboxTests(TestCase):
+    def enqueue(self, *addresses):
+        for address in addresses:
+            send_email("subject", "text", "<p>html</p>", address)
+
+    def test_mails_are_queued(self):
+        user = baker.make(UserModel, email="to@example.com")
+        send_reset_pw_mail(user)
+        self.assertEqual(mail.outbox, [])
+        queued = QueuedMail.objects.get()
+        self.assertEqual(queued.to, "to@example.com")
+        self.assertIn("example.com", queued.body)
+
+    def test_sent_inline_when_disabled(self):
+        with self.settings(AI_KIT_AUTH={"FRONTEND": {"URL": "example.com"}}):
+            self.enqueue("to@example.com")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(QueuedMail.objects.exists())
+
+    def test_deliver(self):
+        self.enqueue("a@example.com", "b@example.com", "c@example.com")
+        self.assertEqual(outbox.deliver(), (3, 0))
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["a@example.com", "b@example.com", "c@example.com"],
+        )
+        self.assertEqual(mail.outbox[0].alternatives, [("<p>html</p>", "text/html")])
+        self.assertFalse(QueuedMail.objects.exists())
+
+    def test_batches_share_a_connection(self):
+        self.enqueue("a@example.com", "b@example.com", "c@example.com")
+        with patch.object(EmailBackend, "open") as open_connection:
+            self.assertEqual(outbox.deliver_batch(), (2, 0))
+        open_connection.assert_called_once()
+        self.assertEqual(QueuedMail.objects.count(), 1)
+
+    @patch.object(EmailBackend, "send_messages", failing_send_messages)
+    def test_failed_mails_are_retried(self):
+        self.enqueue("fail@example.com", "b@example.com")
+        self.assertEqual(outbox.deliver(), (1, 1))
+        queued = QueuedMail.objects.get()
+        self.assertEqual(queued.attempts, 1)
+        self.assertEqual(queued.last_error, "ConnectionError: refused")
+        self.assertGreater(queued.next_attempt, timezone.now())
+        # not due yet
+        self.assertEqual(outbox.deliver(), (0, 0))
+
+        queued.next_attempt = timezone.now() - timedelta(seconds=1)
+        queued.save()
+        self.assertEqual(outbox.deliver(), (0, 1))
+        queued.refresh_from_db()
+        # given up after MAX_ATTEMPTS
+        self.assertEqual(queued.attempts, 2)
+        self.assertIsNone(queued.next_attempt)
+
+    def test_retry_delay_grows(self):
+        config = SimpleNamespace(BACKOFF_BASE=60, BACKOFF_MAX=3600)
+        delays = [outbox._retry_delay(config, attempts) for attempts in (1, 2, 3, 100)]
+        self.assertEqual(delays, [60, 120, 240, 3600])
+
+    def test_command(self):
+        self.enqueue("a@example.com", "b@example.com", "c@example.com")
+        stdout = StringIO()
+        call_command("send_queued_mails", "--once", stdout=stdout)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(stdout.getvalue(), "Delivered 3 mails, 0 failed\n")
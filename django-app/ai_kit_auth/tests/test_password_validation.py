@@ -0,0 +1,203 @@
+import base64
+import gzip
+import hashlib
+import os
+import tempfile
+from io import StringIO
+from random import Random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.password_validation import (
+    CommonPasswordValidator as DjangoCommonPasswordValidator,
+    UserAttributeSimilarityValidator as DjangoSimilarityValidator,
+)
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from ai_kit_auth.password_validation import (
+    BloomFilter,
+    BreachedPasswordValidator,
+    PasswordFilter,
+    UserAttributeSimilarityValidator,
+    ValidatorTimings,
+    describe_validator,
+    validate_password,
+    validator_timings,
+    write_password_filter,
+)
+
+BREACHED = ["password", "Letmein", "dragon", "123456", "trustno1"]
+
+
+class PasswordFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "passwords.filter")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_contains_listed_passwords(self):
+        self.assertEqual(write_password_filter(BREACHED, self.path), 5)
+        password_filter = PasswordFilter(self.path)
+        for password in BREACHED:
+            self.assertIn(password, password_filter)
+        self.assertIn("LETMEIN", password_filter)
+        self.assertNotIn("correct horse battery staple", password_filter)
+
+    def test_case_sensitive(self):
+        write_password_filter(BREACHED, self.path, lowercase=False)
+        password_filter = PasswordFilter(self.path)
+        self.assertIn("Letmein", password_filter)
+        self.assertNotIn("letmein", password_filter)
+
+    def test_hashed_input(self):
+        lines = [
+            f"{hashlib.sha1(p.encode()).hexdigest().upper()}:42\n" for p in BREACHED
+        ]
+        write_password_filter(lines, self.path, hashed=True)
+        password_filter = PasswordFilter(self.path)
+        self.assertIn("Letmein", password_filter)
+        self.assertNotIn("letmein", password_filter)
+
+    def test_sorts_in_chunks_and_removes_duplicates(self):
+        passwords = [f"password{i % 500}" for i in range(2000)]
+        self.assertEqual(
+            write_password_filter(passwords, self.path, chunk_size=64), 500
+        )
+        password_filter = PasswordFilter(self.path)
+        self.assertEqual(password_filter.count, 500)
+        for i in range(500):
+            self.assertIn(f"password{i}", password_filter)
+        self.assertNotIn("password500", password_filter)
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as f:
+            f.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            PasswordFilter(self.path)
+
+    def test_validator(self):
+        write_password_filter(BREACHED, self.path)
+        validator = BreachedPasswordValidator(self.path)
+        with self.assertRaises(ValidationError) as context:
+            validator.validate("dragon")
+        self.assertEqual(context.exception.error_list[0].code, "password_too_common")
+        validator.validate("correct horse battery staple")
+
+    def test_build_command(self):
+        source = os.path.join(self.directory.name, "passwords.txt.gz")
+        with gzip.open(source, "wt") as f:
+            f.write("\n".join(BREACHED))
+        out = StringIO()
+        call_command("build_password_filter", source, self.path, stdout=out)
+        self.assertIn("Wrote 5 entries", out.getvalue())
+        self.assertIn("dragon", PasswordFilter(self.path))
+
+
+class UserAttributeSimilarityValidatorTests(SimpleTestCase):
+    def validate(self, validator, password, user):
+        try:
+            validator.validate(password, user)
+        except ValidationError as e:
+            return [(error.code, error.params) for error in e.error_list]
+        return []
+
+    def test_same_results_as_django(self):
+        random = Random(42)
+        alphabet = "abcde.@-_ABC1"
+        django_validator = DjangoSimilarityValidator()
+        validator = UserAttributeSimilarityValidator()
+        for _ in range(2000):
+            user = get_user_model()(
+                username="".join(random.choices(alphabet, k=random.randint(0, 12))),
+                email="".join(random.choices(alphabet, k=random.randint(0, 20))),
+                first_name="".join(random.choices(alphabet, k=random.randint(0, 6))),
+            )
+            password = "".join(random.choices(alphabet, k=random.randint(0, 30)))
+            self.assertEqual(
+                self.validate(validator, password, user),
+                self.validate(django_validator, password, user),
+                (password, user.username, user.email, user.first_name),
+            )
+
+    def test_error_code(self):
+        user = get_user_model()(username="someone", email="someone@example.com")
+        self.assertEqual(
+            self.validate(UserAttributeSimilarityValidator(), "SomeOne1", user),
+            [("password_too_similar", {"verbose_name": "username"})],
+        )
+        self.assertEqual(
+            self.validate(UserAttributeSimilarityValidator(), "password", None), []
+        )
+
+
+class FailingValidator:
+    def __init__(self, code):
+        self.code = code
+
+    def validate(self, password, user=None):
+        raise ValidationError(self.code, code=self.code)
+
+
+class SlowFailingValidator(FailingValidator):
+    pass
+
+
+class PassingValidator:
+    def validate(self, password, user=None):
+        pass
+
+
+class ValidationPipelineTests(SimpleTestCase):
+    def setUp(self):
+        validator_timings.reset()
+        self.slow = SlowFailingValidator("slow")
+        self.fast = FailingValidator("fast")
+        self.validators = [self.slow, PassingValidator(), self.fast]
+
+    def codes(self, **kwargs):
+        with self.assertRaises(ValidationError) as context:
+            validate_password("password", None, self.validators, **kwargs)
+        return [error.code for error in context.exception.error_list]
+
+    def test_reports_all_errors_in_configured_order(self):
+        self.assertEqual(self.codes(), ["slow", "fast"])
+
+    def test_short_circuit_stops_at_cheapest_failure(self):
+        validator_timings.record(self.slow, 1.0, True)
+        validator_timings.record(self.fast, 0.001, True)
+        self.assertEqual(self.codes(short_circuit=True), ["fast"])
+
+    def test_records_timings(self):
+        self.codes()
+        timings = validator_timings.export()
+        name = ValidatorTimings.name(self.slow)
+        self.assertEqual(timings[name]["calls"], 1)
+        self.assertEqual(timings[name]["failures"], 1)
+        self.assertEqual(
+            timings[ValidatorTimings.name(PassingValidator())]["failures"], 0
+        )
+
+    def test_passes(self):
+        validate_password("password", None, [PassingValidator()], short_circuit=True)
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_contains_added_passwords(self):
+        passwords = BREACHED + [f"listed{i}" for i in range(2000)]
+        bloom_filter = BloomFilter(len(passwords))
+        for password in passwords:
+            bloom_filter.add(password)
+        for password in passwords:
+            self.assertIn(password.upper(), bloom_filter)
+        false_positives = sum(f"unlisted{i}" in bloom_filter for i in range(2000))
+        self.assertLess(false_positives, 50)
+
+    def test_common_password_list_is_compact(self):
+        validator = DjangoCommonPasswordValidator()
+        description = describe_validator(validator)
+        self.assertEqual(description["code"], "password_too_common")
+        bits = base64.b64decode(description["bloom_filter"]["bits"])
+        self.assertLess(len(bits), 32 * 1024)
@@ -0,0 +1,130 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import serializers
+
+from ai_kit_auth.serialization import compile_serializer, user_data
+from ai_kit_auth.serializers import UserSerializer
+from ai_kit_auth.tests.serializers import CustomUserSerializer
+
+UserModel = get_user_model()
+me_url = reverse("ai_kit_auth:me")
+
+
+class DetailedUserSerializer(serializers.ModelSerializer):
+    full_name = serializers.ReadOnlyField(source="first_name")
+
+    class Meta:
+        model = UserModel
+        fields = [
+            "id",
+            "username",
+            "email",
+            "first_name",
+            "full_name",
+            "is_staff",
+            "last_login",
+            "date_joined",
+        ]
+
+
+class MethodFieldSerializer(UserSerializer):
+    display_name = serializers.SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ["display_name"]
+
+    def get_display_name(self, user):
+        return user.get_username()
+
+
+class RelatedFieldSerializer(UserSerializer):
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ["groups"]
+
+
+class CustomRepresentationSerializer(UserSerializer):
+    def to_representation(self, instance):
+        return {"id": instance.id}
+
+
+class CompileSerializerTests(TestCase):
+    def setUp(self):
+        self.user = baker.make(
+            UserModel, email="a@example.com", first_name="First", last_login=None
+        )
+
+    def test_same_data_as_rest_framework(self):
+        for serializer_class in (
+            UserSerializer,
+            CustomUserSerializer,
+            DetailedUserSerializer,
+        ):
+            with self.subTest(serializer_class.__name__):
+                serialize = compile_serializer(serializer_class)
+                self.assertIsNotNone(serialize)
+                self.assertEqual(serialize(self.user), serializer_class(self.user).data)
+
+    def test_none_values(self):
+        data = compile_serializer(DetailedUserSerializer)(self.user)
+        self.assertIsNone(data["last_login"])
+
+    def test_unsupported_serializers_are_not_compiled(self):
+        for serializer_class in (
+            MethodFieldSerializer,
+            RelatedFieldSerializer,
+            CustomRepresentationSerializer,
+        ):
+            with self.subTest(serializer_class.__name__):
+                self.assertIsNone(compile_serializer(serializer_class))
+
+    def test_cleared_when_settings_change(self):
+        serialize = compile_serializer(UserSerializer)
+        with self.settings(AI_KIT_AUTH={"FRONTEND": {"URL": "example.com"}}):
+            self.assertIsNot(compile_serializer(UserSerializer), serialize)
+
+
+class CompiledUserSerializerTests(TestCase):
+    def setUp(self):
+        self.user = baker.make(UserModel, email="a@example.com")
+        self.client.force_login(self.user)
+
+    def get_me(self):
+        with patch.object(
+            CustomUserSerializer,
+            "to_representation",
+            autospec=True,
+            side_effect=CustomUserSerializer.to_representation,
+        ) as to_representation:
+            response = self.client.get(me_url)
+        return response.json()["user"], to_representation.call_count
+
+    def test_disabled_by_default(self):
+        self.assertEqual(self.get_me()[1], 1)
+
+    @override_settings(
+        AI_KIT_AUTH={
+            "FRONTEND": {"URL": "example.com"},
+            "USER_SERIALIZER": "ai_kit_auth.tests.serializers.CustomUserSerializer",
+            "COMPILE_USER_SERIALIZER": True,
+        }
+    )
+    def test_me_uses_compiled_serializer(self):
+        # compiled before get_me patches to_representation to count the calls
+        compile_serializer(CustomUserSerializer)
+        data, count = self.get_me()
+        self.assertEqual(count, 0)
+        self.assertEqual(data, CustomUserSerializer(self.user).data)
+
+    @override_settings(
+        AI_KIT_AUTH={
+            "FRONTEND": {"URL": "example.com"},
+            "COMPILE_USER_SERIALIZER": True,
+        }
+    )
+    def test_falls_back_to_rest_framework(self):
+        data = user_data(MethodFieldSerializer, self.user, {})
+        self.assertEqual(data["display_name"], self.user.get_username())
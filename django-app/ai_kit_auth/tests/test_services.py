@@ -1,18 +1,26 @@
+from datetime import datetime
 from unittest.mock import patch
 from urllib.parse import parse_qs
 import uuid
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.core import mail
+from django.conf import settings
+from django.template import loader
+from django.template.loaders import filesystem
+from django.utils import translation
 from model_bakery import baker
+from ai_kit_auth.email_templates import email_templates
+from ai_kit_auth.models import QueuedMail
 from ai_kit_auth.services import (
     scramble_id,
     send_user_activation_mail,
+    send_user_activation_mails,
     send_reset_pw_mail,
     send_email,
     make_url,
 )
-
+from ai_kit_auth.tests.smtp import SMTPServer
 
 UserModel = get_user_model()
 
@@ -113,3 +121,165 @@ class InitResetPasswordTest(TestCase):
         mock_make_url.return_value = "url to the frontend reset link thingy"
         send_reset_pw_mail(user)
         self.assertTrue(mock_make_url.return_value in mail.outbox[0].body)
+
+
+CACHE_EMAIL_TEMPLATES = {
+    "FRONTEND": {"URL": "example.com"},
+    "CACHE_EMAIL_TEMPLATES": True,
+}
+
+
+@override_settings(AI_KIT_AUTH=CACHE_EMAIL_TEMPLATES)
+class EmailTemplateRegistryTests(TestCase):
+    def setUp(self):
+        email_templates.clear()
+        self.user = baker.make(UserModel, email="to@example.com")
+
+    def send_mails(self, count=2):
+        with patch(
+            "ai_kit_auth.email_templates.get_template", wraps=loader.get_template
+        ) as get_template:
+            for _ in range(count):
+                send_reset_pw_mail(self.user)
+        return get_template.call_count
+
+    def test_compiles_templates_once(self):
+        self.assertEqual(self.send_mails(), 3)
+        self.assertEqual(self.send_mails(), 0)
+        self.assertEqual(mail.outbox[0].subject, "Zurücksetzen des Passworts ")
+        self.assertEqual(mail.outbox[0].subject, mail.outbox[-1].subject)
+
+    def test_same_mails_as_without_cache(self):
+        send_reset_pw_mail(self.user)
+        with self.settings(AI_KIT_AUTH={"FRONTEND": {"URL": "example.com"}}):
+            send_reset_pw_mail(self.user)
+        cached, uncached = mail.outbox
+        self.assertEqual(cached.subject, uncached.subject)
+        self.assertEqual(cached.body.split("?")[0], uncached.body.split("?")[0])
+
+    def test_cached_per_language(self):
+        self.send_mails(1)
+        with translation.override("en"):
+            self.assertEqual(self.send_mails(1), 3)
+        self.assertEqual(self.send_mails(1), 0)
+
+    def test_cleared_when_settings_change(self):
+        self.send_mails(1)
+        with self.settings(
+            AI_KIT_AUTH={
+                **CACHE_EMAIL_TEMPLATES,
+                "EMAIL_TEMPLATES": {
+                    "RESET_PASSWORD": {
+                        "TITLE": "ai_kit_auth/user_created_title.txt",
+                        "BODY_PLAINTEXT": "ai_kit_auth/user_created_body.txt",
+                        "BODY_HTML": "ai_kit_auth/user_created_body.html",
+                    }
+                },
+            }
+        ):
+            send_reset_pw_mail(self.user)
+        self.assertEqual(self.send_mails(1), 3)
+        self.assertNotEqual(mail.outbox[0].subject, mail.outbox[1].subject)
+
+    def test_extended_templates_are_compiled_once(self):
+        template_settings = settings.TEMPLATES[0]
+        options = {
+            **template_settings["OPTIONS"],
+            "loaders": ["django.template.loaders.app_directories.Loader"],
+        }
+        uncached = [{**template_settings, "APP_DIRS": False, "OPTIONS": options}]
+        with self.settings(TEMPLATES=uncached), patch(
+            "django.template.loaders.filesystem.Loader.get_contents",
+            autospec=True,
+            side_effect=filesystem.Loader.get_contents,
+        ) as read:
+            self.send_mails(1)
+            self.assertTrue(read.called)
+            read.reset_mock()
+            # neither the templates nor the base template of the html body
+            self.send_mails()
+            read.assert_not_called()
+
+    def test_disabled_by_default(self):
+        with self.settings(AI_KIT_AUTH={"FRONTEND": {"URL": "example.com"}}):
+            self.assertEqual(self.send_mails(), 6)
+        self.assertEqual(email_templates._template_sets, {})
+
+
+BULK_MAIL = {
+    "FRONTEND": {"URL": "example.com"},
+    "BULK_MAIL": {"CHUNK_SIZE": 2},
+}
+
+
+def send_custom_activation_mail(user, url):
+    send_email("custom", url, url, user.email)
+
+
+@override_settings(AI_KIT_AUTH=BULK_MAIL)
+class BulkMailTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            baker.make(UserModel, is_active=False, email=f"user{i}@example.com")
+        self.users = UserModel.objects.order_by("pk")
+        self.addresses = [f"user{i}@example.com" for i in range(5)]
+
+    def test_batches_share_a_connection(self):
+        with SMTPServer() as server:
+            results = send_user_activation_mails(self.users)
+        self.assertEqual([result.sent for result in results], [2, 2, 1])
+        self.assertEqual([result.error for result in results], [None] * 3)
+        self.assertEqual(server.recipients, self.addresses)
+        self.assertEqual(server.connections, 1)
+        recipients, message = server.messages[0]
+        self.assertEqual(message["To"], "user0@example.com")
+        plaintext, html = message.get_payload()
+        self.assertIn(str(scramble_id(self.users[0].pk)), plaintext.get_payload())
+        self.assertEqual(html.get_content_type(), "text/html")
+
+    def test_failed_batches_are_reported(self):
+        with SMTPServer(refused=["user2@example.com"]) as server:
+            results = send_user_activation_mails(self.users)
+        self.assertEqual(
+            [result.recipients for result in results],
+            [self.addresses[:2], self.addresses[2:4], self.addresses[4:]],
+        )
+        self.assertEqual([result.sent for result in results], [2, None, 1])
+        self.assertIn("user2@example.com", str(results[1].error))
+        # the rest of the failed batch is skipped, but not the next batch
+        self.assertEqual(server.recipients, self.addresses[:2] + self.addresses[4:])
+
+    # the tokens of both runs are the same
+    @patch(
+        "django.contrib.auth.tokens.PasswordResetTokenGenerator._now",
+        lambda self: datetime(2022, 1, 1),
+    )
+    def test_rendered_on_processes(self):
+        rendered = send_user_activation_mails(self.users)
+        bodies = [message.body for message in mail.outbox]
+        mail.outbox.clear()
+        results = send_user_activation_mails(self.users, processes=2)
+        self.assertEqual(results, rendered)
+        self.assertEqual([message.body for message in mail.outbox], bodies)
+
+    def test_queued_in_outbox(self):
+        config = {**BULK_MAIL, "MAIL_OUTBOX": {"ENABLED": True}}
+        with self.settings(AI_KIT_AUTH=config):
+            results = send_user_activation_mails(self.users, chunk_size=5)
+        self.assertEqual(results[0].sent, 5)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(
+            sorted(QueuedMail.objects.values_list("to", flat=True)), self.addresses
+        )
+
+    def test_custom_mail_function(self):
+        config = {
+            **BULK_MAIL,
+            "SEND_USER_ACTIVATION_MAIL": (
+                "ai_kit_auth.tests.test_services.send_custom_activation_mail"
+            ),
+        }
+        with self.settings(AI_KIT_AUTH=config):
+            results = send_user_activation_mails(self.users)
+        self.assertEqual([result.sent for result in results], [2, 2, 1])
+        self.assertEqual([message.subject for message in mail.outbox], ["custom"] * 5)
@@ -0,0 +1,142 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from ai_kit_auth.throttling import LoginThrottle, LoginThrottled
+
+PASSWORD = "jafsdfah24agdsfghasdf"
+UserModel = get_user_model()
+
+login_url = reverse("ai_kit_auth:login")
+
+THROTTLED = {
+    "FRONTEND": {"URL": "example.com"},
+    "LOGIN_THROTTLE": {
+        "ENABLED": True,
+        "MAX_FAILURES_PER_IP": 10,
+        "MAX_FAILURES_PER_IDENT": 2,
+        "BACKOFF_BASE": 60,
+    },
+}
+
+
+@override_settings(AI_KIT_AUTH=THROTTLED)
+class LoginThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = baker.make(UserModel, email="example@example.com")
+        self.user.set_password(PASSWORD)
+        self.user.save()
+
+    def login(self, password, ident=None):
+        return self.client.post(
+            login_url,
+            {"ident": ident or self.user.username, "password": password},
+            format="json",
+        )
+
+    def test_locked_after_too_many_failures(self):
+        for _ in range(3):
+            response = self.login("wrong")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.login(PASSWORD)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.data["non_field_errors"][0].code, "too_many_attempts")
+        self.assertEqual(response["Retry-After"], "60")
+
+    def test_locked_requests_dont_touch_the_database(self):
+        for _ in range(3):
+            self.login("wrong")
+        with patch("ai_kit_auth.serializers.authenticate") as mock_authenticate:
+            with self.assertNumQueries(0):
+                response = self.login(PASSWORD)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        mock_authenticate.assert_not_called()
+
+    def test_identity_is_case_insensitive(self):
+        for _ in range(3):
+            self.login("wrong", ident=self.user.email.upper())
+        response = self.login(PASSWORD, ident=self.user.email)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_other_identities_are_not_locked(self):
+        for _ in range(3):
+            self.login("wrong", ident="someone_else")
+        response = self.login(PASSWORD)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_ip_is_locked_across_identities(self):
+        for i in range(11):
+            self.login("wrong", ident=f"user{i}")
+        response = self.login(PASSWORD)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_header_is_ignored_without_proxies(self):
+        for i in range(11):
+            self.client.post(
+                login_url,
+                {"ident": f"user{i}", "password": "wrong"},
+                format="json",
+                HTTP_X_FORWARDED_FOR=f"10.0.0.{i}",
+            )
+        response = self.login(PASSWORD)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_header_is_used_behind_proxies(self):
+        with patch("rest_framework.settings.api_settings.NUM_PROXIES", 1):
+            for i in range(11):
+                self.client.post(
+                    login_url,
+                    {"ident": f"user{i}", "password": "wrong"},
+                    format="json",
+                    HTTP_X_FORWARDED_FOR=f"10.0.0.{i}",
+                )
+            response = self.login(PASSWORD)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_success_resets_identity_failures(self):
+        for _ in range(2):
+            self.login("wrong")
+        self.assertEqual(self.login(PASSWORD).status_code, status.HTTP_200_OK)
+        self.client.logout()
+        for _ in range(2):
+            self.login("wrong")
+        self.assertEqual(self.login(PASSWORD).status_code, status.HTTP_200_OK)
+
+    def test_backoff_grows_exponentially(self):
+        throttle = LoginThrottle()
+        request = APIRequestFactory().post(login_url)
+        waits = []
+        for _ in range(5):
+            throttle.failure(request, "ident")
+            try:
+                throttle.check(request, "ident")
+            except LoginThrottled as e:
+                waits.append(e.wait)
+        self.assertEqual(waits, [60, 120, 240])
+
+    def test_backoff_is_capped(self):
+        throttle = LoginThrottle()
+        request = APIRequestFactory().post(login_url)
+        with patch.object(throttle.config, "BACKOFF_MAX", 100):
+            for _ in range(10):
+                throttle.failure(request, "ident")
+        with self.assertRaises(LoginThrottled) as context:
+            throttle.check(request, "ident")
+        self.assertLessEqual(context.exception.wait, 100)
+
+
+class LoginThrottleDisabledTests(APITestCase):
+    def test_not_throttled_by_default(self):
+        user = baker.make(UserModel)
+        for _ in range(10):
+            response = self.client.post(
+                login_url, {"ident": user.username, "password": "wrong"}, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
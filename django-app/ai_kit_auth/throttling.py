@@ -0,0 +1,111 @@
+"""
+Throttling of failed logins.
+
+Failed logins are counted per client ip and per identity in sliding windows,
+which are stored in the django cache. Once a counter exceeds its limit, the ip
+or identity is locked for an exponentially growing time. Locked requests are
+rejected before the user is looked up or a password is hashed, so that floods
+of login attempts don't use up the cpu.
+
+The X-Forwarded-For header is only used for the ip, if the NUM_PROXIES
+setting of rest framework is set, because clients could otherwise send a new
+ip with every attempt.
+"""
+
+import hashlib
+import math
+import time
+
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import APIException, ErrorDetail
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class LoginThrottled(APIException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_code = "too_many_attempts"
+
+    def __init__(self, wait):
+        code = self.default_code
+        super().__init__({"non_field_errors": [ErrorDetail(code, code=code)]})
+        # the exception handler of rest framework sets the Retry-After header
+        self.wait = max(1, math.ceil(wait))
+
+
+class LoginThrottle:
+    def __init__(self, config=None):
+        if config is None:
+            # imported here, because the settings object is replaced on reload
+            from .settings import api_settings
+
+            config = api_settings.LOGIN_THROTTLE
+        self.config = config
+        self.cache = caches[self.config.CACHE_ALIAS]
+
+    @property
+    def enabled(self):
+        return self.config.ENABLED
+
+    def _scopes(self, request, ident):
+        """
+        Returns the cache key prefix and failure limit for each scope.
+        """
+        if drf_settings.NUM_PROXIES is None:
+            ip = request.META.get("REMOTE_ADDR")
+        else:
+            ip = BaseThrottle().get_ident(request)
+        ident = hashlib.sha256(str(ident).strip().lower().encode()).hexdigest()
+        return (
+            (f"ai_kit_auth:login:ip:{ip}", self.config.MAX_FAILURES_PER_IP),
+            (f"ai_kit_auth:login:ident:{ident}", self.config.MAX_FAILURES_PER_IDENT),
+        )
+
+    def check(self, request, ident):
+        """
+        Raises LoginThrottled, if the ip or the identity is locked.
+        """
+        now = time.time()
+        lock_keys = [f"{prefix}:lock" for prefix, _ in self._scopes(request, ident)]
+        locked_until = max(self.cache.get_many(lock_keys).values(), default=0)
+        if locked_until > now:
+            raise LoginThrottled(locked_until - now)
+
+    def _count(self, prefix, now):
+        """
+        Counts a failure and returns the number of failures in the sliding
+        window, which is estimated from the current and previous fixed window.
+        """
+        window = self.config.WINDOW
+        index = int(now // window)
+        key = f"{prefix}:{index}"
+        self.cache.add(key, 0, 2 * window)
+        try:
+            current = self.cache.incr(key)
+        except ValueError:
+            # expired in the meantime
+            self.cache.set(key, 1, 2 * window)
+            current = 1
+        previous = self.cache.get(f"{prefix}:{index - 1}", 0)
+        elapsed = (now % window) / window
+        return previous * (1 - elapsed) + current
+
+    def failure(self, request, ident):
+        now = time.time()
+        for prefix, limit in self._scopes(request, ident):
+            excess = self._count(prefix, now) - limit
+            if excess > 0:
+                exponent = min(math.ceil(excess) - 1, 32)
+                duration = min(
+                    self.config.BACKOFF_BASE * 2**exponent, self.config.BACKOFF_MAX
+                )
+                self.cache.set(f"{prefix}:lock", now + duration, math.ceil(duration))
+
+    def success(self, request, ident):
+        """
+        Resets the failures of the identity, but not the ones of the ip.
+        """
+        _, (prefix, _) = self._scopes(request, ident)
+        index = int(time.time() // self.config.WINDOW)
+        self.cache.delete_many([f"{prefix}:{index}", f"{prefix}:{index - 1}"])
@@ -4,40 +4,72 @@ from typing import Dict, Any
 from .settings import api_settings
 from . import views
 
-endpoints: Dict[str, Any] = {
-    "LOGIN": path(r"login/", views.LoginView.as_view(), name="login"),
-    "ACTIVATE_EMAIL": path(
-        r"activate_email/",
-        views.ActivateUser.as_view(),
-        name="activate",
-    ),
-    "LOGOUT": path(r"logout/", views.LogoutView.as_view(), name="logout"),
-    "ME": path(r"me/", views.MeView.as_view(), name="me"),
-    "VALIDATE_PASSWORD": path(
-        r"validate_password/",
-        views.ValidatePassword.as_view(),
-        name="validate_password",
-    ),
-    "SEND_PW_RESET_MAIL": path(
-        r"send_pw_reset_email/",
-        views.InitiatePasswordResetView.as_view(),
-        name="send_pw_reset_email",
-    ),
-    "RESET_PASSWORD": path(
-        r"reset_password/",
-        views.ResetPassword.as_view(),
-        name="pw_reset",
-    ),
-    "REGISTER": path(r"register/", views.RegistrationView.as_view(), name="register"),
-}
-
-auth_patterns = (
-    [
-        endpoints[key]
-        for key in endpoints
-        if getattr(api_settings.ENABLE_ENDPOINTS, key)
-    ],
-    "ai_kit_auth",
-)
+
+def get_endpoints(use_async=False) -> Dict[str, Any]:
+    if use_async:
+        from . import async_views
+
+        login = async_views.login_view
+        activate = async_views.activate_user_view
+        logout = async_views.logout_view
+        me = async_views.me_view
+        validate_password = async_views.validate_password_view
+        send_pw_reset_mail = async_views.initiate_password_reset_view
+        reset_password = async_views.reset_password_view
+        register = async_views.registration_view
+    else:
+        login = views.LoginView.as_view()
+        activate = views.ActivateUser.as_view()
+        logout = views.LogoutView.as_view()
+        me = views.MeView.as_view()
+        validate_password = views.ValidatePassword.as_view()
+        send_pw_reset_mail = views.InitiatePasswordResetView.as_view()
+        reset_password = views.ResetPassword.as_view()
+        register = views.RegistrationView.as_view()
+
+    return {
+        "LOGIN": path(r"login/", login, name="login"),
+        "ACTIVATE_EMAIL": path(r"activate_email/", activate, name="activate"),
+        "LOGOUT": path(r"logout/", logout, name="logout"),
+        "ME": path(r"me/", me, name="me"),
+        "VALIDATE_PASSWORD": path(
+            r"validate_password/",
+            validate_password,
+            name="validate_password",
+        ),
+        # cached and without queries, so there is no async version
+        "PASSWORD_POLICY": path(
+            r"password_policy/",
+            views.PasswordPolicyView.as_view(),
+            name="password_policy",
+        ),
+        "SEND_PW_RESET_MAIL": path(
+            r"send_pw_reset_email/",
+            send_pw_reset_mail,
+            name="send_pw_reset_email",
+        ),
+        "RESET_PASSWORD": path(
+            r"reset_password/",
+            reset_password,
+            name="pw_reset",
+        ),
+        "REGISTER": path(r"register/", register, name="register"),
+    }
+
+
+def get_auth_patterns(use_async=False):
+    endpoints = get_endpoints(use_async)
+    return (
+        [
+            endpoints[key]
+            for key in endpoints
+            if getattr(api_settings.ENABLE_ENDPOINTS, key)
+        ],
+        "ai_kit_auth",
+    )
+
+
+endpoints = get_endpoints(api_settings.ENABLE_ASYNC)
+auth_patterns = get_auth_patterns(api_settings.ENABLE_ASYNC)
 
 urlpatterns = [path("", include(auth_patterns))]
@@ -1,13 +1,18 @@
 from django.contrib.auth import login, logout, get_user_model, tokens
-from django.db.models import EmailField
 from rest_framework import status, generics, views
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from . import serializers, services
+from . import hashing, serializers, services
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import salted_hmac
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.http import etag
 from django.middleware import csrf
 
+from .identity import get_identity_resolver
+from .password_validation import password_policy
+from .serialization import serialize_user, user_data
 from .settings import api_settings
 
 from .signals import (
@@ -45,9 +50,7 @@ class LoginView(generics.GenericAPIView):
 
         login(request, user)
 
-        user_serializer = self.user_serializer(
-            instance=user, context={"request": request}
-        )
+        serialized_user = user_data(self.user_serializer, user, {"request": request})
 
         # the position of this statement is important since the csrf token
         # is rotated on login
@@ -57,7 +60,7 @@ class LoginView(generics.GenericAPIView):
 
         return Response(
             {
-                "user": user_serializer.data,
+                "user": serialized_user,
                 "csrf": csrf_token,
             },
             status=status.HTTP_200_OK,
@@ -76,6 +79,48 @@ class LogoutView(views.APIView):
         return Response({"csrf": csrf_token}, status=status.HTTP_200_OK)
 
 
+def me_etag(request, user, digest):
+    """
+    The etag of a response of the me endpoint. The response contains a csrf
+    token, which is masked differently every time, so instead of the token
+    the csrf cookie it belongs to is hashed along with the user.
+    """
+    value = f"{user.pk}:{digest}:{request.META['CSRF_COOKIE']}"
+    return f'"{salted_hmac("ai_kit_auth.me_etag", value).hexdigest()}"'
+
+
+def not_modified(request, user, digest):
+    """
+    Returns a 304 response, if the client has a current response of the me
+    endpoint already.
+    """
+    if "CSRF_COOKIE" not in request.META:
+        # the client needs a csrf token first
+        return None
+    etag = me_etag(request, user, digest)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def current_csrf_token(request):
+    """
+    Returns the csrf token the client has already, if the me endpoint is
+    READ_ONLY_ME, otherwise None. Unlike csrf.get_token, this doesn't cause
+    the csrf cookie to be set again. The token isn't masked, so repeated
+    responses stay the same, which is fine since the response reflects no
+    request input.
+    """
+    # imported here, because the settings object is replaced on reload
+    from .settings import api_settings
+
+    if api_settings.READ_ONLY_ME:
+        return request.META.get("CSRF_COOKIE")
+    return None
+
+
 class MeView(generics.GenericAPIView):
     """
     Barebones user model detail view
@@ -85,20 +130,29 @@ class MeView(generics.GenericAPIView):
     serializer_class = api_settings.USER_SERIALIZER
 
     def get(self, request, *args, **kwargs):
-        csrf_token = csrf.get_token(request)
-
-        if request.user.is_anonymous:
-            user_data = None
+        user = request.user
+        if user.is_anonymous:
+            serialized_user, digest = None, ""
         else:
-            user_serializer = self.get_serializer(instance=request.user)
-            user_data = user_serializer.data
-        return Response(
+            serialized_user, digest = serialize_user(
+                self.get_serializer_class(), user, self.get_serializer_context()
+            )
+        response = not_modified(request, user, digest)
+        if response is not None:
+            return response
+
+        csrf_token = current_csrf_token(request) or csrf.get_token(request)
+        response = Response(
             {
-                "user": user_data,
+                "user": serialized_user,
                 "csrf": csrf_token,
             },
             status=status.HTTP_200_OK,
         )
+        response["ETag"] = me_etag(request, user, digest)
+        # clients may keep the response, but have to revalidate it
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
 
 class RegistrationView(generics.GenericAPIView):
@@ -125,11 +179,31 @@ class ValidatePassword(views.APIView):
     permission_classes = (AllowAny,)
 
     def post(self, request, *args, **kwargs):
-        serializer = self.serializer_class(data=request.data)
+        serializer = self.serializer_class(
+            data=request.data,
+            context={"short_circuit": api_settings.SHORT_CIRCUIT_PASSWORD_VALIDATION},
+        )
         serializer.is_valid(raise_exception=True)
         return Response({}, status=status.HTTP_200_OK)
 
 
+class PasswordPolicyView(views.APIView):
+    """
+    Describes the configured password validators, so that the frontend can
+    validate passwords while the user is typing without calling the backend
+    """
+
+    permission_classes = (AllowAny,)
+
+    @method_decorator(etag(lambda request, *args, **kwargs: password_policy()[1]))
+    def get(self, request, *args, **kwargs):
+        policy, _ = password_policy()
+        response = Response(policy, status=status.HTTP_200_OK)
+        # clients may keep the policy, but have to revalidate it with the etag
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+
 class ActivateUser(views.APIView):
     """
     Endpoint for double opt in user activation
@@ -169,22 +243,8 @@ class InitiatePasswordResetView(views.APIView):
 
     def post(self, request, *args, **kwargs):
         # Find user by identity field
-        user = None
         ident = request.data["ident"]
-        for field_name in api_settings.USER_IDENTITY_FIELDS:
-            field = UserModel._meta.get_field(field_name)
-            filter_key = field.name
-            if isinstance(field, EmailField):
-                filter_key += "__iexact"
-            try:
-                user = UserModel.objects.get(**{filter_key: ident})
-                break  # break as soon as a unique user is found
-            except (
-                KeyError,
-                UserModel.DoesNotExist,
-                UserModel.MultipleObjectsReturned,
-            ):
-                pass
+        user = get_identity_resolver().resolve(ident)
 
         if user:
             user_pre_forgot_password.send(sender=InitiatePasswordResetView, user=user)
@@ -240,7 +300,7 @@ class ResetPassword(views.APIView):
 
         # ok, everything is fine, we do the actual password reset
         user.is_active = True
-        user.set_password(password)
+        hashing.set_password(user, password)
         user.save()
         user_post_reset_password.send(sender=ResetPassword, user=user)
         return Response({}, status=status.HTTP_200_OK)
@@ -0,0 +1,22 @@
+"""
+Micro benchmarks for the hot paths of ai_kit_auth.
+
+They are not part of the test suite. Run them from the django-app directory:
+
+python -m benchmarks.password_validation
+"""
+
+import os
+import sys
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "ai_kit_auth")
+)
+django.setup()
+
+
+def report(name, seconds, runs):
+    print(f"{name:<50} {seconds / runs * 1e6:>10.1f} µs/call")
@@ -0,0 +1,32 @@
+"""
+Measures sending mails one by one with django's SMTP backend and with
+ai_kit_auth.async_smtp.EmailBackend, to the SMTP stand-in of the tests. It
+runs without TLS and authentication, so a real mail server would widen the
+gap.
+"""
+
+import time
+
+from . import report
+
+from django.core.mail import send_mail
+
+from ai_kit_auth import async_smtp
+from ai_kit_auth.tests.smtp import SMTPServer
+
+RUNS = 500
+
+BACKENDS = {
+    "django": "django.core.mail.backends.smtp.EmailBackend",
+    "async_smtp": "ai_kit_auth.async_smtp.EmailBackend",
+}
+
+if __name__ == "__main__":
+    for name, backend in BACKENDS.items():
+        with SMTPServer(backend=backend):
+            start = time.perf_counter()
+            for i in range(RUNS):
+                send_mail("subject", "body", "from@example.com", [f"{i}@example.com"])
+            seconds = time.perf_counter() - start
+            async_smtp.shutdown()
+        report(f"{RUNS} mails with the {name} backend", seconds, RUNS)
@@ -0,0 +1,123 @@
+"""
+Compares the throughput of the sync and the async views under ASGI, with many
+concurrent requests. The requests are passed straight to django's ASGI
+application, like an ASGI server such as uvicorn would do.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+# threads need a shared database, which in memory sqlite is not
+settings.DATABASES["default"]["NAME"] = os.path.join(
+    tempfile.mkdtemp(), "benchmark.sqlite3"
+)
+
+from . import report
+
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils.crypto import get_random_string
+
+URLCONFS = {
+    "sync": "ai_kit_auth.urls",
+    "async": "ai_kit_auth.tests.async_urls",
+}
+PASSWORD = "jafsdfah24agdsfghasdf"
+CSRF_TOKEN = get_random_string(32)
+CONCURRENCY = 32
+
+
+async def request(app, method, path, body=b""):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"cookie", f"csrftoken={CSRF_TOKEN}".encode()),
+            (b"x-csrftoken", CSRF_TOKEN.encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    disconnected = asyncio.get_running_loop().create_future()
+    response = {}
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # the client never disconnects
+        return await disconnected
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+
+    await app(scope, receive, send)
+    assert response["status"] < 300, response
+    return response["status"]
+
+
+async def run(app, runs, method, path, body=b""):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def limited():
+        async with semaphore:
+            await request(app, method, path, body)
+
+    await asyncio.gather(*(limited() for _ in range(runs)))
+
+
+CASES = {
+    "me": (2000, "GET", "/me/", b""),
+    "validate password": (
+        1000,
+        "POST",
+        "/validate_password/",
+        b'{"username": "user", "email": "user@example.com", "password": "'
+        + PASSWORD.encode()
+        + b'"}',
+    ),
+    "login": (
+        100,
+        "POST",
+        "/login/",
+        b'{"ident": "user@example.com", "password": "' + PASSWORD.encode() + b'"}',
+    ),
+}
+
+
+if __name__ == "__main__":
+    call_command("migrate", verbosity=0)
+    user = get_user_model().objects.create(username="user", email="user@example.com")
+    user.set_password(PASSWORD)
+    user.save()
+
+    # sessions in cookies, so that concurrent logins don't lock the database
+    with override_settings(
+        ALLOWED_HOSTS=["testserver"],
+        SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies",
+    ):
+        for case, (runs, method, path, body) in CASES.items():
+            for kind, urlconf in URLCONFS.items():
+                with override_settings(ROOT_URLCONF=urlconf):
+                    app = get_asgi_application()
+                    start = time.perf_counter()
+                    asyncio.run(run(app, runs, method, path, body))
+                    seconds = time.perf_counter() - start
+                report(f"{case} ({kind}, {CONCURRENCY} concurrent)", seconds, runs)
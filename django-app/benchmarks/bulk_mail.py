@@ -0,0 +1,38 @@
+"""
+Measures sending activation mails to many users, one by one and with
+send_user_activation_mails, to the SMTP stand-in of the tests. It runs
+without TLS and authentication, so a real mail server would widen the gap.
+"""
+
+import time
+
+from . import report
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+
+from ai_kit_auth.services import send_user_activation_mail, send_user_activation_mails
+from ai_kit_auth.tests.smtp import SMTPServer
+
+RUNS = 500
+
+if __name__ == "__main__":
+    UserModel = get_user_model()
+    users = [
+        UserModel(id=i, username=f"user{i}", email=f"user{i}@example.com")
+        for i in range(1, RUNS + 1)
+    ]
+    with override_settings(AI_KIT_AUTH={"FRONTEND": {"URL": "example.com"}}):
+        with SMTPServer():
+            start = time.perf_counter()
+            for user in users:
+                send_user_activation_mail(user)
+            seconds = time.perf_counter() - start
+        report(f"{RUNS} activation mails, one by one", seconds, RUNS)
+
+        for processes in (0, 2):
+            with SMTPServer():
+                start = time.perf_counter()
+                send_user_activation_mails(users, processes=processes)
+                seconds = time.perf_counter() - start
+            report(f"{RUNS} activation mails, {processes} processes", seconds, RUNS)
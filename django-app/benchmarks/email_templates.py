@@ -0,0 +1,53 @@
+"""
+Measures the throughput of rendering password reset mails, with and without
+CACHE_EMAIL_TEMPLATES, and with and without django's cached template loader.
+The mails are sent to django's locmem backend.
+"""
+
+import time
+
+from . import report
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.test import override_settings
+
+from ai_kit_auth.services import send_templated_mail
+
+RUNS = 10000
+
+LOADERS = {
+    "cached loader": [
+        (
+            "django.template.loaders.cached.Loader",
+            ["django.template.loaders.app_directories.Loader"],
+        )
+    ],
+    "uncached loader": ["django.template.loaders.app_directories.Loader"],
+}
+
+
+def templates(loaders):
+    options = {**settings.TEMPLATES[0]["OPTIONS"], "loaders": loaders}
+    return [{**settings.TEMPLATES[0], "APP_DIRS": False, "OPTIONS": options}]
+
+
+if __name__ == "__main__":
+    user = get_user_model()(id=1, username="someone", email="someone@example.com")
+    for loader, loaders in LOADERS.items():
+        for cache in (False, True):
+            with override_settings(
+                TEMPLATES=templates(loaders),
+                AI_KIT_AUTH={
+                    "FRONTEND": {"URL": "example.com"},
+                    "CACHE_EMAIL_TEMPLATES": cache,
+                },
+            ):
+                start = time.perf_counter()
+                for _ in range(RUNS):
+                    send_templated_mail("RESET_PASSWORD", user, "example.com/reset")
+                seconds = time.perf_counter() - start
+                mail.outbox.clear()
+            name = "registry" if cache else "no registry"
+            report(f"{RUNS} reset mails ({loader}, {name})", seconds, RUNS)
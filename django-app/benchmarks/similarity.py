@@ -0,0 +1,56 @@
+"""
+Compares ai_kit_auth's UserAttributeSimilarityValidator with django's one on
+long passwords and attributes.
+"""
+
+import timeit
+
+from . import report
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.password_validation import (
+    UserAttributeSimilarityValidator as DjangoSimilarityValidator,
+)
+from django.core.exceptions import ValidationError
+
+from ai_kit_auth.password_validation import UserAttributeSimilarityValidator
+
+RUNS = 2000
+
+CASES = {
+    "short password, short attributes": (
+        "correct horse",
+        dict(username="someone", email="someone@example.com"),
+    ),
+    "long password, long attributes": (
+        "correct horse battery staple " * 8,
+        dict(
+            username="a.very.long.username.with.many.parts",
+            email="first.middle.last.name@a.rather.long.subdomain.example.com",
+            first_name="Maximilian Alexander",
+            last_name="Mustermann-Musterfrau",
+        ),
+    ),
+    "similar password": (
+        "someone42",
+        dict(username="someone", email="someone@example.com"),
+    ),
+}
+
+
+def run(validator, password, user):
+    try:
+        validator.validate(password, user)
+    except ValidationError:
+        pass
+
+
+if __name__ == "__main__":
+    for case, (password, attributes) in CASES.items():
+        user = get_user_model()(**attributes)
+        for name, validator in (
+            ("django", DjangoSimilarityValidator()),
+            ("ai_kit_auth", UserAttributeSimilarityValidator()),
+        ):
+            seconds = timeit.timeit(lambda: run(validator, password, user), number=RUNS)
+            report(f"{case} ({name})", seconds, RUNS)
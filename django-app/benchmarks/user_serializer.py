@@ -0,0 +1,59 @@
+"""
+Compares rest framework's serializers of users with their compiled versions
+(see COMPILE_USER_SERIALIZER).
+"""
+
+import timeit
+
+from . import report
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework import serializers
+
+from ai_kit_auth.serialization import compile_serializer
+from ai_kit_auth.serializers import UserSerializer
+
+RUNS = 20000
+
+
+class DetailedUserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = get_user_model()
+        fields = [
+            "id",
+            "username",
+            "email",
+            "first_name",
+            "last_name",
+            "is_active",
+            "is_staff",
+            "last_login",
+            "date_joined",
+        ]
+
+
+CASES = {
+    "default user serializer": UserSerializer,
+    "detailed user serializer": DetailedUserSerializer,
+}
+
+
+if __name__ == "__main__":
+    user = get_user_model()(
+        id=1,
+        username="someone",
+        email="someone@example.com",
+        first_name="Some",
+        last_name="One",
+        last_login=timezone.now(),
+    )
+    for case, serializer_class in CASES.items():
+        serialize = compile_serializer(serializer_class)
+        assert serialize(user) == serializer_class(user).data
+        for name, func in (
+            ("rest framework", lambda: serializer_class(user).data),
+            ("compiled", lambda: serialize(user)),
+        ):
+            seconds = timeit.timeit(func, number=RUNS)
+            report(f"{case} ({name})", seconds, RUNS)